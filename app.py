@@ -10,6 +10,7 @@ from datetime import datetime, timedelta
 from typing import Optional, List, Dict
 import database as db
 import weather as wt
+import gazetteer as gz
 import email_notifier as em
 from apscheduler.schedulers.background import BackgroundScheduler
 import json
@@ -23,6 +24,13 @@ if Path(".env").exists():
 # 初始化資料庫
 db.init_database()
 
+# 記憶體讀取副本（設定 DB_MEMORY_REPLICA=1 啟用）
+if db.MEMORY_REPLICA_ENABLED:
+    db.enable_memory_replica()
+
+# 由磁碟載入上次取得且仍有效的天氣預報（冷啟動時免重新呼叫 API）
+wt.load_forecast_store()
+
 # 全域變數儲存當前使用者
 current_user = {"id": None, "username": None}
 
@@ -30,10 +38,42 @@ current_user = {"id": None, "username": None}
 scheduler = BackgroundScheduler()
 scheduler.start()
 
+# 資料庫維護排程（預設每天台灣時間 03:30 離峰時段執行，可用 DB_MAINTENANCE_TIME 調整）
+maintenance_hour, maintenance_minute = os.environ.get(
+    "DB_MAINTENANCE_TIME", "03:30"
+).split(":")
+scheduler.add_job(
+    db.run_maintenance,
+    "cron",
+    hour=int(maintenance_hour),
+    minute=int(maintenance_minute),
+    timezone="Asia/Taipei",
+    id="db_maintenance",
+    replace_existing=True,
+    misfire_grace_time=3600,
+    coalesce=True,
+)
+
+# 全國天氣預報預先載入：啟動時執行一次，之後於 CWA 每次發布後更新
+if wt.CWA_API_KEY:
+    scheduler.add_job(
+        wt.refresh_national_forecasts,
+        "cron",
+        hour="5,11,17,23",
+        minute=20,
+        timezone="Asia/Taipei",
+        id="weather_national_refresh",
+        replace_existing=True,
+        next_run_time=datetime.now(),
+        misfire_grace_time=1800,
+        coalesce=True,
+    )
+
 
 # ==================== 登入/註冊功能 ====================
 
 
+@db.track_queries
 def login_user(username: str, password: str):
     """使用者登入"""
     if not username or not password:
@@ -52,6 +92,7 @@ def login_user(username: str, password: str):
         return "帳號或密碼錯誤", gr.update(visible=True), gr.update(visible=False)
 
 
+@db.track_queries
 def register_user(
     username: str, password: str, password_confirm: str, email: str = None
 ):
@@ -81,6 +122,7 @@ def logout_user():
     return "已登出", gr.update(visible=True), gr.update(visible=False), "", ""
 
 
+@db.track_queries
 def retrieve_password(username: str):
     """忘記密碼 - 取得密碼"""
     if not username:
@@ -103,6 +145,7 @@ def get_current_user_id():
     return current_user["id"]
 
 
+@db.track_queries
 def refresh_clothes_list(category="", color="", material="", season="", occasion=""):
     """刷新衣物列表"""
     try:
@@ -152,6 +195,7 @@ def refresh_clothes_list(category="", color="", material="", season="", occasion
         )
 
 
+@db.track_queries
 def add_new_clothing(category, color, material, sleeve_type, seasons, occasions, name):
     """新增衣物"""
     try:
@@ -198,6 +242,7 @@ def add_new_clothing(category, color, material, sleeve_type, seasons, occasions,
         return str(e), ""
 
 
+@db.track_queries
 def delete_clothing(cloth_id):
     """刪除衣物"""
     try:
@@ -226,6 +271,7 @@ def delete_clothing(cloth_id):
         return str(e), ""
 
 
+@db.track_queries
 def refresh_option_choices(option_type):
     """刷新選項列表"""
     try:
@@ -236,6 +282,7 @@ def refresh_option_choices(option_type):
         return gr.update()
 
 
+@db.track_queries
 def update_filter_options(category):
     """根據類別更新篩選選項"""
     try:
@@ -267,6 +314,7 @@ def update_filter_options(category):
         return gr.update(), gr.update(), gr.update()
 
 
+@db.track_queries
 def update_category_fields(category):
     """根據類別更新欄位顯示"""
     try:
@@ -329,6 +377,7 @@ def update_category_fields(category):
         return gr.update(), gr.update(), gr.update(), gr.update()
 
 
+@db.track_queries
 def add_option(option_type, option_value):
     """新增選項"""
     try:
@@ -347,6 +396,7 @@ def add_option(option_type, option_value):
         return str(e)
 
 
+@db.track_queries
 def delete_option(option_type, option_value):
     """刪除選項"""
     try:
@@ -407,6 +457,7 @@ def get_date_range(days_offset=0):
     return dates
 
 
+@db.track_queries
 def refresh_calendar_view(week_offset=0):
     """刷新行事曆視圖 - 顯示本週（週一到週日）共7天"""
     try:
@@ -429,34 +480,30 @@ def refresh_calendar_view(week_offset=0):
 
         output = f"### 📅 穿搭行事曆 - {week_title}\n\n"
 
+        # 一次取得該週七天的穿搭與衣物
+        calendar = db.get_outfit_calendar(user_id, week_monday.strftime("%Y-%m-%d"), 7)
+
         # 顯示該週的七天
-        for day_idx in range(7):
-            date = week_monday + timedelta(days=day_idx)
-            date_str = date.strftime("%Y-%m-%d")
+        for day_idx, (date_str, outfit_clothes) in enumerate(calendar):
             weekday_name = ["週一", "週二", "週三", "週四", "週五", "週六", "週日"][
                 day_idx
             ]
             display_str = f"{date_str} ({weekday_name})"
 
-            # 取得該日期的穿搭
-            outfit_ids = db.get_outfit(user_id, date_str)
-
             output += f"#### {display_str}\n"
 
-            if outfit_ids:
-                for cloth_id in outfit_ids:
-                    cloth = db.get_clothing_by_id(cloth_id, user_id)
-                    if cloth:
-                        output += f"- **ID: {cloth['id']}**"
-                        if cloth.get("name"):
-                            output += f" **{cloth['name']}**"
-                        output += f" | {cloth['category']}"
-                        output += f" | 顏色: {cloth['color']}"
-                        if cloth.get("material"):
-                            output += f" | 材質: {cloth['material']}"
-                        if cloth.get("sleeve_type"):
-                            output += f" | 分類: {cloth['sleeve_type']}"
-                        output += "\n"
+            if outfit_clothes:
+                for cloth in outfit_clothes:
+                    output += f"- **ID: {cloth['id']}**"
+                    if cloth.get("name"):
+                        output += f" **{cloth['name']}**"
+                    output += f" | {cloth['category']}"
+                    output += f" | 顏色: {cloth['color']}"
+                    if cloth.get("material"):
+                        output += f" | 材質: {cloth['material']}"
+                    if cloth.get("sleeve_type"):
+                        output += f" | 分類: {cloth['sleeve_type']}"
+                    output += "\n"
             else:
                 output += "*尚未安排穿搭*\n"
 
@@ -482,6 +529,7 @@ def get_calendar_view_only():
         return "### 📅 穿搭行事曆\n\n*請先新增衣物*"
 
 
+@db.track_queries
 def get_clothes_choices_for_outfit(
     category="全部", color="全部", material="全部", season="全部", occasion="全部"
 ):
@@ -520,6 +568,7 @@ def update_outfit_clothes_list(category, color, material, season, occasion):
     return gr.update(choices=choices)
 
 
+@db.track_queries
 def save_daily_outfit(date_str, selected_clothes_ids):
     """儲存每日穿搭"""
     try:
@@ -544,6 +593,7 @@ def save_daily_outfit(date_str, selected_clothes_ids):
         return str(e)
 
 
+@db.track_queries
 def delete_daily_outfit(date_str):
     """刪除每日穿搭"""
     try:
@@ -566,6 +616,7 @@ def delete_daily_outfit(date_str):
 # ==================== 歷史穿搭查詢功能 ====================
 
 
+@db.track_queries
 def search_outfit_history(cloth_ids):
     """查詢衣物的歷史穿搭記錄（支援多件衣物）"""
     try:
@@ -583,10 +634,13 @@ def search_outfit_history(cloth_ids):
         output = f"### 🔍 查詢結果\n\n"
         output += f"**已選擇 {len(cloth_ids_int)} 件衣物**\n\n---\n\n"
 
+        # 一次取得所有選中的衣物
+        selected_clothes = db.get_clothes_by_ids(user_id, cloth_ids_int)
+
         # 對每件衣物進行查詢
         for cloth_id in cloth_ids_int:
             # 取得衣物資訊
-            cloth = db.get_clothing_by_id(cloth_id, user_id)
+            cloth = selected_clothes.get(cloth_id)
             if not cloth:
                 output += f"找不到衣物 ID: {cloth_id}\n\n---\n\n"
                 continue
@@ -640,8 +694,12 @@ def search_outfit_history(cloth_ids):
                     companion_items.items(), key=lambda x: x[1], reverse=True
                 )
 
-                for other_id, count in sorted_companions[:5]:  # 只顯示前 5 個
-                    other_cloth = db.get_clothing_by_id(other_id, user_id)
+                top_companions = sorted_companions[:5]  # 只顯示前 5 個
+                companion_clothes = db.get_clothes_by_ids(
+                    user_id, [other_id for other_id, _ in top_companions]
+                )
+                for other_id, count in top_companions:
+                    other_cloth = companion_clothes.get(other_id)
                     if other_cloth:
                         output += f"- **ID: {other_cloth['id']}**"
                         if other_cloth.get("name"):
@@ -667,6 +725,7 @@ def search_outfit_history(cloth_ids):
 # ==================== 衣物選單更新功能 ====================
 
 
+@db.track_queries
 def update_history_clothes_list(category, color, material, season, occasion):
     """更新歷史穿搭衣物選單（改為 CheckboxGroup）"""
     try:
@@ -708,9 +767,11 @@ def refresh_weather_display(city_name="泰山", days=7):
         city_name = "泰山"
 
     weather_data = wt.get_weather_forecast(city_name, days)
-    return wt.format_weather_display(weather_data, city_name)
+    hourly = wt.get_hourly_forecast(city_name, days) if weather_data else None
+    return wt.format_weather_display(weather_data, city_name, hourly)
 
 
+@db.track_queries
 def add_location(city_name):
     """新增地區"""
     try:
@@ -730,6 +791,12 @@ def add_location(city_name):
         return str(e), gr.update()
 
 
+def suggest_locations(text):
+    """依輸入內容補全地區名稱"""
+    return gr.update(choices=gz.complete(text), value=None)
+
+
+@db.track_queries
 def delete_location(city_name):
     """刪除地區"""
     try:
@@ -752,6 +819,7 @@ def delete_location(city_name):
 # ==================== Email 設定功能 ====================
 
 
+@db.track_queries
 def bind_user_email(email_address):
     """綁定或更新用戶 Email"""
     try:
@@ -770,6 +838,7 @@ def bind_user_email(email_address):
         return str(e), gr.update()
 
 
+@db.track_queries
 def save_email_settings(email_time, email_enabled):
     """儲存 Email 設定"""
     try:
@@ -783,6 +852,7 @@ def save_email_settings(email_time, email_enabled):
         return str(e)
 
 
+@db.track_queries
 def send_test_email():
     """發送測試 Email"""
     try:
@@ -816,6 +886,14 @@ def send_test_email():
         city = locations[0] if locations else "泰山"
         weather_data = wt.get_weather_forecast(city, 1)
         weather_info = weather_data[0] if weather_data else None
+        if weather_info:
+            # 出門與返家時段的天氣（與介面共用同一份逐時快取）
+            weather_info = dict(
+                weather_info,
+                windows=wt.get_time_windows(
+                    wt.get_hourly_forecast(city, 1), weather_info["date"]
+                ),
+            )
 
         # 發送 Email
         print(f"準備發送測試郵件到 {email}...")
@@ -1211,6 +1289,9 @@ def create_gradio_app():
                             location_new = gr.Textbox(
                                 label="新增地區", placeholder="例：台北"
                             )
+                            location_suggestions = gr.Dropdown(
+                                choices=[], label="建議地區", interactive=True
+                            )
                             location_add_btn = gr.Button("新增", variant="primary")
                             location_delete = gr.Dropdown(choices=[], label="刪除地區")
                             location_delete_btn = gr.Button("🗑️ 刪除", variant="primary")
@@ -1724,6 +1805,17 @@ def create_gradio_app():
             outputs=[weather_display],
         )
 
+        # 地區名稱補全
+        location_new.input(
+            suggest_locations, inputs=[location_new], outputs=[location_suggestions]
+        )
+
+        location_suggestions.select(
+            lambda name: name or gr.update(),
+            inputs=[location_suggestions],
+            outputs=[location_new],
+        )
+
         location_add_btn.click(
             add_location, inputs=[location_new], outputs=[location_msg, weather_city]
         ).then(lambda: "", outputs=[location_new]).then(
@@ -1763,6 +1855,8 @@ if __name__ == "__main__":
     from fastapi import FastAPI
     from fastapi.responses import JSONResponse
 
+    import weather_async as wa
+
     # 建立獨立的 FastAPI app
     app = FastAPI()
 
@@ -1774,6 +1868,47 @@ if __name__ == "__main__":
     async def ping():
         return {"status": "ok", "message": "pong"}
 
+    # 穿搭時間軸（由新到舊分頁，cursor 為上一頁回傳的 next_cursor）
+    @app.get("/api/timeline")
+    def outfit_timeline(cursor: Optional[str] = None, limit: int = 20):
+        try:
+            user_id = get_current_user_id()
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=401)
+
+        page = db.get_outfit_timeline_page(user_id, cursor, max(1, min(limit, 100)))
+        return {
+            "outfits": [
+                {
+                    "date": outfit["date"],
+                    "clothes_ids": outfit["clothes_ids"],
+                    "clothes": [cloth.to_dict() for cloth in outfit["clothes"]],
+                }
+                for outfit in page["outfits"]
+            ],
+            "next_cursor": page["next_cursor"],
+        }
+
+    # 增量同步：回傳 version 之後的變更（衣物、穿搭、選項、地區）
+    @app.get("/api/changes")
+    def sync_changes(version: int = 0, limit: int = 1000):
+        try:
+            user_id = get_current_user_id()
+        except ValueError as e:
+            return JSONResponse({"error": str(e)}, status_code=401)
+
+        return db.changes_since(user_id, version, max(1, min(limit, 5000)))
+
+    # 天氣預報（非同步查詢，可用逗號分隔同時查詢多個地點）
+    @app.get("/api/weather")
+    async def weather_forecast(city: str, days: int = 1):
+        city_names = [name.strip() for name in city.split(",") if name.strip()]
+        return await wa.get_weather_forecasts_async(city_names, max(1, min(days, 7)))
+
+    @app.on_event("shutdown")
+    async def close_weather_client():
+        await wa.aclose_async_client()
+
     # 將 Gradio 掛載到 FastAPI
     app = gr.mount_gradio_app(app, gradio_app, path="/")
 
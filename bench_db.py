@@ -0,0 +1,428 @@
+"""
+資料庫效能測試模組
+在不同規模的合成資料庫上量測 database.py 每個公開函式的耗時，
+輸出 JSON 結果供回歸比較
+"""
+
+import argparse
+import inspect
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+import database as db
+import db_synth
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+# 不納入量測的公開函式與原因
+SKIPPED = {
+    "get_connection": "每個函式皆會呼叫，已包含在其他量測中",
+    "init_database": "僅於啟動時執行一次",
+    "query_scope": "查詢監測工具",
+    "track_queries": "查詢監測工具",
+    "assert_max_queries": "測試輔助",
+    "get_query_stats": "查詢監測工具",
+    "reset_query_stats": "查詢監測工具",
+    "enable_memory_replica": "記憶體副本管理（以 --replica 量測讀取延遲）",
+    "disable_memory_replica": "記憶體副本管理（以 --replica 量測讀取延遲）",
+    "is_memory_replica_active": "記憶體副本管理（以 --replica 量測讀取延遲）",
+    "check_replica_consistency": "於 --replica 量測結束時執行",
+}
+
+
+class Benchmark:
+    """單一函式的量測設定"""
+
+    def __init__(
+        self,
+        run: Callable[[int], object],
+        iterations: int = 50,
+        prepare: Optional[Callable[[int], None]] = None,
+    ):
+        self.run = run
+        self.iterations = iterations
+        self.prepare = prepare
+
+
+def _pick_users(db_path: str) -> Dict:
+    """挑選衣物最多與中位數的使用者，以及量測用的樣本資料"""
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute(
+        "SELECT user_id, COUNT(*) FROM clothes GROUP BY user_id ORDER BY COUNT(*)"
+    ).fetchall()
+    heavy_user, heavy_items = rows[-1]
+    median_user, median_items = rows[len(rows) // 2]
+    cloth_id = conn.execute(
+        "SELECT id FROM clothes WHERE user_id = ? ORDER BY id LIMIT 1", (heavy_user,)
+    ).fetchone()[0]
+    last_date = conn.execute(
+        "SELECT MAX(date) FROM outfits WHERE user_id = ?", (heavy_user,)
+    ).fetchone()[0]
+    username = conn.execute(
+        "SELECT username FROM users WHERE id = ?", (heavy_user,)
+    ).fetchone()[0]
+    conn.close()
+    return {
+        "heavy_user": heavy_user,
+        "heavy_items": heavy_items,
+        "median_user": median_user,
+        "median_items": median_items,
+        "cloth_id": cloth_id,
+        "last_date": last_date,
+        "username": username,
+    }
+
+
+def _build_benchmarks(ctx: Dict) -> Dict[str, Benchmark]:
+    """建立每個公開函式的量測（讀取類在前，寫入類在後）"""
+    user = ctx["heavy_user"]
+    cloth_id = ctx["cloth_id"]
+    last_date = datetime.strptime(ctx["last_date"], "%Y-%m-%d")
+    week_start = (last_date - timedelta(days=6)).strftime("%Y-%m-%d")
+    future = [
+        (last_date + timedelta(days=i + 1)).strftime("%Y-%m-%d") for i in range(1000)
+    ]
+    cloth_args = ("上衣", "白", "一般", "長袖", ["春", "秋"], ["休閒"])
+    created_ids: List[int] = []
+
+    def prepare_clothes(n):
+        for _ in range(n):
+            db.add_clothing(user, *cloth_args, name="bench")
+        created_ids[:] = [
+            c["id"] for c in db.get_user_clothes(user) if c["name"] == "bench"
+        ][:n]
+
+    return {
+        # 讀取
+        "fingerprint_sql": Benchmark(
+            lambda i: db.fingerprint_sql("SELECT * FROM clothes WHERE id = 1"), 1000
+        ),
+        "hash_password": Benchmark(lambda i: db.hash_password("password"), 1000),
+        "verify_user": Benchmark(lambda i: db.verify_user(ctx["username"], "password")),
+        "get_password_hint": Benchmark(lambda i: db.get_password_hint(ctx["username"])),
+        "get_user_email_settings": Benchmark(
+            lambda i: db.get_user_email_settings(user)
+        ),
+        "get_user_email": Benchmark(lambda i: db.get_user_email(user)),
+        "get_user_options": Benchmark(
+            lambda i: db.get_user_options(user, "color_上衣")
+        ),
+        "get_user_locations": Benchmark(lambda i: db.get_user_locations(user)),
+        "get_user_clothes": Benchmark(lambda i: db.get_user_clothes(user), 20),
+        "get_user_clothes[median_user]": Benchmark(
+            lambda i: db.get_user_clothes(ctx["median_user"]), 20
+        ),
+        "get_user_clothes[filtered]": Benchmark(
+            lambda i: db.get_user_clothes(user, "上衣", "白", None, "冬", "正式"), 20
+        ),
+        "get_clothing_by_id": Benchmark(
+            lambda i: db.get_clothing_by_id(cloth_id, user)
+        ),
+        "get_outfit": Benchmark(lambda i: db.get_outfit(user, ctx["last_date"])),
+        "get_outfits_range": Benchmark(
+            lambda i: db.get_outfits_range(user, week_start, ctx["last_date"])
+        ),
+        "get_outfit_history_by_clothing": Benchmark(
+            lambda i: db.get_outfit_history_by_clothing(user, cloth_id), 10
+        ),
+        "get_all_past_outfits": Benchmark(lambda i: db.get_all_past_outfits(user), 10),
+        "get_clothes_by_ids": Benchmark(
+            lambda i: db.get_clothes_by_ids(user, range(cloth_id, cloth_id + 20))
+        ),
+        "get_outfit_timeline_page": Benchmark(
+            lambda i: db.get_outfit_timeline_page(user, None, 50), 20
+        ),
+        "iter_outfit_timeline": Benchmark(
+            lambda i: sum(1 for _ in db.iter_outfit_timeline(user, 100)), 3
+        ),
+        "get_latest_change_version": Benchmark(
+            lambda i: db.get_latest_change_version(user)
+        ),
+        "changes_since": Benchmark(lambda i: db.changes_since(user, 0, 500), 10),
+        "get_maintenance_history": Benchmark(lambda i: db.get_maintenance_history()),
+        # 寫入
+        "create_user": Benchmark(
+            lambda i: db.create_user(f"bench{i}", "password", "bench@example.com"), 20
+        ),
+        "init_default_options": Benchmark(lambda i: db.init_default_options(user), 10),
+        "init_default_locations": Benchmark(
+            lambda i: db.init_default_locations(user), 10
+        ),
+        "update_user_email_settings": Benchmark(
+            lambda i: db.update_user_email_settings(user, "07:00", True)
+        ),
+        "update_user_email": Benchmark(
+            lambda i: db.update_user_email(user, "bench@example.com")
+        ),
+        "add_user_option": Benchmark(
+            lambda i: db.add_user_option(user, "color_上衣", f"bench{i}")
+        ),
+        "delete_user_option": Benchmark(
+            lambda i: db.delete_user_option(user, "color_上衣", f"bench{i}")
+        ),
+        "add_user_location": Benchmark(
+            lambda i: db.add_user_location(user, f"bench{i}")
+        ),
+        "delete_user_location": Benchmark(
+            lambda i: db.delete_user_location(user, f"bench{i}")
+        ),
+        "add_clothing": Benchmark(lambda i: db.add_clothing(user, *cloth_args)),
+        "update_clothing": Benchmark(
+            lambda i: db.update_clothing(cloth_id, user, *cloth_args)
+        ),
+        "delete_clothing": Benchmark(
+            lambda i: db.delete_clothing(created_ids[i], user), 20, prepare_clothes
+        ),
+        "save_outfit[new]": Benchmark(
+            lambda i: db.save_outfit(user, future[i], [cloth_id])
+        ),
+        "save_outfit": Benchmark(
+            lambda i: db.save_outfit(user, future[0], [cloth_id + i])
+        ),
+        "delete_outfit": Benchmark(lambda i: db.delete_outfit(user, future[i])),
+        "repair_outfit_references": Benchmark(
+            lambda i: db.repair_outfit_references(), 3
+        ),
+        "run_maintenance": Benchmark(lambda i: db.run_maintenance(), 1),
+    }
+
+
+def _time_benchmark(bench: Benchmark) -> Dict:
+    """執行量測並回傳統計"""
+    if bench.prepare:
+        bench.prepare(bench.iterations)
+
+    timings = []
+    queries = 0
+    for i in range(bench.iterations):
+        with db.query_scope("bench") as scope:
+            start = time.perf_counter()
+            bench.run(i)
+            timings.append((time.perf_counter() - start) * 1000)
+        queries += scope.count
+
+    timings.sort()
+    return {
+        "iterations": bench.iterations,
+        "mean_ms": statistics.fmean(timings),
+        "median_ms": statistics.median(timings),
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "min_ms": timings[0],
+        "max_ms": timings[-1],
+        "queries_per_call": queries / bench.iterations,
+    }
+
+
+def measure_clothing_records(db_path: str, user_id: int) -> Dict:
+    """比較 Clothing 紀錄與逐列 dict + json.loads 的記憶體用量與解碼時間"""
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute(
+        f"{db.CLOTHING_SELECT} WHERE user_id = ? ORDER BY id DESC", (user_id,)
+    ).fetchall()
+    conn.close()
+
+    def decode_dicts():
+        clothes = []
+        for row in rows:
+            cloth = dict(row)
+            cloth["seasons"] = json.loads(cloth["seasons"])
+            cloth["occasions"] = (
+                json.loads(cloth["occasions"]) if cloth["occasions"] else []
+            )
+            clothes.append(cloth)
+        return clothes
+
+    def decode_records():
+        return [db.Clothing.from_row(row) for row in rows]
+
+    result = {"rows": len(rows)}
+    for label, decode in (("dict", decode_dicts), ("record", decode_records)):
+        decode()  # 預熱（含解碼快取）
+        tracemalloc.start()
+        clothes = decode()
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del clothes
+
+        start = time.perf_counter()
+        for _ in range(5):
+            decode()
+        elapsed = (time.perf_counter() - start) / 5
+        result[label] = {
+            "bytes_per_item": current / max(len(rows), 1),
+            "decode_us_per_row": elapsed * 1e6 / max(len(rows), 1),
+        }
+    print(
+        f"  Clothing 紀錄：每件 {result['dict']['bytes_per_item']:.0f} → "
+        f"{result['record']['bytes_per_item']:.0f} bytes，解碼每列 "
+        f"{result['dict']['decode_us_per_row']:.2f} → "
+        f"{result['record']['decode_us_per_row']:.2f} µs"
+    )
+    return result
+
+
+def check_coverage(benchmarks: Dict[str, Benchmark]) -> List[str]:
+    """找出尚未納入量測也未列在 SKIPPED 的公開函式"""
+    measured = {name.split("[")[0] for name in benchmarks}
+    public = [
+        name
+        for name, func in inspect.getmembers(db, inspect.isfunction)
+        if func.__module__ == db.__name__ and not name.startswith("_")
+    ]
+    return [name for name in public if name not in measured and name not in SKIPPED]
+
+
+def run_scale(
+    scale: str, params: Dict, seed: int, regenerate: bool, replica: bool = False
+) -> Dict:
+    """在單一規模上執行所有量測（replica=True 時讀取由記憶體副本提供）"""
+    source = os.path.join(DATA_DIR, f"synthetic_{scale}.db")
+    if regenerate or not os.path.exists(source):
+        dataset = db_synth.generate_dataset(source, seed=seed, **params)
+    else:
+        dataset = {"db_path": source, "seed": seed, **params}
+
+    # 量測會寫入資料，使用副本以保持原始資料集不變
+    working = os.path.join(DATA_DIR, f"bench_{scale}.db")
+    shutil.copyfile(source, working)
+    label = f"{scale}+replica" if replica else scale
+
+    original_path = db.DB_PATH
+    db.DB_PATH = working
+    try:
+        if replica:
+            db.enable_memory_replica()
+        ctx = _pick_users(working)
+        benchmarks = _build_benchmarks(ctx)
+        missing = check_coverage(benchmarks)
+        if missing:
+            print(f"⚠️ 以下公開函式尚未納入量測：{', '.join(missing)}")
+
+        records = measure_clothing_records(working, ctx["heavy_user"])
+        functions = {}
+        for name, bench in benchmarks.items():
+            functions[name] = _time_benchmark(bench)
+            print(
+                f"  {label:<15} {name:<36} "
+                f"median {functions[name]['median_ms']:9.3f} ms  "
+                f"p95 {functions[name]['p95_ms']:9.3f} ms  "
+                f"queries {functions[name]['queries_per_call']:.1f}"
+            )
+        if replica:
+            consistency = db.check_replica_consistency(resync=False)
+            print(f"  記憶體副本一致性：{'✅' if consistency['consistent'] else '❌'}")
+    finally:
+        db.disable_memory_replica()
+        db.DB_PATH = original_path
+        os.remove(working)
+
+    return {
+        "dataset": dataset,
+        "sample": ctx,
+        "uncovered": missing,
+        "clothing_records": records,
+        "functions": functions,
+    }
+
+
+def print_replica_comparison(disk: Dict, replica: Dict, scale: str):
+    """列出讀取函式在磁碟與記憶體副本的中位數耗時"""
+    print(f"\n📊 {scale} 讀取延遲：磁碟 vs 記憶體副本（median）")
+    for name, stats in disk["functions"].items():
+        if not name.startswith(("get_", "verify_", "changes_", "iter_")):
+            continue
+        memory = replica["functions"][name]["median_ms"]
+        print(
+            f"  {name:<36} {stats['median_ms']:9.3f} → {memory:9.3f} ms "
+            f"(x{stats['median_ms'] / max(memory, 1e-9):.1f})"
+        )
+
+
+def compare_results(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """比較兩次結果的中位數耗時，回傳超過門檻的退步項目"""
+    regressions = []
+    for scale, result in current["results"].items():
+        base_scale = baseline.get("results", {}).get(scale)
+        if not base_scale:
+            continue
+        for name, stats in result["functions"].items():
+            base = base_scale["functions"].get(name)
+            if not base or base["median_ms"] <= 0:
+                continue
+            ratio = stats["median_ms"] / base["median_ms"]
+            if ratio > 1 + threshold:
+                regressions.append(
+                    f"{scale}/{name}: {base['median_ms']:.3f} → "
+                    f"{stats['median_ms']:.3f} ms (x{ratio:.2f})"
+                )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="database.py 效能測試")
+    parser.add_argument(
+        "--scales",
+        default="small,medium",
+        help=f"要量測的規模（逗號分隔，可選：{', '.join(db_synth.SCALES)}）",
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--regenerate", action="store_true", help="重新產生資料集")
+    parser.add_argument(
+        "--output", default=os.path.join(DATA_DIR, "bench_db_results.json")
+    )
+    parser.add_argument(
+        "--replica", action="store_true", help="另以記憶體讀取副本量測並比較讀取延遲"
+    )
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="視為退步的中位數增幅（預設 20%%）"
+    )
+    args = parser.parse_args()
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+        },
+        "results": {},
+    }
+    for scale in args.scales.split(","):
+        scale = scale.strip()
+        print(f"\n📊 規模 {scale}：{db_synth.SCALES[scale]}")
+        report["results"][scale] = run_scale(
+            scale, db_synth.SCALES[scale], args.seed, args.regenerate
+        )
+        if args.replica:
+            report["results"][f"{scale}+replica"] = run_scale(
+                scale, db_synth.SCALES[scale], args.seed, False, replica=True
+            )
+            print_replica_comparison(
+                report["results"][scale], report["results"][f"{scale}+replica"], scale
+            )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已寫入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.threshold)
+        if regressions:
+            print("❌ 效能退步：")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print("✅ 無效能退步")
@@ -0,0 +1,289 @@
+"""
+天氣解析效能測試模組
+以錄製（或 weather_fixtures 產生）的全國回應量測 CWA 解析器的耗時與記憶體配置，
+輸出 JSON 結果供回歸比較
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import weather as wt
+import weather_fixtures as fixtures
+import weather_standin as standin
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def load_payloads(payload_dir: str = None, seed: int = 42) -> Dict[str, bytes]:
+    """
+    載入量測用的回應內容
+
+    Args:
+        payload_dir: 錄製回應的目錄（檔名為 <資料集代碼>.json），未指定則產生合成資料
+        seed: 合成資料的亂數種子
+
+    Returns:
+        資料集代碼 -> 回應原始內容
+    """
+    payloads = {}
+    for api_id in ("F-C0032-001", "F-D0047-091", "F-D0047-069"):
+        path = os.path.join(payload_dir, f"{api_id}.json") if payload_dir else None
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                payloads[api_id] = f.read()
+        else:
+            payloads[api_id] = json.dumps(
+                fixtures.cwa_payload(api_id, seed=seed), ensure_ascii=False
+            ).encode("utf-8")
+    return payloads
+
+
+def _parse_all(data: dict, api_id: str) -> List[List[Dict]]:
+    """解析回應中所有地點（與全國預報更新相同的路徑）"""
+    if api_id == "F-C0032-001":
+        return [
+            wt.parse_cwa_36h_location(loc)
+            for loc in wt.iter_cwa_locations(data, api_id)
+        ]
+    return [
+        wt.parse_cwa_7d_location(loc, 7)
+        for loc in data["records"]["locations"][0]["location"]
+    ]
+
+
+def _stream_parse_all(raw: bytes, api_id: str) -> List[List[Dict]]:
+    """以串流解析器逐段處理回應（模擬 iter_content 的片段大小）"""
+    chunk = wt.CWA_STREAM_CHUNK_BYTES
+    chunks = (raw[i : i + chunk] for i in range(0, len(raw), chunk))
+    if api_id == "F-C0032-001":
+        return [
+            wt.parse_cwa_36h_location(loc)
+            for loc in wt.iter_cwa_location_stream(chunks)
+        ]
+    return [
+        wt.parse_cwa_7d_location(loc, 7) for loc in wt.iter_cwa_location_stream(chunks)
+    ]
+
+
+def _measure(run: Callable[[], object], runs: int, locations: int) -> Dict:
+    """量測耗時（多次執行）與單次執行的記憶體配置"""
+    run()  # 預熱
+
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    result = run()
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    allocated = sum(
+        stat.size_diff
+        for stat in after.compare_to(before, "filename")
+        if stat.size_diff > 0
+    )
+    blocks = sum(
+        stat.count_diff
+        for stat in after.compare_to(before, "filename")
+        if stat.count_diff > 0
+    )
+    del result
+
+    median = statistics.median(timings)
+    return {
+        "runs": runs,
+        "locations": locations,
+        "median_ms": median,
+        "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "min_ms": timings[0],
+        "us_per_location": median * 1000 / max(locations, 1),
+        "peak_kb": peak / 1024,
+        "retained_kb": allocated / 1024,
+        "retained_blocks": blocks,
+    }
+
+
+def run_benchmarks(payloads: Dict[str, bytes], runs: int) -> Dict[str, Dict]:
+    """對每個資料集量測 JSON 解碼、解析、兩者合計與（全國資料集的）串流解析"""
+    results = {}
+    for api_id, raw in payloads.items():
+        data = json.loads(raw)
+        locations = len(
+            wt.iter_cwa_locations(data, api_id)
+            if api_id == "F-C0032-001"
+            else data["records"]["locations"][0]["location"]
+        )
+        size_kb = len(raw) / 1024
+        print(f"\n📦 {api_id}：{locations} 個地點，{size_kb:.0f} KB")
+
+        benchmarks = [
+            ("json_decode", lambda: json.loads(raw)),
+            ("parse", lambda: _parse_all(data, api_id)),
+            ("decode_and_parse", lambda: _parse_all(json.loads(raw), api_id)),
+        ]
+        if api_id in wt.NATIONAL_DATASETS:
+            benchmarks.append(("stream_parse", lambda: _stream_parse_all(raw, api_id)))
+
+        for name, run in benchmarks:
+            stats = _measure(run, runs, locations)
+            stats["payload_kb"] = size_kb
+            results[f"{api_id}/{name}"] = stats
+            print(
+                f"  {name:<18} 中位數 {stats['median_ms']:8.3f} ms"
+                f"（每地點 {stats['us_per_location']:7.1f} µs）"
+                f"  峰值 {stats['peak_kb']:8.1f} KB"
+            )
+    return results
+
+
+# 替身伺服器的故障情境：(名稱, 套用於 CWA 的故障設定)
+FALLBACK_SCENARIOS = [
+    ("healthy", {}),
+    ("cwa_slow", {"latency_ms": 300, "jitter_ms": 300}),
+    ("cwa_errors_50", {"error_rate": 0.5}),
+    ("cwa_down", {"error_rate": 1.0}),
+    ("cwa_timeout", {"timeout_rate": 1.0}),
+]
+
+FALLBACK_CITIES = ["泰山", "板橋", "信義", "花壇", "臺東市", "馬祖"]
+
+
+def run_fallback_benchmarks(runs: int, deadline: float) -> Dict[str, Dict]:
+    """
+    以本機替身伺服器量測各故障情境下 get_weather_forecast 的端到端延遲與降級結果
+
+    每次查詢前清除快取，確保每次都實際經過上游請求；斷路器於每個情境開始時重設
+    """
+    server, base_url = standin.start_standin()
+    standin.use_standin(base_url)
+    # 量測時的快取寫入不影響正式的預報儲存
+    wt.FORECAST_STORE_PATH = os.path.join(tempfile.mkdtemp(), "bench_weather_cache.db")
+
+    results = {}
+    try:
+        print(f"\n🛰️ 替身伺服器 {base_url}（總時限 {deadline} 秒）")
+        for name, faults in FALLBACK_SCENARIOS:
+            standin.configure(**standin.DEFAULT_FAULTS)
+            standin.configure("cwa", **faults)
+            for provider in list(wt._breakers):
+                wt._breakers[provider] = wt.CircuitBreaker(provider)
+            before = standin.get_stats()
+
+            timings, mock = [], 0
+            for i in range(runs):
+                wt.clear_forecast_cache()
+                start = time.perf_counter()
+                result = wt.get_weather_forecast(
+                    FALLBACK_CITIES[i % len(FALLBACK_CITIES)],
+                    7,
+                    deadline_seconds=deadline,
+                )
+                timings.append((time.perf_counter() - start) * 1000)
+                if result and "age_seconds" not in result[0]:
+                    mock += 1
+            timings.sort()
+
+            after = standin.get_stats()
+            stats = {
+                "runs": runs,
+                "median_ms": statistics.median(timings),
+                "p95_ms": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+                "mock_fallbacks": mock,
+                "cwa_requests": after["cwa"]["requests"] - before["cwa"]["requests"],
+                "owm_requests": after["owm"]["requests"] - before["owm"]["requests"],
+            }
+            results[f"fallback/{name}"] = stats
+            print(
+                f"  {name:<14} 中位數 {stats['median_ms']:8.1f} ms  p95 {stats['p95_ms']:8.1f} ms"
+                f"  模擬資料 {mock}/{runs}"
+                f"  上游請求 CWA {stats['cwa_requests']} / OWM {stats['owm_requests']}"
+            )
+    finally:
+        server.shutdown()
+    return results
+
+
+def compare_results(baseline: Dict, current: Dict, threshold: float) -> List[str]:
+    """比較兩次結果的中位數耗時，回傳超過門檻的退步項目"""
+    regressions = []
+    for name, stats in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or base["median_ms"] <= 0:
+            continue
+        ratio = stats["median_ms"] / base["median_ms"]
+        if ratio > 1 + threshold:
+            regressions.append(
+                f"{name}: {base['median_ms']:.3f} → {stats['median_ms']:.3f} ms (x{ratio:.2f})"
+            )
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="天氣解析效能測試")
+    parser.add_argument("--payload-dir", help="錄製回應的目錄（<資料集代碼>.json）")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument(
+        "--output", default=os.path.join(DATA_DIR, "bench_weather_results.json")
+    )
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="視為退步的中位數增幅（預設 20%%）"
+    )
+    parser.add_argument(
+        "--standin",
+        action="store_true",
+        help="另外以本機替身伺服器量測各故障情境的查詢延遲與降級",
+    )
+    parser.add_argument(
+        "--deadline",
+        type=float,
+        default=wt.WEATHER_DEADLINE_SECONDS,
+        help="替身情境的查詢總時限（秒）",
+    )
+    args = parser.parse_args()
+
+    os.makedirs(DATA_DIR, exist_ok=True)
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "payload_dir": args.payload_dir,
+        },
+        "results": run_benchmarks(
+            load_payloads(args.payload_dir, args.seed), args.runs
+        ),
+    }
+    if args.standin:
+        report["results"].update(
+            run_fallback_benchmarks(min(args.runs, 6), args.deadline)
+        )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ 結果已寫入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, report, args.threshold)
+        if regressions:
+            print("❌ 效能退步：")
+            for line in regressions:
+                print(f"  {line}")
+            raise SystemExit(1)
+        print("✅ 無效能退步")
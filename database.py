@@ -6,26 +6,509 @@
 import sqlite3
 import hashlib
 import os
+import re
+import sys
+import time
+import threading
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Iterator, Optional, Tuple
 import json
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "data", "clothes.db")
 
+# 慢查詢門檻（毫秒）與紀錄檔位置
+SLOW_QUERY_MS = float(os.environ.get("DB_SLOW_QUERY_MS", "100"))
+SLOW_QUERY_LOG_PATH = os.environ.get(
+    "DB_SLOW_QUERY_LOG",
+    os.path.join(os.path.dirname(__file__), "data", "slow_queries.log"),
+)
+
+# 單一處理函式查詢次數超過此值時印出警告
+QUERY_COUNT_WARN = int(os.environ.get("DB_QUERY_COUNT_WARN", "50"))
+
+# 變更紀錄保留天數，較舊的紀錄由每日維護清除（超過此期間未同步的用戶端需完整重新同步）
+CHANGE_LOG_RETENTION_DAYS = int(os.environ.get("DB_CHANGE_LOG_RETENTION_DAYS", "30"))
+
+
+# ========== 查詢監測 ==========
+
+# 以 SQL 指紋彙總的全域統計：{fingerprint: {"count", "total_ms", "max_ms", "rows"}}
+_query_stats: Dict[str, Dict] = {}
+_query_stats_lock = threading.Lock()
+
+# 目前作用中的查詢範圍（巢狀時每筆查詢都會計入所有範圍）
+_active_scopes: ContextVar[tuple] = ContextVar("db_query_scopes", default=())
+
+_FINGERPRINT_PATTERNS = [
+    (re.compile(r"'(?:[^']|'')*'"), "?"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "?"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+@functools.lru_cache(maxsize=512)
+def fingerprint_sql(sql: str) -> str:
+    """
+    將 SQL 正規化為指紋（去除常數與多餘空白），用於彙總同類查詢
+
+    每次查詢都會呼叫，程式中的 SQL 語句種類有限，結果以 LRU 快取保留
+    """
+    for pattern, replacement in _FINGERPRINT_PATTERNS:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+class QueryScope:
+    """一次請求（處理函式呼叫）內的查詢統計"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.total_ms = 0.0
+        self.rows = 0
+        self.queries: List[Dict] = []
+
+    def summary(self) -> str:
+        return f"{self.name}: {self.count} 次查詢，{self.rows} 筆資料，{self.total_ms:.2f} ms"
+
+
+@contextmanager
+def query_scope(name: str):
+    """
+    建立查詢統計範圍，範圍內所有資料庫查詢都會被計數
+
+    用法：
+        with db.query_scope("refresh_calendar_view") as scope:
+            ...
+        print(scope.count)
+    """
+    scope = QueryScope(name)
+    token = _active_scopes.set(_active_scopes.get() + (scope,))
+    try:
+        yield scope
+    finally:
+        _active_scopes.reset(token)
+
+
+def track_queries(func):
+    """裝飾器：以函式名稱建立查詢範圍，查詢次數過多時印出警告"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with query_scope(func.__name__) as scope:
+            result = func(*args, **kwargs)
+        if scope.count > QUERY_COUNT_WARN:
+            print(f"⚠️ 查詢次數過多 - {scope.summary()}")
+        return result
+
+    return wrapper
+
+
+@contextmanager
+def assert_max_queries(max_count: int, name: str = "assert_max_queries"):
+    """
+    測試輔助：範圍內查詢次數超過 max_count 時拋出 AssertionError，
+    用來攔截 N+1 查詢回歸
+
+    用法：
+        with db.assert_max_queries(3):
+            app.refresh_calendar_view(0)
+    """
+    with query_scope(name) as scope:
+        yield scope
+    if scope.count > max_count:
+        detail = "\n".join(
+            f"  {q['ms']:.2f} ms, {q['rows']} rows: {q['sql']}" for q in scope.queries
+        )
+        raise AssertionError(
+            f"預期最多 {max_count} 次查詢，實際 {scope.count} 次\n{detail}"
+        )
+
+
+def get_query_stats() -> List[Dict]:
+    """取得依總耗時排序的查詢統計"""
+    with _query_stats_lock:
+        stats = [dict(v, sql=k) for k, v in _query_stats.items()]
+    return sorted(stats, key=lambda x: x["total_ms"], reverse=True)
+
+
+def reset_query_stats():
+    """清除查詢統計"""
+    with _query_stats_lock:
+        _query_stats.clear()
+
+
+def _write_slow_query_log(conn, sql: str, params, elapsed_ms: float):
+    """寫入慢查詢紀錄（含 EXPLAIN QUERY PLAN）"""
+    plan = []
+    if (
+        sql.lstrip()
+        .upper()
+        .startswith(("SELECT", "UPDATE", "DELETE", "INSERT", "WITH"))
+    ):
+        try:
+            # 使用原生 cursor，避免 EXPLAIN 本身又被計入統計
+            raw_cursor = sqlite3.Connection.cursor(conn)
+            raw_cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            plan = [row[-1] for row in raw_cursor.fetchall()]
+        except sqlite3.Error as e:
+            plan = [f"(無法取得查詢計畫：{e})"]
+
+    try:
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG_PATH), exist_ok=True)
+        with open(SLOW_QUERY_LOG_PATH, "a", encoding="utf-8") as f:
+            f.write(
+                f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] "
+                f"{elapsed_ms:.2f} ms: {fingerprint_sql(sql)}\n"
+            )
+            for line in plan:
+                f.write(f"    {line}\n")
+    except OSError as e:
+        print(f"寫入慢查詢紀錄失敗：{e}")
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """記錄每次查詢耗時、回傳筆數的 cursor"""
+
+    def _begin(self, sql: str, params):
+        self._sql = sql
+        self._params = params
+        self._elapsed_ms = 0.0
+        self._slow_logged = False
+        self._record = {"sql": fingerprint_sql(sql), "ms": 0.0, "rows": 0}
+
+        with _query_stats_lock:
+            stat = _query_stats.setdefault(
+                self._record["sql"],
+                {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "rows": 0},
+            )
+            stat["count"] += 1
+        for scope in _active_scopes.get():
+            scope.count += 1
+            scope.queries.append(self._record)
+
+    def _account(self, elapsed_ms: float, rows: int = 0):
+        self._elapsed_ms += elapsed_ms
+        self._record["ms"] = self._elapsed_ms
+        self._record["rows"] += rows
+
+        with _query_stats_lock:
+            stat = _query_stats[self._record["sql"]]
+            stat["total_ms"] += elapsed_ms
+            stat["max_ms"] = max(stat["max_ms"], self._elapsed_ms)
+            stat["rows"] += rows
+        for scope in _active_scopes.get():
+            scope.total_ms += elapsed_ms
+            scope.rows += rows
+
+        if self._elapsed_ms >= SLOW_QUERY_MS and not self._slow_logged:
+            self._slow_logged = True
+            _write_slow_query_log(
+                self.connection, self._sql, self._params, self._elapsed_ms
+            )
+
+    def execute(self, sql, parameters=()):
+        self._begin(sql, parameters)
+        changes_before = self.connection.total_changes
+        start = time.perf_counter()
+        try:
+            result = super().execute(sql, parameters)
+        finally:
+            self._account((time.perf_counter() - start) * 1000)
+        self.connection._journal_write(sql, parameters, False, changes_before)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        if self.connection._replica_journal is not None:
+            # 需要重播到記憶體副本，先轉成 list 避免 generator 被用盡
+            seq_of_parameters = list(seq_of_parameters)
+        self._begin(sql, ())
+        changes_before = self.connection.total_changes
+        start = time.perf_counter()
+        try:
+            result = super().executemany(sql, seq_of_parameters)
+        finally:
+            self._account((time.perf_counter() - start) * 1000)
+        self.connection._journal_write(sql, seq_of_parameters, True, changes_before)
+        return result
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        if hasattr(self, "_record"):
+            self._account((time.perf_counter() - start) * 1000, 1 if row else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        if hasattr(self, "_record"):
+            self._account((time.perf_counter() - start) * 1000, len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        if hasattr(self, "_record"):
+            self._account((time.perf_counter() - start) * 1000, len(rows))
+        return rows
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """
+    所有 cursor 皆為 InstrumentedCursor 的連線
+
+    啟用記憶體副本時，磁碟連線會記錄寫入語句，commit（含 with conn: 區塊結束）後重播到副本
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._replica_journal: Optional[list] = None
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def _journal_write(self, sql: str, parameters, many: bool, changes_before: int):
+        # 以 total_changes 判斷是否有資料列異動（涵蓋 WITH ... INSERT/UPDATE/DELETE 等寫法），
+        # 結構變更不計入 total_changes，另以語句開頭判斷
+        if self._replica_journal is None:
+            return
+        if self.total_changes != changes_before or sql.lstrip()[:6].upper().startswith(
+            _SCHEMA_STATEMENTS
+        ):
+            self._replica_journal.append((sql, parameters, many))
+
+    def commit(self):
+        if not self._replica_journal:
+            return super().commit()
+        # 磁碟提交與副本重播在同一把鎖內，確保副本套用順序與磁碟一致
+        with _replica_lock:
+            super().commit()
+            journal, self._replica_journal = self._replica_journal, []
+            _apply_to_replica(journal)
+
+    def rollback(self):
+        super().rollback()
+        if self._replica_journal:
+            self._replica_journal = []
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 內建的 __exit__ 直接提交而不經過 commit()，改為呼叫覆寫的方法以重播到副本
+        if exc_type is None:
+            try:
+                self.commit()
+            except Exception:
+                self.rollback()
+                raise
+        else:
+            self.rollback()
+        return False
+
+
+# ========== 記憶體讀取副本 ==========
+
+# DB_MEMORY_REPLICA=1 時於啟動載入整個資料庫到記憶體，讀取改由記憶體提供
+MEMORY_REPLICA_ENABLED = os.environ.get("DB_MEMORY_REPLICA", "") == "1"
+
+# 需要重播到副本的結構變更語句（資料列異動以 total_changes 判斷）
+_SCHEMA_STATEMENTS = ("CREATE", "ALTER", "DROP")
+
+# 比對一致性時忽略的時間戳記欄位（重播時 CURRENT_TIMESTAMP 可能相差一秒）
+_REPLICA_VOLATILE_COLUMNS = {"created_at", "changed_at", "started_at", "duration_ms"}
+
+_replica_lock = threading.RLock()
+_replica = {"keeper": None, "uri": None, "shared_cache": False}
+
+
+def _open_replica_keeper() -> Tuple[sqlite3.Connection, str, bool]:
+    """建立記憶體資料庫（優先使用 memdb VFS，不支援時改用 shared cache）"""
+    uri = "file:/ootd_replica?vfs=memdb"
+    try:
+        keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return keeper, uri, False
+    except sqlite3.OperationalError:
+        uri = "file:ootd_replica?mode=memory&cache=shared"
+        keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return keeper, uri, True
+
+
+def enable_memory_replica() -> Dict:
+    """
+    以 backup API 將磁碟資料庫載入記憶體副本，之後讀取函式改由副本提供
+
+    寫入仍寫入磁碟，並在同一個 database.py 函式呼叫內重播到副本；
+    僅適用於單一程序存取資料庫（其他程序的寫入不會反映到副本）
+
+    Returns:
+        {"pages": 載入頁數, "ms": 耗時}
+    """
+    start = time.perf_counter()
+    with _replica_lock:
+        if _replica["keeper"] is None:
+            keeper, uri, shared_cache = _open_replica_keeper()
+            _replica.update(keeper=keeper, uri=uri, shared_cache=shared_cache)
+        _load_replica()
+        pages = _replica["keeper"].execute("PRAGMA page_count").fetchone()[0]
+
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"✅ 已載入記憶體讀取副本（{pages} 頁，{elapsed:.0f} ms）")
+    return {"pages": pages, "ms": elapsed}
+
+
+def disable_memory_replica():
+    """停用記憶體副本，讀取改回磁碟"""
+    with _replica_lock:
+        if _replica["keeper"] is not None:
+            _replica["keeper"].close()
+        _replica.update(keeper=None, uri=None, shared_cache=False)
+
+
+def is_memory_replica_active() -> bool:
+    """記憶體副本是否啟用中"""
+    return _replica["keeper"] is not None
+
+
+def _load_replica():
+    """由磁碟完整重新載入副本（呼叫端需持有 _replica_lock）"""
+    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    disk = sqlite3.connect(DB_PATH)
+    try:
+        disk.backup(_replica["keeper"])
+    finally:
+        disk.close()
+
+
+def _apply_to_replica(journal: list):
+    """將已提交到磁碟的寫入語句重播到副本，失敗時整個重新載入"""
+    keeper = _replica["keeper"]
+    if keeper is None:
+        return
+    try:
+        for sql, parameters, many in journal:
+            if many:
+                keeper.executemany(sql, parameters)
+            else:
+                keeper.execute(sql, parameters)
+        keeper.commit()
+    except sqlite3.Error as e:
+        keeper.rollback()
+        print(f"⚠️ 記憶體副本同步失敗，重新載入：{e}")
+        _load_replica()
+
+
+def _table_checksum(conn: sqlite3.Connection, table_name: str) -> Tuple[int, str]:
+    """計算資料表筆數與內容雜湊（忽略時間戳記欄位）"""
+    columns = [
+        row[1]
+        for row in conn.execute(f"PRAGMA table_info({table_name})").fetchall()
+        if row[1] not in _REPLICA_VOLATILE_COLUMNS
+    ]
+    digest = hashlib.md5()
+    count = 0
+    for row in conn.execute(
+        f"SELECT {', '.join(columns)} FROM {table_name} ORDER BY rowid"
+    ):
+        digest.update(repr(tuple(row)).encode())
+        count += 1
+    return count, digest.hexdigest()
+
+
+def check_replica_consistency(resync: bool = True) -> Dict:
+    """
+    比對磁碟與記憶體副本每個資料表的筆數與內容雜湊
+
+    Args:
+        resync: 不一致時是否重新載入副本
+
+    Returns:
+        {"consistent": bool, "tables": {資料表: {"disk", "replica"}}}
+    """
+    with _replica_lock:
+        if _replica["keeper"] is None:
+            return {"consistent": True, "tables": {}}
+
+        disk = sqlite3.connect(DB_PATH)
+        try:
+            table_names = [
+                row[0]
+                for row in disk.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+                ).fetchall()
+            ]
+            tables = {}
+            for table_name in table_names:
+                disk_sum = _table_checksum(disk, table_name)
+                try:
+                    replica_sum = _table_checksum(_replica["keeper"], table_name)
+                except sqlite3.Error:
+                    replica_sum = None
+                tables[table_name] = {"disk": disk_sum, "replica": replica_sum}
+        finally:
+            disk.close()
+
+        consistent = all(t["disk"] == t["replica"] for t in tables.values())
+        if not consistent:
+            mismatched = [
+                name for name, t in tables.items() if t["disk"] != t["replica"]
+            ]
+            print(f"⚠️ 記憶體副本與磁碟不一致：{', '.join(mismatched)}")
+            if resync:
+                _load_replica()
+
+    return {"consistent": consistent, "tables": tables}
+
+
+def get_connection(read_only: bool = False):
+    """
+    取得資料庫連線
+
+    Args:
+        read_only: 僅用於讀取；啟用記憶體副本時改連線到副本
+    """
+    if read_only and _replica["keeper"] is not None:
+        conn = sqlite3.connect(
+            _replica["uri"],
+            uri=True,
+            check_same_thread=False,
+            factory=InstrumentedConnection,
+        )
+        if _replica["shared_cache"]:
+            # shared cache 模式下讀取不等待表格鎖，避免與重播互相阻擋
+            conn.execute("PRAGMA read_uncommitted = 1")
+        conn.row_factory = sqlite3.Row
+        return conn
 
-def get_connection():
-    """取得資料庫連線"""
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
+    conn = sqlite3.connect(
+        DB_PATH, check_same_thread=False, factory=InstrumentedConnection
+    )
     conn.row_factory = sqlite3.Row
+    if _replica["keeper"] is not None:
+        conn._replica_journal = []
     return conn
 
 
+# 記錄變更、可增量同步的資料表
+SYNC_TABLES = ("clothes", "outfits", "options", "locations")
+
+
 def init_database():
     """初始化資料庫結構"""
     conn = get_connection()
     cursor = conn.cursor()
 
+    # 新資料庫啟用增量回收（需在建立資料表前設定，舊資料庫由 run_maintenance 轉換）
+    cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
     # 使用者資料表
     cursor.execute(
         """
@@ -121,6 +604,66 @@ def init_database():
     """
     )
 
+    # 變更紀錄表（供用戶端增量同步，version 單調遞增不重複使用）
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_log (
+            version INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            table_name TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            operation TEXT NOT NULL,
+            changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """
+    )
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_change_log_user_version ON change_log (user_id, version)"
+    )
+
+    # 每位使用者已清除的最大變更版本，用戶端版本低於此值時需完整重新同步
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS change_log_pruned (
+            user_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+    """
+    )
+
+    # 以觸發器記錄同步資料表的新增、修改、刪除
+    for table_name in SYNC_TABLES:
+        for operation, row in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            cursor.execute(
+                f"""
+                CREATE TRIGGER IF NOT EXISTS trg_{table_name}_{operation.lower()}_log
+                AFTER {operation} ON {table_name}
+                BEGIN
+                    INSERT INTO change_log (user_id, table_name, row_id, operation)
+                    VALUES ({row}.user_id, '{table_name}', {row}.id, '{operation.lower()}');
+                END
+            """
+            )
+
+    # 資料庫維護紀錄表
+    cursor.execute(
+        """
+        CREATE TABLE IF NOT EXISTS maintenance_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            started_at TEXT NOT NULL,
+            duration_ms REAL NOT NULL,
+            integrity TEXT,
+            page_count_before INTEGER,
+            page_count_after INTEGER,
+            freelist_before INTEGER,
+            freelist_after INTEGER,
+            probe_ms_before REAL,
+            probe_ms_after REAL,
+            details TEXT
+        )
+    """
+    )
+
     conn.commit()
     conn.close()
 
@@ -160,7 +703,7 @@ def create_user(username: str, password: str, email: str = None) -> Tuple[bool,
 
 def verify_user(username: str, password: str) -> Optional[int]:
     """驗證使用者，返回 user_id"""
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
     password_hash = hash_password(password)
     cursor.execute(
@@ -175,7 +718,7 @@ def verify_user(username: str, password: str) -> Optional[int]:
 def get_password_hint(username: str) -> Optional[str]:
     """取得使用者密碼（明文）
     注意：儲存明文密碼不是安全的做法，僅供個人使用或教學用途"""
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT plain_password, password_hash FROM users WHERE username = ?",
@@ -193,7 +736,7 @@ def get_password_hint(username: str) -> Optional[str]:
 
 def get_user_email_settings(user_id: int) -> Tuple[str, str, bool]:
     """取得使用者的 Email 設定"""
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT email, email_time, email_enabled FROM users WHERE id = ?", (user_id,)
@@ -241,7 +784,7 @@ def get_user_email(user_id: int) -> Optional[str]:
     Returns:
         str: 使用者的 Email,如果不存在則回傳 None
     """
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute("SELECT email FROM users WHERE id = ?", (user_id,))
     result = cursor.fetchone()
@@ -251,32 +794,37 @@ def get_user_email(user_id: int) -> Optional[str]:
 
 # ========== 選項管理 ==========
 
+# 新使用者的預設選項
+DEFAULT_OPTIONS = {
+    # 上衣
+    "color_上衣": ["白", "黑", "灰", "卡其", "藍"],
+    "material_上衣": ["襯衫", "外搭", "一般", "刷毛", "高領", "毛衣"],
+    "sleeve_上衣": ["長袖", "短袖"],
+    # 褲子
+    "color_褲子": ["白", "黑"],
+    "material_褲子": ["一般", "刷毛", "牛仔", "西裝"],
+    "sleeve_褲子": ["長褲", "短褲"],
+    # 外套
+    "color_外套": ["白", "黑"],
+    "material_外套": ["衝鋒", "休閒", "正式", "羽絨", "皮革"],
+    # 襪子
+    "color_襪子": ["白", "黑"],
+    "sleeve_襪子": ["長襪", "中襪", "短襪"],
+    # 場合（全局）
+    "occasion": ["正式", "運動", "休閒"],
+}
+
+# 衣物類別與季節
+CATEGORIES = ["上衣", "褲子", "外套", "襪子"]
+SEASONS = ["春", "夏", "秋", "冬"]
+
 
 def init_default_options(user_id: int):
     """初始化預設選項"""
     conn = get_connection()
     cursor = conn.cursor()
 
-    default_options = {
-        # 上衣
-        "color_上衣": ["白", "黑", "灰", "卡其", "藍"],
-        "material_上衣": ["襯衫", "外搭", "一般", "刷毛", "高領", "毛衣"],
-        "sleeve_上衣": ["長袖", "短袖"],
-        # 褲子
-        "color_褲子": ["白", "黑"],
-        "material_褲子": ["一般", "刷毛", "牛仔", "西裝"],
-        "sleeve_褲子": ["長褲", "短褲"],
-        # 外套
-        "color_外套": ["白", "黑"],
-        "material_外套": ["衝鋒", "休閒", "正式", "羽絨", "皮革"],
-        # 襪子
-        "color_襪子": ["白", "黑"],
-        "sleeve_襪子": ["長襪", "中襪", "短襪"],
-        # 場合（全局）
-        "occasion": ["正式", "運動", "休閒"],
-    }
-
-    for option_type, values in default_options.items():
+    for option_type, values in DEFAULT_OPTIONS.items():
         for value in values:
             try:
                 cursor.execute(
@@ -292,7 +840,7 @@ def init_default_options(user_id: int):
 
 def get_user_options(user_id: int, option_type: str) -> List[str]:
     """取得使用者的選項列表"""
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT option_value FROM options WHERE user_id = ? AND option_type = ? ORDER BY option_value",
@@ -337,6 +885,138 @@ def delete_user_option(user_id: int, option_type: str, option_value: str) -> boo
 
 # ========== 衣物管理 ==========
 
+# 衣物欄位（SELECT 順序與 Clothing 屬性一致）
+CLOTHING_COLUMNS = (
+    "id",
+    "user_id",
+    "category",
+    "color",
+    "material",
+    "sleeve_type",
+    "seasons",
+    "occasions",
+    "name",
+    "created_at",
+)
+CLOTHING_SELECT = f"SELECT {', '.join(CLOTHING_COLUMNS)} FROM clothes"
+
+
+def _intern(value: Optional[str]) -> Optional[str]:
+    """字串駐留：同樣的類別、顏色等只保留一份"""
+    return sys.intern(value) if value else value
+
+
+@functools.lru_cache(maxsize=1024)
+def _decode_tags(raw: Optional[str]) -> Tuple[str, ...]:
+    """
+    將 seasons / occasions 的 JSON 字串解碼為駐留字串的 tuple
+
+    組合數量很少，相同 JSON 字串只解碼一次並共用同一個 tuple
+    """
+    if not raw:
+        return ()
+    return tuple(sys.intern(value) for value in json.loads(raw))
+
+
+class Clothing:
+    """
+    單件衣物資料
+
+    使用 __slots__ 取代每列一個 dict，季節與場合為共用的 tuple；
+    支援 cloth["color"]、cloth.get("name")、dict(cloth) 等 dict 寫法以相容既有程式
+    """
+
+    __slots__ = CLOTHING_COLUMNS
+
+    def __init__(
+        self,
+        id,
+        user_id,
+        category,
+        color,
+        material,
+        sleeve_type,
+        seasons,
+        occasions,
+        name,
+        created_at,
+    ):
+        self.id = id
+        self.user_id = user_id
+        self.category = category
+        self.color = color
+        self.material = material
+        self.sleeve_type = sleeve_type
+        self.seasons = seasons
+        self.occasions = occasions
+        self.name = name
+        self.created_at = created_at
+
+    @classmethod
+    def from_row(cls, row) -> "Clothing":
+        """由 CLOTHING_SELECT 查詢結果建立"""
+        return cls(
+            row[0],
+            row[1],
+            _intern(row[2]),
+            _intern(row[3]),
+            _intern(row[4]),
+            _intern(row[5]),
+            _decode_tags(row[6]),
+            _decode_tags(row[7]),
+            _intern(row[8]),
+            row[9],
+        )
+
+    # dict 相容介面
+    def __getitem__(self, key: str):
+        if key not in CLOTHING_COLUMNS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __setitem__(self, key: str, value):
+        if key not in CLOTHING_COLUMNS:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key) -> bool:
+        return key in CLOTHING_COLUMNS
+
+    def __iter__(self):
+        return iter(CLOTHING_COLUMNS)
+
+    def __len__(self) -> int:
+        return len(CLOTHING_COLUMNS)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Clothing):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Clothing({self.to_dict()!r})"
+
+    def get(self, key: str, default=None):
+        return getattr(self, key, default) if key in CLOTHING_COLUMNS else default
+
+    def keys(self):
+        return CLOTHING_COLUMNS
+
+    def values(self):
+        return [getattr(self, key) for key in CLOTHING_COLUMNS]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in CLOTHING_COLUMNS]
+
+    def to_dict(self) -> Dict:
+        """轉為一般 dict（seasons / occasions 為 list），供 JSON 輸出使用"""
+        data = dict(self.items())
+        data["seasons"] = list(self.seasons)
+        data["occasions"] = list(self.occasions)
+        return data
+
 
 def add_clothing(
     user_id: int,
@@ -387,12 +1067,12 @@ def get_user_clothes(
     material: str = None,
     season: str = None,
     occasion: str = None,
-) -> List[Dict]:
+) -> List[Clothing]:
     """取得使用者的衣物列表（支援篩選）"""
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
 
-    query = "SELECT * FROM clothes WHERE user_id = ?"
+    query = f"{CLOTHING_SELECT} WHERE user_id = ?"
     params = [user_id]
 
     if category:
@@ -412,14 +1092,12 @@ def get_user_clothes(
 
     clothes = []
     for row in results:
-        cloth = dict(row)
-        cloth["seasons"] = json.loads(cloth["seasons"])
-        cloth["occasions"] = json.loads(cloth["occasions"])
+        cloth = Clothing.from_row(row)
 
         # 季節和場合篩選
-        if season and season not in cloth["seasons"]:
+        if season and season not in cloth.seasons:
             continue
-        if occasion and occasion not in cloth["occasions"]:
+        if occasion and occasion not in cloth.occasions:
             continue
 
         clothes.append(cloth)
@@ -466,13 +1144,23 @@ def update_clothing(
 
 
 def delete_clothing(cloth_id: int, user_id: int) -> bool:
-    """刪除衣物"""
+    """刪除衣物（同時從所有穿搭計畫中移除該衣物）"""
     try:
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute(
             "DELETE FROM clothes WHERE id = ? AND user_id = ?", (cloth_id, user_id)
         )
+        if cursor.rowcount:
+            cursor.execute(
+                """
+                SELECT id, clothes_ids FROM outfits
+                WHERE user_id = ?
+                  AND EXISTS (SELECT 1 FROM json_each(outfits.clothes_ids) WHERE value = ?)
+            """,
+                (user_id, cloth_id),
+            )
+            _rewrite_outfits(cursor, cursor.fetchall(), lambda cid: cid != cloth_id)
         conn.commit()
         conn.close()
         return True
@@ -480,24 +1168,43 @@ def delete_clothing(cloth_id: int, user_id: int) -> bool:
         return False
 
 
-def get_clothing_by_id(cloth_id: int, user_id: int) -> Optional[Dict]:
+def get_clothing_by_id(cloth_id: int, user_id: int) -> Optional[Clothing]:
     """根據 ID 取得單一衣物"""
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute(
-        "SELECT * FROM clothes WHERE id = ? AND user_id = ?", (cloth_id, user_id)
+        f"{CLOTHING_SELECT} WHERE id = ? AND user_id = ?", (cloth_id, user_id)
     )
     result = cursor.fetchone()
     conn.close()
 
     if result:
-        cloth = dict(result)
-        cloth["seasons"] = json.loads(cloth["seasons"])
-        cloth["occasions"] = json.loads(cloth["occasions"])
-        return cloth
+        return Clothing.from_row(result)
     return None
 
 
+def get_clothes_by_ids(user_id: int, cloth_ids) -> Dict[int, Clothing]:
+    """一次查詢多件衣物，回傳 {衣物 ID: Clothing}（不存在的 ID 不會出現）"""
+    cloth_ids = list(cloth_ids)
+    if not cloth_ids:
+        return {}
+
+    conn = get_connection(read_only=True)
+    cursor = conn.cursor()
+    cursor.execute(
+        f"{CLOTHING_SELECT} WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+        (user_id, json.dumps(cloth_ids)),
+    )
+    results = cursor.fetchall()
+    conn.close()
+
+    clothes = {}
+    for row in results:
+        cloth = Clothing.from_row(row)
+        clothes[cloth.id] = cloth
+    return clothes
+
+
 # ========== 穿搭計畫管理 ==========
 
 
@@ -542,9 +1249,80 @@ def save_outfit(user_id: int, date: str, clothes_ids: List[int]) -> bool:
         return False
 
 
+def _rewrite_outfits(cursor, rows, keep) -> Tuple[int, int]:
+    """
+    依 keep(cloth_id) 過濾穿搭中的衣物 ID 並寫回，清空後的穿搭直接刪除
+
+    Args:
+        rows: (outfit id, clothes_ids JSON) 列表
+
+    Returns:
+        (更新筆數, 刪除筆數)
+    """
+    updated = []
+    deleted = []
+    for outfit_id, raw_ids in rows:
+        clothes_ids = [cid for cid in json.loads(raw_ids) if keep(cid)]
+        if clothes_ids:
+            updated.append((json.dumps(clothes_ids), outfit_id))
+        else:
+            deleted.append((outfit_id,))
+
+    if updated:
+        cursor.executemany("UPDATE outfits SET clothes_ids = ? WHERE id = ?", updated)
+    if deleted:
+        cursor.executemany("DELETE FROM outfits WHERE id = ?", deleted)
+    return len(updated), len(deleted)
+
+
+def repair_outfit_references(user_id: int = None) -> Dict[str, int]:
+    """
+    移除穿搭計畫中已不存在（或不屬於該使用者）的衣物 ID
+
+    用於修復舊版 delete_clothing 留下的無效參照，亦由每日維護排程執行
+
+    Args:
+        user_id: 只修復指定使用者（預設全部）
+
+    Returns:
+        {"outfits_updated": 更新筆數, "outfits_deleted": 刪除筆數}
+    """
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    query = """
+        SELECT o.id, o.clothes_ids, o.user_id FROM outfits o
+        WHERE EXISTS (
+            SELECT 1 FROM json_each(o.clothes_ids) j
+            WHERE NOT EXISTS (
+                SELECT 1 FROM clothes c WHERE c.id = j.value AND c.user_id = o.user_id
+            )
+        )
+    """
+    params = []
+    if user_id is not None:
+        query += " AND o.user_id = ?"
+        params.append(user_id)
+    cursor.execute(query, params)
+    dangling = cursor.fetchall()
+
+    updated = deleted = 0
+    for owner in {row[2] for row in dangling}:
+        cursor.execute("SELECT id FROM clothes WHERE user_id = ?", (owner,))
+        valid_ids = {row[0] for row in cursor.fetchall()}
+        rows = [(row[0], row[1]) for row in dangling if row[2] == owner]
+        result = _rewrite_outfits(cursor, rows, valid_ids.__contains__)
+        updated += result[0]
+        deleted += result[1]
+
+    conn.commit()
+    conn.close()
+    return {"outfits_updated": updated, "outfits_deleted": deleted}
+
+
 def get_outfit(user_id: int, date: str) -> List[int]:
     """取得指定日期的穿搭計畫"""
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT clothes_ids FROM outfits WHERE user_id = ? AND date = ?",
@@ -562,7 +1340,7 @@ def get_outfits_range(
     user_id: int, start_date: str, end_date: str
 ) -> Dict[str, List[int]]:
     """取得日期範圍內的穿搭計畫"""
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT date, clothes_ids FROM outfits WHERE user_id = ? AND date BETWEEN ? AND ?",
@@ -577,6 +1355,41 @@ def get_outfits_range(
     return outfits
 
 
+def get_outfit_calendar(
+    user_id: int, start_date: str, days: int = 7
+) -> List[Tuple[str, List[Clothing]]]:
+    """
+    取得連續多天的穿搭與衣物資料（行事曆視圖使用）
+
+    不論天數與衣物件數，固定為穿搭與衣物各一次查詢
+
+    Args:
+        user_id: 使用者 ID
+        start_date: 起始日期（YYYY-MM-DD）
+        days: 天數
+
+    Returns:
+        [(日期, [衣物])]，依日期排序；沒有穿搭或衣物已刪除的日期為空列表
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    dates = [(start + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+    outfits = get_outfits_range(user_id, dates[0], dates[-1])
+    clothes = get_clothes_by_ids(
+        user_id, {cloth_id for ids in outfits.values() for cloth_id in ids}
+    )
+    return [
+        (
+            date,
+            [
+                clothes[cloth_id]
+                for cloth_id in outfits.get(date, [])
+                if cloth_id in clothes
+            ],
+        )
+        for date in dates
+    ]
+
+
 def delete_outfit(user_id: int, date: str) -> bool:
     """刪除指定日期的穿搭計畫"""
     try:
@@ -594,7 +1407,7 @@ def delete_outfit(user_id: int, date: str) -> bool:
 
 def get_outfit_history_by_clothing(user_id: int, cloth_id: int) -> List[Dict]:
     """查詢某件衣物的歷史穿搭記錄"""
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT date, clothes_ids FROM outfits WHERE user_id = ? ORDER BY date DESC",
@@ -616,7 +1429,7 @@ def get_outfit_history_by_clothing(user_id: int, cloth_id: int) -> List[Dict]:
 def get_all_past_outfits(user_id: int) -> List[Dict]:
     """取得所有過去的穿搭記錄"""
     today = datetime.now().strftime("%Y-%m-%d")
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT date, clothes_ids FROM outfits WHERE user_id = ? AND date < ? ORDER BY date DESC",
@@ -632,16 +1445,78 @@ def get_all_past_outfits(user_id: int) -> List[Dict]:
     return outfits
 
 
+def get_outfit_timeline_page(
+    user_id: int, before_date: str = None, limit: int = 20
+) -> Dict:
+    """
+    以日期為游標，由新到舊取得一頁過去的穿搭（含衣物資料）
+
+    Args:
+        user_id: 使用者 ID
+        before_date: 游標，只取此日期之前的穿搭（預設今天，即所有過去穿搭）
+        limit: 每頁筆數
+
+    Returns:
+        {"outfits": [{"date", "clothes_ids", "clothes"}], "next_cursor": 下一頁游標或 None}
+    """
+    before_date = before_date or datetime.now().strftime("%Y-%m-%d")
+    conn = get_connection(read_only=True)
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT date, clothes_ids FROM outfits WHERE user_id = ? AND date < ? ORDER BY date DESC LIMIT ?",
+        (user_id, before_date, limit),
+    )
+    results = cursor.fetchall()
+    conn.close()
+
+    outfits = [{"date": row[0], "clothes_ids": json.loads(row[1])} for row in results]
+
+    # 整頁衣物一次查詢
+    clothes = get_clothes_by_ids(
+        user_id, {cid for outfit in outfits for cid in outfit["clothes_ids"]}
+    )
+    for outfit in outfits:
+        outfit["clothes"] = [
+            clothes[cid] for cid in outfit["clothes_ids"] if cid in clothes
+        ]
+
+    next_cursor = outfits[-1]["date"] if len(outfits) == limit else None
+    return {"outfits": outfits, "next_cursor": next_cursor}
+
+
+def iter_outfit_timeline(
+    user_id: int, page_size: int = 20, before_date: str = None
+) -> Iterator[List[Dict]]:
+    """
+    由新到舊逐頁產生過去的穿搭，記憶體用量只與 page_size 有關
+
+    用法：
+        for page in db.iter_outfit_timeline(user_id, page_size=50):
+            for outfit in page:
+                ...
+    """
+    page_cursor = before_date
+    while True:
+        page = get_outfit_timeline_page(user_id, page_cursor, page_size)
+        if page["outfits"]:
+            yield page["outfits"]
+        page_cursor = page["next_cursor"]
+        if not page_cursor:
+            break
+
+
 # ========== 地區管理 ==========
 
+# 新使用者的預設地區
+DEFAULT_LOCATIONS = ["泰山", "板橋"]
+
 
 def init_default_locations(user_id: int):
     """初始化預設地區"""
     conn = get_connection()
     cursor = conn.cursor()
 
-    default_locations = ["泰山", "板橋"]
-    for location in default_locations:
+    for location in DEFAULT_LOCATIONS:
         try:
             cursor.execute(
                 "INSERT OR IGNORE INTO locations (user_id, city_name) VALUES (?, ?)",
@@ -656,7 +1531,7 @@ def init_default_locations(user_id: int):
 
 def get_user_locations(user_id: int) -> List[str]:
     """取得使用者的地區列表"""
-    conn = get_connection()
+    conn = get_connection(read_only=True)
     cursor = conn.cursor()
     cursor.execute(
         "SELECT city_name FROM locations WHERE user_id = ? ORDER BY id", (user_id,)
@@ -698,7 +1573,352 @@ def delete_user_location(user_id: int, city_name: str) -> bool:
         return False
 
 
+# ========== 增量同步 ==========
+
+
+def _get_latest_change_version(cursor, user_id: int) -> int:
+    """最新的變更版本（變更紀錄已全部清除時為已清除的最大版本）"""
+    cursor.execute(
+        """
+        SELECT MAX(
+            COALESCE((SELECT MAX(version) FROM change_log WHERE user_id = ?), 0),
+            COALESCE((SELECT version FROM change_log_pruned WHERE user_id = ?), 0)
+        )
+    """,
+        (user_id, user_id),
+    )
+    return cursor.fetchone()[0]
+
+
+def get_latest_change_version(user_id: int) -> int:
+    """取得使用者目前最新的變更版本（完整讀取資料後以此作為同步起點）"""
+    conn = get_connection(read_only=True)
+    cursor = conn.cursor()
+    version = _get_latest_change_version(cursor, user_id)
+    conn.close()
+    return version
+
+
+def prune_change_log(retention_days: int = None) -> int:
+    """
+    清除超過保留期間的變更紀錄，並記錄每位使用者已清除的最大版本
+
+    Args:
+        retention_days: 保留天數（預設 CHANGE_LOG_RETENTION_DAYS）
+
+    Returns:
+        清除的紀錄筆數
+    """
+    if retention_days is None:
+        retention_days = CHANGE_LOG_RETENTION_DAYS
+    cutoff = f"-{int(retention_days)} days"
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute(
+        """
+        INSERT INTO change_log_pruned (user_id, version)
+        SELECT user_id, MAX(version) FROM change_log
+        WHERE changed_at < datetime('now', ?)
+        GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET version = MAX(version, excluded.version)
+    """,
+        (cutoff,),
+    )
+    cursor.execute(
+        "DELETE FROM change_log WHERE changed_at < datetime('now', ?)", (cutoff,)
+    )
+    pruned = cursor.rowcount
+    conn.commit()
+    conn.close()
+    return pruned
+
+
+def _load_sync_rows(cursor, user_id: int, table_name: str, row_ids: List[int]) -> Dict:
+    """一次讀取某資料表多筆目前的資料，回傳 {row_id: dict}"""
+    if table_name == "clothes":
+        cursor.execute(
+            f"{CLOTHING_SELECT} WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+            (user_id, json.dumps(row_ids)),
+        )
+        return {row[0]: Clothing.from_row(row).to_dict() for row in cursor.fetchall()}
+
+    cursor.execute(
+        f"SELECT * FROM {table_name} WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))",
+        (user_id, json.dumps(row_ids)),
+    )
+    rows = {}
+    for row in cursor.fetchall():
+        data = dict(row)
+        if table_name == "outfits":
+            data["clothes_ids"] = json.loads(data["clothes_ids"])
+        rows[data["id"]] = data
+    return rows
+
+
+def changes_since(user_id: int, version: int = 0, limit: int = 1000) -> Dict:
+    """
+    取得指定版本之後的變更
+
+    同一筆資料多次變更只回傳最後一次；新增與修改附上目前的資料內容。
+    所需的變更紀錄已被維護清除時回傳 resync_required，用戶端應完整重新讀取資料，
+    之後從回傳的 version 繼續同步
+
+    Args:
+        user_id: 使用者 ID
+        version: 用戶端已同步到的版本（0 表示從頭開始）
+        limit: 最多處理幾筆變更紀錄
+
+    Returns:
+        {
+            "version": 本次同步到的版本（下次呼叫時傳入）,
+            "has_more": 是否還有更多變更,
+            "resync_required": 是否需要完整重新同步,
+            "changes": [{"version", "table", "id", "operation", "data"}],
+        }
+    """
+    conn = get_connection(read_only=True)
+    cursor = conn.cursor()
+
+    cursor.execute(
+        "SELECT version FROM change_log_pruned WHERE user_id = ?", (user_id,)
+    )
+    pruned = cursor.fetchone()
+    if pruned and pruned[0] > version:
+        latest = _get_latest_change_version(cursor, user_id)
+        conn.close()
+        return {
+            "version": latest,
+            "has_more": False,
+            "resync_required": True,
+            "changes": [],
+        }
+
+    cursor.execute(
+        """
+        SELECT version, table_name, row_id, operation FROM change_log
+        WHERE user_id = ? AND version > ?
+        ORDER BY version LIMIT ?
+    """,
+        (user_id, version, limit + 1),
+    )
+    results = cursor.fetchall()
+    has_more = len(results) > limit
+    results = results[:limit]
+
+    # 同一筆資料只保留最後一次變更
+    latest = {}
+    for row in results:
+        latest[(row[1], row[2])] = {
+            "version": row[0],
+            "table": row[1],
+            "id": row[2],
+            "operation": row[3],
+            "data": None,
+        }
+
+    # 每個資料表一次查詢取回目前內容
+    for table_name in SYNC_TABLES:
+        row_ids = [
+            change["id"]
+            for change in latest.values()
+            if change["table"] == table_name and change["operation"] != "delete"
+        ]
+        if not row_ids:
+            continue
+        rows = _load_sync_rows(cursor, user_id, table_name, row_ids)
+        for row_id in row_ids:
+            latest[(table_name, row_id)]["data"] = rows.get(row_id)
+
+    conn.close()
+
+    changes = sorted(latest.values(), key=lambda change: change["version"])
+    return {
+        "version": results[-1][0] if results else version,
+        "has_more": has_more,
+        "resync_required": False,
+        "changes": changes,
+    }
+
+
+# ========== 資料庫維護 ==========
+
+# 維護前後用來量測查詢延遲的代表性查詢（對應主要讀取路徑）
+MAINTENANCE_PROBE_QUERIES = [
+    "SELECT * FROM clothes WHERE user_id = ? ORDER BY id DESC",
+    "SELECT date, clothes_ids FROM outfits WHERE user_id = ? ORDER BY date DESC",
+    "SELECT option_value FROM options WHERE user_id = ? AND option_type = 'occasion' ORDER BY option_value",
+    "SELECT city_name FROM locations WHERE user_id = ? ORDER BY id",
+]
+
+
+def _get_page_stats(cursor) -> Dict[str, int]:
+    """取得資料庫頁面統計"""
+    return {
+        "page_count": cursor.execute("PRAGMA page_count").fetchone()[0],
+        "freelist_count": cursor.execute("PRAGMA freelist_count").fetchone()[0],
+        "page_size": cursor.execute("PRAGMA page_size").fetchone()[0],
+    }
+
+
+def _run_probe_queries(cursor) -> float:
+    """執行代表性查詢並回傳總耗時（毫秒），以衣物最多的使用者為樣本"""
+    row = cursor.execute(
+        "SELECT user_id FROM clothes GROUP BY user_id ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()
+    if not row:
+        return 0.0
+
+    start = time.perf_counter()
+    for query in MAINTENANCE_PROBE_QUERIES:
+        cursor.execute(query, (row[0],)).fetchall()
+    return (time.perf_counter() - start) * 1000
+
+
+def run_maintenance(vacuum_pages: int = 0) -> Dict:
+    """
+    執行資料庫維護：更新查詢統計、回收空閒頁面、修復穿搭參照、清除過期變更紀錄、檢查完整性
+
+    Args:
+        vacuum_pages: incremental_vacuum 最多回收的頁數（0 表示全部回收）
+
+    Returns:
+        維護結果，包含各步驟耗時與前後頁面數、代表性查詢耗時
+    """
+    started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    total_start = time.perf_counter()
+    steps = {}
+
+    conn = get_connection()
+    cursor = conn.cursor()
+
+    before = _get_page_stats(cursor)
+    probe_before = _run_probe_queries(cursor)
+
+    # 1. 清除穿搭中已刪除衣物的參照（先於回收，釋出的頁面可一併回收）
+    step_start = time.perf_counter()
+    steps["repair"] = repair_outfit_references()
+    steps["repair_ms"] = (time.perf_counter() - step_start) * 1000
+
+    # 2. 清除超過保留期間的變更紀錄（同樣先於回收）
+    step_start = time.perf_counter()
+    steps["change_log_pruned"] = prune_change_log()
+    steps["change_log_ms"] = (time.perf_counter() - step_start) * 1000
+
+    # 3. 查詢規劃統計：首次執行完整 ANALYZE，之後交由 PRAGMA optimize 判斷
+    step_start = time.perf_counter()
+    has_stats = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+    ).fetchone()
+    if has_stats:
+        cursor.execute("PRAGMA optimize")
+        steps["optimize"] = "PRAGMA optimize"
+    else:
+        cursor.execute("ANALYZE")
+        steps["optimize"] = "ANALYZE"
+    conn.commit()
+    steps["optimize_ms"] = (time.perf_counter() - step_start) * 1000
+
+    # 4. 回收空閒頁面：舊資料庫尚未啟用增量回收時，以一次完整 VACUUM 轉換
+    step_start = time.perf_counter()
+    auto_vacuum = cursor.execute("PRAGMA auto_vacuum").fetchone()[0]
+    if auto_vacuum == 2:
+        cursor.execute(f"PRAGMA incremental_vacuum({int(vacuum_pages)})")
+        cursor.fetchall()
+        steps["vacuum"] = "incremental_vacuum"
+    else:
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("VACUUM")
+        steps["vacuum"] = "VACUUM (轉換為 INCREMENTAL)"
+    conn.commit()
+    steps["vacuum_ms"] = (time.perf_counter() - step_start) * 1000
+
+    # 5. 完整性檢查
+    step_start = time.perf_counter()
+    integrity_rows = cursor.execute("PRAGMA integrity_check").fetchall()
+    integrity = "; ".join(str(row[0]) for row in integrity_rows[:10])
+    steps["integrity_ms"] = (time.perf_counter() - step_start) * 1000
+
+    # 6. 記憶體副本一致性檢查（不一致時重新載入）
+    if is_memory_replica_active():
+        step_start = time.perf_counter()
+        steps["replica_consistent"] = check_replica_consistency()["consistent"]
+        steps["replica_ms"] = (time.perf_counter() - step_start) * 1000
+
+    after = _get_page_stats(cursor)
+    probe_after = _run_probe_queries(cursor)
+    duration_ms = (time.perf_counter() - total_start) * 1000
+
+    cursor.execute(
+        """
+        INSERT INTO maintenance_log (
+            started_at, duration_ms, integrity,
+            page_count_before, page_count_after, freelist_before, freelist_after,
+            probe_ms_before, probe_ms_after, details
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+        (
+            started_at,
+            duration_ms,
+            integrity,
+            before["page_count"],
+            after["page_count"],
+            before["freelist_count"],
+            after["freelist_count"],
+            probe_before,
+            probe_after,
+            json.dumps(steps, ensure_ascii=False),
+        ),
+    )
+    conn.commit()
+    conn.close()
+
+    result = {
+        "started_at": started_at,
+        "duration_ms": duration_ms,
+        "integrity": integrity,
+        "before": before,
+        "after": after,
+        "probe_ms_before": probe_before,
+        "probe_ms_after": probe_after,
+        "steps": steps,
+    }
+
+    status = "✅" if integrity == "ok" else "❌"
+    print(
+        f"{status} 資料庫維護完成（{duration_ms:.0f} ms）："
+        f"頁數 {before['page_count']} → {after['page_count']}，"
+        f"空閒頁 {before['freelist_count']} → {after['freelist_count']}，"
+        f"查詢 {probe_before:.2f} → {probe_after:.2f} ms，完整性 {integrity}"
+    )
+    return result
+
+
+def get_maintenance_history(limit: int = 10) -> List[Dict]:
+    """取得最近的資料庫維護紀錄"""
+    conn = get_connection(read_only=True)
+    cursor = conn.cursor()
+    cursor.execute("SELECT * FROM maintenance_log ORDER BY id DESC LIMIT ?", (limit,))
+    results = cursor.fetchall()
+    conn.close()
+
+    history = []
+    for row in results:
+        record = dict(row)
+        record["details"] = json.loads(record["details"]) if record["details"] else {}
+        history.append(record)
+    return history
+
+
 # 初始化資料庫
 if __name__ == "__main__":
     init_database()
     print("資料庫初始化完成！")
+
+    # python database.py --repair：一次性修復既有資料庫的穿搭參照
+    if "--repair" in sys.argv:
+        result = repair_outfit_references()
+        print(
+            f"✅ 穿搭參照修復完成：更新 {result['outfits_updated']} 筆，"
+            f"刪除 {result['outfits_deleted']} 筆"
+        )
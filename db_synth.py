@@ -0,0 +1,219 @@
+"""
+合成資料產生模組
+依 database.py 的預設選項詞彙產生大量、貼近實際使用情況的測試資料庫
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import database as db
+
+# 預設規模：(使用者數, 單一使用者最多衣物數, 每日穿搭天數)
+SCALES = {
+    "small": {"users": 10, "max_items": 200, "days": 90},
+    "medium": {"users": 100, "max_items": 1000, "days": 365},
+    "large": {"users": 1000, "max_items": 5000, "days": 1095},
+}
+
+# 每日穿搭的組成（依序嘗試挑選的類別與機率）
+OUTFIT_TEMPLATE = [("上衣", 1.0), ("褲子", 1.0), ("外套", 0.4), ("襪子", 0.8)]
+
+
+def _random_item_count(rng: random.Random, max_items: int) -> int:
+    """衣物數量呈長尾分布：多數使用者數十至數百件，少數接近上限"""
+    count = int(rng.lognormvariate(5.0, 1.0))
+    return max(5, min(max_items, count))
+
+
+def _random_clothing(rng: random.Random, user_id: int) -> tuple:
+    """依預設選項詞彙隨機產生一件衣物"""
+    category = rng.choice(db.CATEGORIES)
+    color = rng.choice(db.DEFAULT_OPTIONS[f"color_{category}"])
+    materials = db.DEFAULT_OPTIONS.get(f"material_{category}")
+    sleeves = db.DEFAULT_OPTIONS.get(f"sleeve_{category}")
+    material = rng.choice(materials) if materials else None
+    sleeve_type = rng.choice(sleeves) if sleeves else None
+
+    seasons = rng.sample(db.SEASONS, rng.randint(1, len(db.SEASONS)))
+    occasions = (
+        []
+        if category == "襪子"
+        else rng.sample(
+            db.DEFAULT_OPTIONS["occasion"],
+            rng.randint(1, len(db.DEFAULT_OPTIONS["occasion"])),
+        )
+    )
+    return (
+        user_id,
+        category,
+        color,
+        material,
+        sleeve_type,
+        json.dumps(seasons, ensure_ascii=False),
+        json.dumps(occasions, ensure_ascii=False) if occasions else None,
+        "XXX",
+    )
+
+
+def _random_outfit(rng: random.Random, items_by_category: Dict[str, List[int]]) -> list:
+    """依穿搭組成挑選當日衣物"""
+    clothes_ids = []
+    for category, probability in OUTFIT_TEMPLATE:
+        if items_by_category.get(category) and rng.random() < probability:
+            clothes_ids.append(rng.choice(items_by_category[category]))
+    return clothes_ids
+
+
+def generate_dataset(
+    db_path: str,
+    users: int,
+    max_items: int,
+    days: int,
+    seed: int = 42,
+    end_date: str = None,
+) -> Dict:
+    """
+    產生合成資料庫
+
+    Args:
+        db_path: 資料庫檔案路徑（已存在會被覆蓋）
+        users: 使用者數
+        max_items: 單一使用者最多衣物數
+        days: 每位使用者往回產生幾天的每日穿搭
+        seed: 亂數種子（相同參數產生相同資料）
+        end_date: 最後一天穿搭日期（YYYY-MM-DD，預設今天）
+
+    Returns:
+        產生結果摘要
+    """
+    start = time.perf_counter()
+    rng = random.Random(seed)
+
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    # 使用 database.py 的 schema 建立資料表
+    original_path = db.DB_PATH
+    db.DB_PATH = db_path
+    try:
+        db.init_database()
+    finally:
+        db.DB_PATH = original_path
+
+    end = datetime.strptime(end_date, "%Y-%m-%d") if end_date else datetime.now()
+    dates = [
+        (end - timedelta(days=offset)).strftime("%Y-%m-%d") for offset in range(days)
+    ]
+    password_hash = db.hash_password("password")
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA synchronous = OFF")
+    cursor.execute("PRAGMA journal_mode = MEMORY")
+
+    total_items = 0
+    total_outfits = 0
+    for index in range(users):
+        cursor.execute(
+            "INSERT INTO users (username, password_hash, plain_password, email, email_enabled) VALUES (?, ?, ?, ?, ?)",
+            (
+                f"user{index:05d}",
+                password_hash,
+                "password",
+                f"user{index:05d}@example.com",
+                1,
+            ),
+        )
+        user_id = cursor.lastrowid
+
+        cursor.executemany(
+            "INSERT INTO options (user_id, option_type, option_value) VALUES (?, ?, ?)",
+            [
+                (user_id, option_type, value)
+                for option_type, values in db.DEFAULT_OPTIONS.items()
+                for value in values
+            ],
+        )
+        cursor.executemany(
+            "INSERT INTO locations (user_id, city_name) VALUES (?, ?)",
+            [(user_id, city) for city in db.DEFAULT_LOCATIONS],
+        )
+
+        item_count = _random_item_count(rng, max_items)
+        items = [_random_clothing(rng, user_id) for _ in range(item_count)]
+        cursor.executemany(
+            """
+            INSERT INTO clothes (user_id, category, color, material, sleeve_type, seasons, occasions, name)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+            items,
+        )
+        # executemany 後 lastrowid 為最後一筆，AUTOINCREMENT 保證連號
+        first_id = cursor.execute(
+            "SELECT MIN(id) FROM clothes WHERE user_id = ?", (user_id,)
+        ).fetchone()[0]
+        items_by_category = {}
+        for offset, item in enumerate(items):
+            items_by_category.setdefault(item[1], []).append(first_id + offset)
+
+        cursor.executemany(
+            "INSERT INTO outfits (user_id, date, clothes_ids) VALUES (?, ?, ?)",
+            [
+                (user_id, date_str, json.dumps(_random_outfit(rng, items_by_category)))
+                for date_str in dates
+            ],
+        )
+
+        total_items += item_count
+        total_outfits += len(dates)
+        conn.commit()
+
+    conn.close()
+
+    summary = {
+        "db_path": db_path,
+        "users": users,
+        "max_items": max_items,
+        "days": days,
+        "seed": seed,
+        "clothes": total_items,
+        "outfits": total_outfits,
+        "seconds": time.perf_counter() - start,
+        "size_mb": os.path.getsize(db_path) / 1024 / 1024,
+    }
+    print(
+        f"✅ 已產生 {db_path}：{users} 位使用者、{total_items} 件衣物、"
+        f"{total_outfits} 筆穿搭（{summary['size_mb']:.1f} MB，{summary['seconds']:.1f} 秒）"
+    )
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="產生合成穿搭資料庫")
+    parser.add_argument("--scale", choices=SCALES.keys(), default="small")
+    parser.add_argument("--users", type=int, help="覆寫使用者數")
+    parser.add_argument("--max-items", type=int, help="覆寫單一使用者最多衣物數")
+    parser.add_argument("--days", type=int, help="覆寫每日穿搭天數")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="資料庫路徑")
+    args = parser.parse_args()
+
+    params = dict(SCALES[args.scale])
+    if args.users:
+        params["users"] = args.users
+    if args.max_items:
+        params["max_items"] = args.max_items
+    if args.days:
+        params["days"] = args.days
+
+    output = args.output or os.path.join(
+        os.path.dirname(__file__), "data", f"synthetic_{args.scale}.db"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    generate_dataset(output, seed=args.seed, **params)
@@ -179,6 +179,12 @@ def generate_email_html(outfit_items: List[Dict], weather_info: Dict = None) ->
                 <p>☁️ 天氣：{weather_info.get('description', '晴天')}</p>
                 <p>🌧️ 降雨機率：{weather_info.get('rain_probability', 0):.0f}%</p>
                 <p>👔 穿搭建議：{wt.get_temperature_suggestion(weather_info.get('temp_max', 25), weather_info.get('temp_min', 18))}</p>
+        """
+        for window in weather_info.get("windows", []):
+            html += f"""
+                <p>{wt.format_time_window(window)}</p>
+            """
+        html += """
             </div>
         """
 
@@ -227,7 +233,10 @@ def generate_email_text(outfit_items: List[Dict], weather_info: Dict = None) ->
         text += f"溫度：{weather_info.get('temp_min', 'N/A')}°C ~ {weather_info.get('temp_max', 'N/A')}°C\n"
         text += f"天氣：{weather_info.get('description', '晴天')}\n"
         text += f"降雨機率：{weather_info.get('rain_probability', 0):.0f}%\n"
-        text += f"👔 穿搭建議：{wt.get_temperature_suggestion(weather_info.get('temp_max', 25), weather_info.get('temp_min', 18))}\n\n"
+        text += f"👔 穿搭建議：{wt.get_temperature_suggestion(weather_info.get('temp_max', 25), weather_info.get('temp_min', 18))}\n"
+        for window in weather_info.get("windows", []):
+            text += f"{wt.format_time_window(window)}\n"
+        text += "\n"
 
     # 穿搭內容
     text += "👔 今日穿搭\n"
@@ -0,0 +1,304 @@
+"""
+地名索引模組
+由 gazetteer.json 載入全台地點（座標、所屬縣市、別名），
+啟動時建立一次不可變索引，提供正規化查詢與前綴補全
+"""
+
+import bisect
+import json
+import math
+import os
+from types import MappingProxyType
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+GAZETTEER_PATH = os.environ.get(
+    "GAZETTEER_PATH", os.path.join(os.path.dirname(__file__), "gazetteer.json")
+)
+
+# 鄉鎮市區名稱的後綴（查詢「泰山區」「花壇鄉」時去除）
+TOWN_SUFFIXES = ("區", "鄉", "鎮", "市")
+
+
+class Place(NamedTuple):
+    """地點資料"""
+
+    name: str
+    county: str
+    lat: float
+    lon: float
+    aliases: Tuple[str, ...]
+
+    @property
+    def coordinates(self) -> Tuple[float, float]:
+        return (self.lat, self.lon)
+
+
+def normalize_name(name: str) -> str:
+    """正規化地名：去除空白、「台」統一為「臺」"""
+    return "".join(name.split()).replace("台", "臺")
+
+
+def _strip_suffix(name: str) -> str:
+    """去除鄉鎮市區後綴（保留至少兩個字）"""
+    if len(name) >= 3 and name[-1] in TOWN_SUFFIXES:
+        return name[:-1]
+    return name
+
+
+def town_key(name: str) -> str:
+    """鄉鎮比對用的名稱：正規化並去除鄉鎮市區後綴（泰山區 -> 泰山）"""
+    return _strip_suffix(normalize_name(name))
+
+
+def _load_index(path: str):
+    """讀取地名資料檔並建立查詢索引"""
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+
+    counties = tuple(data["counties"])
+    places = tuple(
+        Place(
+            name=item["name"],
+            county=item["county"],
+            lat=item["lat"],
+            lon=item["lon"],
+            aliases=tuple(item.get("aliases", ())),
+        )
+        for item in data["locations"]
+    )
+
+    by_name: Dict[str, Place] = {}
+    by_county_town: Dict[Tuple[str, str], Place] = {}
+    name_counts: Dict[str, int] = {}
+    for place in places:
+        key = normalize_name(place.name)
+        name_counts[key] = name_counts.get(key, 0) + 1
+        # 同名地點（如台北與南投的信義）以資料檔中較前面的為預設
+        by_name.setdefault(key, place)
+        by_county_town[(place.county, key)] = place
+        for alias in place.aliases:
+            by_name.setdefault(normalize_name(alias), place)
+
+    # 縣市前綴（完整名稱與簡稱，長的優先比對）
+    county_prefixes = sorted(
+        [(county, county) for county in counties]
+        + [(county[:-1], county) for county in counties],
+        key=lambda item: -len(item[0]),
+    )
+
+    # 前綴補全：(正規化名稱, 顯示名稱)，同名地點加上縣市簡稱區分
+    completions = set()
+    for key, place in by_name.items():
+        completions.add((key, display_name(place, name_counts)))
+    for place in places:
+        key = normalize_name(place.name)
+        if name_counts[key] > 1:
+            qualified = display_name(place, name_counts)
+            completions.add((key, qualified))
+            completions.add((normalize_name(qualified), qualified))
+
+    return (
+        counties,
+        places,
+        MappingProxyType(by_name),
+        MappingProxyType(by_county_town),
+        tuple(county_prefixes),
+        tuple(sorted(completions)),
+        MappingProxyType(name_counts),
+    )
+
+
+def display_name(place: Place, name_counts: Dict[str, int] = None) -> str:
+    """地點的顯示名稱（同名地點加上縣市簡稱，如「南投信義」）"""
+    counts = _NAME_COUNTS if name_counts is None else name_counts
+    if counts.get(normalize_name(place.name), 1) > 1:
+        return f"{place.county[:-1]}{place.name}"
+    return place.name
+
+
+(
+    COUNTIES,
+    PLACES,
+    _BY_NAME,
+    _BY_COUNTY_TOWN,
+    _COUNTY_PREFIXES,
+    _COMPLETIONS,
+    _NAME_COUNTS,
+) = _load_index(GAZETTEER_PATH)
+_COMPLETION_KEYS = tuple(key for key, _ in _COMPLETIONS)
+
+
+def lookup(name: str) -> Optional[Place]:
+    """
+    查詢地點
+
+    支援「台/臺」兩種寫法、別名、縣市前綴（新北市泰山區、南投信義）
+    與鄉鎮市區後綴（花壇鄉）
+
+    Args:
+        name: 地名
+
+    Returns:
+        地點資料，找不到時回傳 None
+    """
+    if not name:
+        return None
+    key = normalize_name(name)
+    place = _BY_NAME.get(key)
+    if place:
+        return place
+
+    for prefix, county in _COUNTY_PREFIXES:
+        if key.startswith(prefix) and len(key) > len(prefix):
+            town = _strip_suffix(key[len(prefix) :])
+            place = _BY_COUNTY_TOWN.get((county, town))
+            if place:
+                return place
+
+    stripped = _strip_suffix(key)
+    if stripped != key:
+        return _BY_NAME.get(stripped)
+    return None
+
+
+def complete(prefix: str, limit: int = 10) -> List[str]:
+    """
+    依輸入的開頭補全地名
+
+    Args:
+        prefix: 使用者輸入的開頭
+        limit: 最多回傳筆數
+
+    Returns:
+        顯示名稱列表
+    """
+    key = normalize_name(prefix or "")
+    if not key:
+        return []
+
+    results = []
+    index = bisect.bisect_left(_COMPLETION_KEYS, key)
+    while index < len(_COMPLETIONS) and len(results) < limit:
+        completion_key, name = _COMPLETIONS[index]
+        if not completion_key.startswith(key):
+            break
+        if name not in results:
+            results.append(name)
+        index += 1
+    return results
+
+
+# ========== 最近地點空間索引 ==========
+
+# 均勻格網：經度依台灣中央緯度縮放後與緯度同尺度，每格約 11 公里
+GRID_CELL_DEGREES = 0.1
+_GRID_REFERENCE_LAT = 23.7
+_LON_SCALE = math.cos(math.radians(_GRID_REFERENCE_LAT))
+_KM_PER_DEGREE = 111.195
+
+# 超過此距離視為不在台灣（如國外座標），不對應到任何地點
+NEAREST_MAX_DISTANCE_KM = float(os.environ.get("GAZETTEER_MAX_DISTANCE_KM", "60"))
+
+
+def _grid_cell(lat: float, lon: float) -> Tuple[int, int]:
+    return (
+        int(math.floor(lon * _LON_SCALE / GRID_CELL_DEGREES)),
+        int(math.floor(lat / GRID_CELL_DEGREES)),
+    )
+
+
+def _build_grid(places: Tuple[Place, ...]):
+    """建立格網：格子座標 -> 該格內的地點"""
+    grid: Dict[Tuple[int, int], List[Place]] = {}
+    for place in places:
+        grid.setdefault(_grid_cell(place.lat, place.lon), []).append(place)
+    cells = list(grid)
+    bounds = (
+        min(x for x, _ in cells),
+        max(x for x, _ in cells),
+        min(y for _, y in cells),
+        max(y for _, y in cells),
+    )
+    return (
+        MappingProxyType({cell: tuple(items) for cell, items in grid.items()}),
+        bounds,
+    )
+
+
+_GRID, _GRID_BOUNDS = _build_grid(PLACES)
+
+
+def distance_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """兩點間的大圓距離（公里）"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (
+        math.sin((phi2 - phi1) / 2) ** 2
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    )
+    return 2 * 6371.0 * math.asin(math.sqrt(a))
+
+
+def nearest_with_distance(lat: float, lon: float) -> Tuple[Optional[Place], float]:
+    """
+    找出距離座標最近的地點
+
+    由所在格子向外逐圈搜尋，已找到的最近距離小於下一圈的最短可能距離即停止
+
+    Returns:
+        (地點, 距離公里)
+    """
+    cx, cy = _grid_cell(lat, lon)
+    x, y = lon * _LON_SCALE, lat
+    min_x, max_x, min_y, max_y = _GRID_BOUNDS
+    max_ring = max(abs(cx - min_x), abs(cx - max_x), abs(cy - min_y), abs(cy - max_y))
+
+    best, best_sq = None, float("inf")
+    for ring in range(max_ring + 1):
+        for gx in range(cx - ring, cx + ring + 1):
+            for gy in range(cy - ring, cy + ring + 1):
+                # 只看這一圈的外框
+                if ring and abs(gx - cx) != ring and abs(gy - cy) != ring:
+                    continue
+                for place in _GRID.get((gx, gy), ()):
+                    dx = place.lon * _LON_SCALE - x
+                    dy = place.lat - y
+                    dist_sq = dx * dx + dy * dy
+                    if dist_sq < best_sq:
+                        best, best_sq = place, dist_sq
+        # 下一圈以外的地點距離至少 ring 格
+        if best is not None and best_sq <= (ring * GRID_CELL_DEGREES) ** 2:
+            break
+
+    if best is None:
+        return None, float("inf")
+    return best, distance_km(lat, lon, best.lat, best.lon)
+
+
+def nearest(lat: float, lon: float, max_distance_km: float = None) -> Optional[Place]:
+    """
+    找出距離座標最近的地點
+
+    Args:
+        lat: 緯度
+        lon: 經度
+        max_distance_km: 最遠距離（預設 NEAREST_MAX_DISTANCE_KM），超過回傳 None
+
+    Returns:
+        最近的地點
+    """
+    limit = NEAREST_MAX_DISTANCE_KM if max_distance_km is None else max_distance_km
+    place, distance = nearest_with_distance(lat, lon)
+    return place if distance <= limit else None
+
+
+def nearest_many(
+    points: Iterable[Tuple[float, float]], max_distance_km: float = None
+) -> List[Optional[Place]]:
+    """批次找出多個座標的最近地點（相同座標只計算一次）"""
+    resolved: Dict[Tuple[float, float], Optional[Place]] = {}
+    results = []
+    for point in points:
+        if point not in resolved:
+            resolved[point] = nearest(point[0], point[1], max_distance_km)
+        results.append(resolved[point])
+    return results
@@ -0,0 +1,100 @@
+"""
+查詢次數回歸測試
+以 assert_max_queries 固定主要讀取路徑的查詢次數，攔截 N+1 查詢回歸
+"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import database as db
+import weather as wt
+
+WEEK_MONDAY = "2024-03-04"
+
+
+@pytest.fixture
+def user_id(tmp_path, monkeypatch):
+    """建立暫存資料庫：一位使用者、8 件衣物，一週中 5 天有穿搭"""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "clothes.db"))
+    monkeypatch.setattr(db, "SLOW_QUERY_LOG_PATH", str(tmp_path / "slow_queries.log"))
+    db.init_database()
+    db.create_user("tester", "password")
+    uid = db.verify_user("tester", "password")
+
+    for i in range(8):
+        db.add_clothing(
+            uid, db.CATEGORIES[i % 4], f"顏色{i}", "棉", "", ["春"], ["休閒"]
+        )
+    cloth_ids = sorted(cloth.id for cloth in db.get_user_clothes(uid))
+
+    monday = datetime.strptime(WEEK_MONDAY, "%Y-%m-%d")
+    for day in range(5):
+        date_str = (monday + timedelta(days=day)).strftime("%Y-%m-%d")
+        db.save_outfit(uid, date_str, cloth_ids[day : day + 3])
+    return uid
+
+
+@pytest.fixture
+def app(user_id, tmp_path, monkeypatch):
+    """匯入 app 並登入測試使用者（匯入時會初始化資料庫、啟動排程器，需在暫存資料庫設定之後）"""
+    pytest.importorskip("gradio")
+    monkeypatch.setattr(wt, "CWA_API_KEY", "")
+    monkeypatch.setattr(wt, "FORECAST_STORE_PATH", str(tmp_path / "forecast_store.db"))
+    monkeypatch.setattr(wt, "_store_conn", None)
+    import app
+
+    monkeypatch.setitem(app.current_user, "id", user_id)
+    yield app
+    if app.scheduler.running:
+        app.scheduler.shutdown(wait=False)
+
+
+def test_outfit_calendar_uses_fixed_query_count(user_id):
+    # refresh_calendar_view 的資料路徑：不論天數與衣物件數，穿搭與衣物各一次查詢
+    with db.assert_max_queries(2):
+        calendar = db.get_outfit_calendar(user_id, WEEK_MONDAY, 7)
+
+    assert [date for date, _ in calendar][0] == WEEK_MONDAY
+    assert len(calendar) == 7
+    assert [len(clothes) for _, clothes in calendar] == [3, 3, 3, 3, 3, 0, 0]
+
+
+def test_outfit_calendar_skips_deleted_clothing(user_id):
+    deleted = db.get_outfit_calendar(user_id, WEEK_MONDAY, 1)[0][1][0]
+    db.delete_clothing(deleted.id, user_id)
+
+    with db.assert_max_queries(2):
+        calendar = db.get_outfit_calendar(user_id, WEEK_MONDAY, 7)
+
+    assert all(cloth.id != deleted.id for _, clothes in calendar for cloth in clothes)
+
+
+def test_assert_max_queries_catches_per_item_lookups(user_id):
+    cloth_ids = [cloth.id for cloth in db.get_user_clothes(user_id)]
+
+    with pytest.raises(AssertionError):
+        with db.assert_max_queries(2):
+            for cloth_id in cloth_ids:
+                db.get_clothing_by_id(cloth_id, user_id)
+
+    with db.assert_max_queries(1):
+        clothes = db.get_clothes_by_ids(user_id, cloth_ids)
+    assert sorted(clothes) == sorted(cloth_ids)
+
+
+def test_refresh_calendar_view_query_budget(app, user_id):
+    # 處理函式本身只依目前日期決定週次，穿搭排在本週週一到週三
+    today = datetime.now()
+    monday = today - timedelta(days=today.weekday())
+    cloth_ids = sorted(cloth.id for cloth in db.get_user_clothes(user_id))
+    for day in range(3):
+        date_str = (monday + timedelta(days=day)).strftime("%Y-%m-%d")
+        db.save_outfit(user_id, date_str, cloth_ids[day : day + 4])
+
+    with db.assert_max_queries(2):
+        output, _, _ = app.refresh_calendar_view(0)
+
+    assert output.startswith("### 📅 穿搭行事曆 - 本週")
+    assert output.count("- **ID: ") == 12
+    assert output.count("*尚未安排穿搭*") == 4
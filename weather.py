@@ -4,10 +4,23 @@
 """
 
 import os
+import re
+import bisect
+import json
+import codecs
+import sqlite3
+import time
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import lru_cache
 from pathlib import Path
 import requests
-from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+import gazetteer as gz
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Iterable, Iterator, NamedTuple, Optional, Tuple
 
 # 載入環境變數 (僅在本地開發時需要)
 if Path(".env").exists():
@@ -21,854 +34,1410 @@ CWA_API_KEY = os.environ.get("CWA_API_KEY", "")
 # OpenWeatherMap API 金鑰（備用）
 OPENWEATHER_API_KEY = os.environ.get("OPENWEATHER_API_KEY", "")
 
+# API 位址（可改為本機替身伺服器 weather_standin.py，離線測試解析與降級流程）
+CWA_API_BASE = os.environ.get("CWA_API_BASE", "https://opendata.cwa.gov.tw").rstrip("/")
+OPENWEATHER_API_BASE = os.environ.get(
+    "OPENWEATHER_API_BASE", "https://api.openweathermap.org"
+).rstrip("/")
+
 
 def get_coordinates(city_name: str) -> Optional[tuple]:
-    """取得城市座標（台灣城市對照）"""
-    # 台灣主要城市座標對照表
-    taiwan_cities = {
-        # 新北市區域
-        "泰山": (25.0563, 121.4336),
-        "板橋": (25.0083, 121.4592),
-        "新北": (25.0118, 121.4652),
-        "萬華": (25.0320, 121.5000),
-        "樹林": (24.9933, 121.4205),
-        "三重": (25.0620, 121.4875),
-        "新莊": (25.0378, 121.4326),
-        "中和": (24.9989, 121.4993),
-        "永和": (25.0108, 121.5161),
-        "土城": (24.9739, 121.4421),
-        "蘆洲": (25.0847, 121.4741),
-        "汐止": (25.0674, 121.6423),
-        "淡水": (25.1677, 121.4406),
-        "瑞芳": (25.1093, 121.8120),
-        "三峽": (24.9344, 121.3691),
-        "鶯歌": (24.9545, 121.3542),
-        "新店": (24.9677, 121.5414),
-        "深坑": (25.0024, 121.6170),
-        "石碇": (24.9861, 121.6578),
-        "坪林": (24.9367, 121.7103),
-        "烏來": (24.8657, 121.5495),
-        "五股": (25.0829, 121.4389),
-        "八里": (25.1498, 121.4012),
-        "林口": (25.0776, 121.3903),
-        "三芝": (25.2572, 121.5019),
-        "石門": (25.2906, 121.5667),
-        "金山": (25.2215, 121.6368),
-        "萬里": (25.1796, 121.6892),
-        "平溪": (25.0259, 121.7395),
-        "雙溪": (25.0332, 121.8653),
-        "貢寮": (25.0193, 121.9081),
-        # 台北市
-        "台北": (25.0330, 121.5654),
-        "士林": (25.0875, 121.5160),
-        "北投": (25.1319, 121.5018),
-        "內湖": (25.0826, 121.5907),
-        "南港": (25.0527, 121.6063),
-        "松山": (25.0496, 121.5779),
-        "信義": (25.0330, 121.5770),
-        "大安": (25.0263, 121.5436),
-        "中山": (25.0636, 121.5260),
-        "中正": (25.0320, 121.5200),
-        "大同": (25.0632, 121.5155),
-        "文山": (24.9889, 121.5706),
-        # 基隆市
-        "基隆": (25.1276, 121.7392),
-        # 桃園市
-        "桃園": (24.9936, 121.3010),
-        "中壢": (24.9659, 121.2257),
-        "平鎮": (24.9444, 121.2164),
-        "八德": (24.9404, 121.2967),
-        "楊梅": (24.9075, 121.1460),
-        "蘆竹": (25.0455, 121.2918),
-        "大溪": (24.8804, 121.2865),
-        "龍潭": (24.8643, 121.2164),
-        "龜山": (25.0407, 121.3540),
-        "大園": (25.0606, 121.1969),
-        "觀音": (25.0354, 121.0826),
-        "新屋": (24.9703, 121.1060),
-        "復興": (24.8200, 121.3500),
-        # 新竹市
-        "新竹": (24.8138, 120.9675),
-        # 新竹縣
-        "竹北": (24.8387, 121.0052),
-        "竹東": (24.7404, 121.0887),
-        "新埔": (24.8372, 121.0759),
-        "關西": (24.7887, 121.1775),
-        "湖口": (24.8998, 121.0388),
-        "新豐": (24.9019, 120.9839),
-        "峨眉": (24.6883, 121.0094),
-        "寶山": (24.7494, 120.9965),
-        "北埔": (24.7000, 121.0583),
-        "芎林": (24.7711, 121.0750),
-        "橫山": (24.7173, 121.1181),
-        "尖石": (24.7025, 121.2000),
-        "五峰": (24.5967, 121.1100),
-        # 苗栗縣
-        "苗栗": (24.5602, 120.8214),
-        "頭份": (24.6968, 120.8967),
-        "竹南": (24.6877, 120.8736),
-        "苑裡": (24.4431, 120.6515),
-        "通霄": (24.4897, 120.6778),
-        "後龍": (24.6127, 120.7863),
-        "卓蘭": (24.3100, 120.8267),
-        "大湖": (24.4219, 120.8647),
-        "公館": (24.5084, 120.8225),
-        "銅鑼": (24.4867, 120.7855),
-        "南庄": (24.5953, 121.0089),
-        "頭屋": (24.5896, 120.8484),
-        "三義": (24.4133, 120.7583),
-        "西湖": (24.5650, 120.7833),
-        "造橋": (24.6369, 120.8500),
-        "三灣": (24.6567, 120.9567),
-        "獅潭": (24.5383, 120.9217),
-        "泰安": (24.4600, 121.0000),
-        # 台中市
-        "台中": (24.1477, 120.6736),
-        "豐原": (24.2569, 120.7233),
-        "大里": (24.0992, 120.6773),
-        "太平": (24.1245, 120.7239),
-        "清水": (24.2643, 120.5694),
-        "沙鹿": (24.2368, 120.5686),
-        "大甲": (24.3475, 120.6244),
-        "東勢": (24.2588, 120.8239),
-        "梧棲": (24.2554, 120.5289),
-        "烏日": (24.1051, 120.6236),
-        "神岡": (24.2569, 120.6631),
-        "大肚": (24.1531, 120.5408),
-        "大雅": (24.2289, 120.6478),
-        "后里": (24.3045, 120.7142),
-        "霧峰": (24.0592, 120.6997),
-        "潭子": (24.2097, 120.7069),
-        "龍井": (24.1928, 120.5433),
-        "外埔": (24.3311, 120.6556),
-        "和平": (24.2939, 121.0417),
-        "石岡": (24.2733, 120.7833),
-        "大安": (24.3456, 120.5931),
-        "新社": (24.2333, 120.8083),
-        # 彰化縣
-        "彰化": (24.0518, 120.5161),
-        "員林": (23.9589, 120.5742),
-        "和美": (24.1100, 120.4961),
-        "鹿港": (24.0558, 120.4344),
-        "溪湖": (23.9589, 120.4814),
-        "二林": (23.9267, 120.4086),
-        "田中": (23.8600, 120.5858),
-        "北斗": (23.8706, 120.5211),
-        "花壇": (24.0264, 120.5436),
-        "芬園": (24.0139, 120.6181),
-        "大村": (23.9953, 120.5486),
-        "永靖": (23.9242, 120.5478),
-        "伸港": (24.1550, 120.4983),
-        "線西": (24.1317, 120.4686),
-        "福興": (24.0406, 120.4433),
-        "秀水": (24.0314, 120.5000),
-        "埔心": (23.9539, 120.5458),
-        "埔鹽": (24.0050, 120.4650),
-        "大城": (23.8517, 120.3217),
-        "芳苑": (23.9106, 120.3144),
-        "竹塘": (23.8889, 120.4328),
-        "社頭": (23.8978, 120.5839),
-        "二水": (23.8081, 120.6189),
-        "田尾": (23.8933, 120.5233),
-        "埤頭": (23.8917, 120.4500),
-        "溪州": (23.8519, 120.4986),
-        # 南投縣
-        "南投": (23.9609, 120.6971),
-        "埔里": (23.9681, 120.9681),
-        "草屯": (23.9742, 120.6800),
-        "竹山": (23.7569, 120.6772),
-        "集集": (23.8292, 120.7847),
-        "名間": (23.8528, 120.6889),
-        "鹿谷": (23.7442, 120.7542),
-        "中寮": (23.8833, 120.7667),
-        "魚池": (23.8950, 120.9386),
-        "國姓": (24.0436, 120.8597),
-        "水里": (23.8178, 120.8564),
-        "信義": (23.7000, 120.8833),
-        "仁愛": (24.0333, 121.1333),
-        # 雲林縣
-        "雲林": (23.7092, 120.4313),
-        "斗六": (23.7076, 120.5440),
-        "斗南": (23.6789, 120.4794),
-        "虎尾": (23.7075, 120.4450),
-        "西螺": (23.7975, 120.4669),
-        "土庫": (23.6775, 120.3936),
-        "北港": (23.5744, 120.2994),
-        "古坑": (23.6433, 120.5622),
-        "大埤": (23.6608, 120.4344),
-        "莿桐": (23.7608, 120.4828),
-        "林內": (23.7578, 120.6175),
-        "二崙": (23.7850, 120.4158),
-        "崙背": (23.7578, 120.3481),
-        "麥寮": (23.7536, 120.2517),
-        "東勢": (23.6700, 120.2611),
-        "褒忠": (23.6939, 120.3144),
-        "台西": (23.7028, 120.1958),
-        "元長": (23.6483, 120.3153),
-        "四湖": (23.6383, 120.2328),
-        "口湖": (23.5817, 120.1839),
-        "水林": (23.5719, 120.2483),
-        # 嘉義市
-        "嘉義": (23.4801, 120.4491),
-        # 嘉義縣
-        "太保": (23.4594, 120.3328),
-        "朴子": (23.4650, 120.2475),
-        "布袋": (23.3772, 120.1661),
-        "大林": (23.6031, 120.4719),
-        "民雄": (23.5519, 120.4294),
-        "溪口": (23.6011, 120.3958),
-        "新港": (23.5544, 120.3456),
-        "六腳": (23.4919, 120.2936),
-        "東石": (23.4550, 120.1589),
-        "義竹": (23.3408, 120.2431),
-        "鹿草": (23.4111, 120.3050),
-        "水上": (23.4278, 120.3972),
-        "中埔": (23.4267, 120.5214),
-        "竹崎": (23.5228, 120.5539),
-        "梅山": (23.5844, 120.5556),
-        "番路": (23.4583, 120.5583),
-        "大埔": (23.2950, 120.5933),
-        "阿里山": (23.5083, 120.7333),
-        # 台南市
-        "台南": (22.9997, 120.2270),
-        "新營": (23.3106, 120.3169),
-        "永康": (23.0264, 120.2572),
-        "歸仁": (22.9697, 120.2931),
-        "佳里": (23.1650, 120.1772),
-        "麻豆": (23.1808, 120.2472),
-        "新化": (23.0378, 120.3103),
-        "善化": (23.1322, 120.2969),
-        "新市": (23.0789, 120.2950),
-        "安定": (23.1217, 120.2358),
-        "山上": (23.1044, 120.3494),
-        "玉井": (23.1242, 120.4600),
-        "楠西": (23.1742, 120.4861),
-        "南化": (23.0419, 120.4769),
-        "左鎮": (23.0569, 120.4061),
-        "仁德": (22.9736, 120.2500),
-        "關廟": (22.9608, 120.3275),
-        "龍崎": (22.9667, 120.3667),
-        "官田": (23.1939, 120.3183),
-        "六甲": (23.2264, 120.3472),
-        "大內": (23.1167, 120.3667),
-        "柳營": (23.2778, 120.3128),
-        "鹽水": (23.3200, 120.2661),
-        "白河": (23.3525, 120.4317),
-        "東山": (23.3253, 120.4056),
-        "後壁": (23.3667, 120.3594),
-        "下營": (23.2358, 120.2650),
-        "學甲": (23.2308, 120.1772),
-        "西港": (23.1253, 120.2033),
-        "七股": (23.1411, 120.1411),
-        "將軍": (23.2069, 120.1461),
-        "北門": (23.2678, 120.1253),
-        "新樓": (23.0017, 120.2133),
-        # 高雄市
-        "高雄": (22.6273, 120.3014),
-        "鳳山": (22.6278, 120.3567),
-        "岡山": (22.7967, 120.2953),
-        "旗山": (22.8889, 120.4831),
-        "美濃": (22.8833, 120.5500),
-        "橋頭": (22.7575, 120.3058),
-        "燕巢": (22.7917, 120.3611),
-        "田寮": (22.8681, 120.3603),
-        "阿蓮": (22.8833, 120.3258),
-        "路竹": (22.8539, 120.2619),
-        "湖內": (22.9058, 120.2039),
-        "茄萣": (22.9061, 120.1850),
-        "永安": (22.8189, 120.2228),
-        "彌陀": (22.7828, 120.2494),
-        "梓官": (22.7556, 120.2636),
-        "大社": (22.7306, 120.3461),
-        "大樹": (22.6917, 120.4300),
-        "大寮": (22.5653, 120.3950),
-        "林園": (22.5031, 120.4119),
-        "仁武": (22.7017, 120.3467),
-        "鳥松": (22.6622, 120.3644),
-        "小港": (22.5650, 120.3367),
-        "前鎮": (22.6056, 120.3103),
-        "旗津": (22.5831, 120.2633),
-        "鼓山": (22.6556, 120.2806),
-        "鹽埕": (22.6239, 120.2856),
-        "左營": (22.6778, 120.2942),
-        "楠梓": (22.7333, 120.3281),
-        "三民": (22.6408, 120.3167),
-        "苓雅": (22.6231, 120.3100),
-        "新興": (22.6281, 120.3061),
-        "前金": (22.6308, 120.2939),
-        "內門": (22.9519, 120.4656),
-        "杉林": (22.9667, 120.5500),
-        "甲仙": (23.0833, 120.5833),
-        "六龜": (22.9989, 120.6308),
-        "茂林": (22.8867, 120.6581),
-        "桃源": (23.1542, 120.7667),
-        "那瑪夏": (23.2333, 120.7000),
-        # 屏東縣
-        "屏東": (22.6820, 120.4881),
-        "潮州": (22.5506, 120.5425),
-        "東港": (22.4653, 120.4531),
-        "恆春": (22.0050, 120.7467),
-        "萬丹": (22.5878, 120.4839),
-        "長治": (22.6778, 120.5194),
-        "麟洛": (22.6508, 120.5275),
-        "九如": (22.7408, 120.4881),
-        "里港": (22.7778, 120.4944),
-        "鹽埔": (22.7542, 120.5681),
-        "高樹": (22.8258, 120.5981),
-        "萬巒": (22.5708, 120.5650),
-        "內埔": (22.6119, 120.5650),
-        "竹田": (22.5850, 120.5417),
-        "新埤": (22.4697, 120.5500),
-        "枋寮": (22.3653, 120.5933),
-        "新園": (22.5417, 120.4667),
-        "崁頂": (22.5056, 120.5119),
-        "林邊": (22.4331, 120.5228),
-        "南州": (22.4906, 120.5089),
-        "佳冬": (22.4186, 120.5511),
-        "琉球": (22.3397, 120.3714),
-        "車城": (22.0742, 120.7089),
-        "滿州": (22.0167, 120.8433),
-        "枋山": (22.2617, 120.6572),
-        "三地門": (22.7133, 120.6533),
-        "霧台": (22.7417, 120.7333),
-        "瑪家": (22.7083, 120.6167),
-        "泰武": (22.6000, 120.6333),
-        "來義": (22.5333, 120.6667),
-        "春日": (22.3750, 120.6333),
-        "獅子": (22.2167, 120.7167),
-        "牡丹": (22.1333, 120.7833),
-        # 宜蘭縣
-        "宜蘭": (24.7022, 121.7378),
-        "羅東": (24.6769, 121.7714),
-        "蘇澳": (24.5958, 121.8542),
-        "頭城": (24.8578, 121.8225),
-        "礁溪": (24.8261, 121.7711),
-        "壯圍": (24.7372, 121.7828),
-        "員山": (24.7400, 121.7050),
-        "冬山": (24.6378, 121.7931),
-        "五結": (24.6850, 121.7989),
-        "三星": (24.6619, 121.6433),
-        "大同": (24.5667, 121.4167),
-        "南澳": (24.4667, 121.8000),
-        # 花蓮縣
-        "花蓮": (23.9871, 121.6015),
-        "鳳林": (23.7486, 121.4522),
-        "玉里": (23.3344, 121.3128),
-        "新城": (24.1289, 121.6414),
-        "吉安": (23.9742, 121.5800),
-        "壽豐": (23.8653, 121.5069),
-        "光復": (23.6667, 121.4167),
-        "豐濱": (23.5981, 121.5133),
-        "瑞穗": (23.4986, 121.3778),
-        "富里": (23.1806, 121.2500),
-        "秀林": (24.1500, 121.4333),
-        "萬榮": (23.7167, 121.4000),
-        "卓溪": (23.3500, 121.2667),
-        # 台東縣
-        "台東": (22.7583, 121.1444),
-        "成功": (23.0975, 121.3694),
-        "關山": (23.0450, 121.1619),
-        "卑南": (22.7667, 121.1000),
-        "鹿野": (22.9092, 121.1244),
-        "池上": (23.1222, 121.2186),
-        "東河": (23.2000, 121.3000),
-        "長濱": (23.3167, 121.4500),
-        "太麻里": (22.6131, 120.9908),
-        "大武": (22.3417, 120.8992),
-        "綠島": (22.6667, 121.4833),
-        "海端": (23.1000, 121.1667),
-        "延平": (22.9667, 121.1167),
-        "金峰": (22.5833, 120.9500),
-        "達仁": (22.2833, 120.8667),
-        "蘭嶼": (22.0500, 121.5333),
-        # 澎湖縣
-        "澎湖": (23.5711, 119.5794),
-        "馬公": (23.5667, 119.5833),
-        "湖西": (23.5833, 119.6500),
-        "白沙": (23.6667, 119.6000),
-        "西嶼": (23.6000, 119.5000),
-        "望安": (23.3667, 119.5000),
-        "七美": (23.2000, 119.4333),
-        # 金門縣
-        "金門": (24.4492, 118.3765),
-        "金城": (24.4333, 118.3167),
-        "金湖": (24.4333, 118.4167),
-        "金沙": (24.4833, 118.4167),
-        "金寧": (24.4500, 118.3333),
-        "烈嶼": (24.4333, 118.2333),
-        "烏坵": (24.9833, 119.4500),
-        # 連江縣（馬祖）
-        "連江": (26.1508, 119.9511),
-        "南竿": (26.1500, 119.9333),
-        "北竿": (26.2167, 120.0000),
-        "莒光": (25.9667, 119.9333),
-        "東引": (26.3667, 120.5000),
+    """取得城市座標（由地名索引查詢，未收錄的地名以地理編碼取得）"""
+    place = gz.lookup(city_name)
+    if place:
+        return place.coordinates
+    return geocode_location(city_name)
+
+
+def get_cwa_location_name(city_name: str) -> Optional[str]:
+    """
+    將城市名稱對應到中央氣象署的縣市名稱（找不到時原樣回傳）
+    """
+    place = resolve_location(city_name)
+    return place.county if place else city_name
+
+
+# OpenWeatherMap 地理編碼 API（將未收錄的地名轉為座標）
+OPENWEATHER_GEOCODE_URL = f"{OPENWEATHER_API_BASE}/geo/1.0/direct"
+
+# 地名 -> 座標（查無結果記為 None，避免重複查詢）
+_geocode_cache: Dict[str, Optional[tuple]] = {}
+_geocode_lock = threading.Lock()
+
+
+def geocode_location(city_name: str) -> Optional[tuple]:
+    """
+    以 OpenWeatherMap 地理編碼查詢地名座標（限台灣，結果保留於記憶體）
+
+    Args:
+        city_name: 地名
+
+    Returns:
+        (緯度, 經度)，未設定 API 金鑰或查無結果時回傳 None
+    """
+    if not OPENWEATHER_API_KEY or not city_name:
+        return None
+
+    key = gz.normalize_name(city_name)
+    with _geocode_lock:
+        if key in _geocode_cache:
+            return _geocode_cache[key]
+
+    coords = None
+    try:
+        response = http_get(
+            "owm",
+            OPENWEATHER_GEOCODE_URL,
+            params={"q": f"{city_name},TW", "limit": 1, "appid": OPENWEATHER_API_KEY},
+            timeout=5,
+        )
+        response.raise_for_status()
+        results = response.json()
+        if results:
+            coords = (results[0]["lat"], results[0]["lon"])
+    except Exception as e:
+        # 暫時性錯誤不記錄，下次再查
+        print(f"❌ 地理編碼失敗：{city_name}（{e}）")
+        return None
+
+    with _geocode_lock:
+        _geocode_cache[key] = coords
+    return coords
+
+
+def resolve_location(city_name: str) -> Optional[gz.Place]:
+    """
+    將地名對應到地名索引中的地點
+
+    未收錄的地名先以地理編碼取得座標，再找出最近的已知地點
+
+    Args:
+        city_name: 地名
+
+    Returns:
+        地點資料，無法對應時回傳 None
+    """
+    place = gz.lookup(city_name)
+    if place:
+        return place
+    coords = geocode_location(city_name)
+    return gz.nearest(*coords) if coords else None
+
+
+def resolve_locations(city_names: List[str]) -> Dict[str, Optional[gz.Place]]:
+    """
+    批次對應多個地名（重複名稱只處理一次，需要地理編碼的名稱同時查詢）
+
+    Args:
+        city_names: 地名列表
+
+    Returns:
+        地名 -> 地點資料
+    """
+    unique_names = list(dict.fromkeys(city_names))
+    results = {name: gz.lookup(name) for name in unique_names}
+    unknown = [name for name, place in results.items() if place is None]
+    if unknown:
+        coords_list = list(_provider_executor.map(geocode_location, unknown))
+        for name, coords in zip(unknown, coords_list):
+            results[name] = gz.nearest(*coords) if coords else None
+    return results
+
+
+# ========== 預報快取 ==========
+
+# 台灣時區（CWA 以台灣時間發布，伺服器可能使用 UTC）
+TAIWAN_TZ = timezone(timedelta(hours=8))
+
+# CWA 各資料集的發布時刻（台灣時間）與資料上線所需的緩衝時間
+CWA_ISSUE_HOURS = {
+    "F-C0032-001": (5, 11, 17, 23),
+    "F-D0047-091": (5, 17),
+}
+CWA_ISSUE_DELAY = timedelta(minutes=15)
+
+# 各縣市的鄉鎮預報資料集（F-D0047-0xx，一次請求回傳該縣市所有鄉鎮）
+# 表中為未來 3 天（逐 3 小時）的代碼，未來 1 週（逐 12 小時）為代碼 + 2
+CWA_TOWNSHIP_DATASETS = {
+    "宜蘭縣": 1,
+    "桃園市": 5,
+    "新竹縣": 9,
+    "苗栗縣": 13,
+    "彰化縣": 17,
+    "南投縣": 21,
+    "雲林縣": 25,
+    "嘉義縣": 29,
+    "屏東縣": 33,
+    "臺東縣": 37,
+    "花蓮縣": 41,
+    "澎湖縣": 45,
+    "基隆市": 49,
+    "新竹市": 53,
+    "嘉義市": 57,
+    "臺北市": 61,
+    "高雄市": 65,
+    "新北市": 69,
+    "臺中市": 73,
+    "臺南市": 77,
+    "連江縣": 81,
+    "金門縣": 85,
+}
+
+# 3 天鄉鎮預報每 6 小時發布，1 週鄉鎮預報每 12 小時發布
+for _number in CWA_TOWNSHIP_DATASETS.values():
+    CWA_ISSUE_HOURS[f"F-D0047-{_number:03d}"] = (5, 11, 17, 23)
+    CWA_ISSUE_HOURS[f"F-D0047-{_number + 2:03d}"] = (5, 17)
+
+# 是否使用鄉鎮預報（關閉時僅使用縣市層級預報）
+CWA_TOWNSHIP_ENABLED = os.environ.get("WEATHER_TOWNSHIP_FORECAST", "1") == "1"
+
+# OpenWeatherMap 預報每 3 小時更新
+OWM_CACHE_TTL = timedelta(hours=3)
+
+# 快取最多保留的項目數（超過時移除最久未使用者）
+# 鄉鎮預報每個縣市一次寫入數十個鄉鎮，每個地點另有一筆逐時預報，
+# 上限需涵蓋全台約 370 個鄉鎮的兩種資料集
+FORECAST_CACHE_MAX_ENTRIES = int(os.environ.get("WEATHER_CACHE_MAX_ENTRIES", "2048"))
+
+# {(provider, location, dataset): {"data", "fetched_at", "expires_at"}}
+_forecast_cache: "OrderedDict[tuple, Dict]" = OrderedDict()
+_forecast_cache_lock = threading.Lock()
+_forecast_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "expired": 0,
+    "evictions": 0,
+    "fetches": 0,
+    "coalesced": 0,
+    "stale": 0,
+    "refreshes": 0,
+}
+
+# 過期資料最多可沿用多久：期間先回傳舊資料，同時於背景更新
+FORECAST_MAX_STALENESS = timedelta(
+    hours=float(os.environ.get("WEATHER_MAX_STALE_HOURS", "12"))
+)
+
+# 背景更新的執行緒池
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("WEATHER_REFRESH_WORKERS", "2")),
+    thread_name_prefix="weather-refresh",
+)
+_refreshing: set = set()
+
+# 以縣市為單位的統計：{縣市: {"hits", "misses", "towns"}}
+# 同縣市的鄉鎮共用同一筆 CWA 快取，一次請求與解析即可服務所有鄉鎮
+_county_stats: Dict[str, Dict] = {}
+
+# 各資料集最近一次全國更新的狀態
+_national_status: Dict[str, Dict] = {}
+
+
+def next_cwa_issuance(dataset: str, now: datetime = None) -> datetime:
+    """
+    計算資料集下一次發布（並上線）的時間，作為快取到期時間
+
+    Args:
+        dataset: CWA 資料集代碼
+        now: 目前時間（預設現在）
+
+    Returns:
+        下一次發布時間（台灣時區）
+    """
+    now = (now or datetime.now(TAIWAN_TZ)).astimezone(TAIWAN_TZ)
+    issue_hours = CWA_ISSUE_HOURS.get(dataset, (5, 17))
+
+    for day_offset in (0, 1):
+        day = (now + timedelta(days=day_offset)).replace(
+            minute=0, second=0, microsecond=0
+        )
+        for hour in issue_hours:
+            available_at = day.replace(hour=hour) + CWA_ISSUE_DELAY
+            if available_at > now:
+                return available_at
+    return now + timedelta(hours=12)
+
+
+def _cache_get(key: tuple) -> Optional[Dict]:
+    """
+    取得快取項目（命中時移到 LRU 最新位置）
+
+    已過期但未超過 FORECAST_MAX_STALENESS 的項目仍會回傳，
+    由呼叫端以 expires_at 判斷是否需要背景更新
+    """
+    now = time.time()
+    with _forecast_cache_lock:
+        entry = _forecast_cache.get(key)
+        if entry is None:
+            _forecast_cache_stats["misses"] += 1
+            return None
+        if entry["expires_at"] <= now:
+            _forecast_cache_stats["expired"] += 1
+            if now - entry["expires_at"] > FORECAST_MAX_STALENESS.total_seconds():
+                _forecast_cache_stats["misses"] += 1
+                return None
+            _forecast_cache_stats["stale"] += 1
+        _forecast_cache.move_to_end(key)
+        _forecast_cache_stats["hits"] += 1
+        return entry
+
+
+def _cache_put(
+    key: tuple,
+    data: List[Dict],
+    expires_at: float,
+    pinned: bool = False,
+    persist: bool = True,
+    fetched_at: float = None,
+) -> Dict:
+    """
+    寫入快取，超過上限時移除最久未使用的項目
+
+    Args:
+        pinned: 固定項目（全國預報）不會被 LRU 淘汰
+        persist: 是否同時寫入磁碟預報儲存
+        fetched_at: 資料取得時間（預設現在，由磁碟載入時沿用原時間）
+
+    Returns:
+        寫入的快取項目（即使隨後被其他執行緒淘汰，呼叫端仍可安全使用）
+    """
+    with _forecast_cache_lock:
+        previous = _forecast_cache.get(key)
+        entry = {
+            "data": data,
+            "fetched_at": fetched_at or time.time(),
+            "expires_at": expires_at,
+            "pinned": pinned or bool(previous and previous["pinned"]),
+        }
+        _forecast_cache[key] = entry
+        _forecast_cache.move_to_end(key)
+
+        if len(_forecast_cache) > FORECAST_CACHE_MAX_ENTRIES:
+            for old_key in list(_forecast_cache):
+                if len(_forecast_cache) <= FORECAST_CACHE_MAX_ENTRIES:
+                    break
+                if not _forecast_cache[old_key]["pinned"]:
+                    del _forecast_cache[old_key]
+                    _forecast_cache_stats["evictions"] += 1
+
+    if persist:
+        _store_put_many([(key, entry)])
+    return entry
+
+
+def _cache_forecast(
+    key: tuple, data: List[Dict], hourly: Optional["HourlyForecast"], expires_at: float
+):
+    """寫入每日預報與對應的逐時預報（同一次磁碟寫入）"""
+    stored = [(key, _cache_put(key, data, expires_at, persist=False))]
+    if hourly:
+        hourly_key = _hourly_key(key)
+        stored.append(
+            (hourly_key, _cache_put(hourly_key, hourly, expires_at, persist=False))
+        )
+    _store_put_many(stored)
+
+
+# ========== 預報磁碟儲存 ==========
+
+# 解析後的預報寫入本機 SQLite，重新啟動（如 Render 休眠喚醒）後立即可用
+FORECAST_STORE_PATH = os.environ.get(
+    "WEATHER_STORE_PATH",
+    os.path.join(os.path.dirname(__file__), "data", "weather_cache.db"),
+)
+
+_store_lock = threading.Lock()
+_store_conn: Optional[sqlite3.Connection] = None
+
+
+def _get_store() -> sqlite3.Connection:
+    """取得預報儲存連線（整個程序共用一條，以 _store_lock 保護）"""
+    global _store_conn
+    if _store_conn is None:
+        os.makedirs(os.path.dirname(FORECAST_STORE_PATH), exist_ok=True)
+        _store_conn = sqlite3.connect(FORECAST_STORE_PATH, check_same_thread=False)
+        _store_conn.execute("""
+            CREATE TABLE IF NOT EXISTS forecast_store (
+                provider TEXT NOT NULL,
+                location TEXT NOT NULL,
+                dataset TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                expires_at REAL NOT NULL,
+                pinned INTEGER NOT NULL DEFAULT 0,
+                payload TEXT NOT NULL,
+                PRIMARY KEY (provider, location, dataset)
+            )
+        """)
+        _store_conn.commit()
+    return _store_conn
+
+
+def _store_put_many(items: List[tuple]):
+    """將快取項目寫入磁碟儲存（items 為 (key, entry) 列表，單一交易）"""
+    try:
+        with _store_lock:
+            conn = _get_store()
+            conn.executemany(
+                "INSERT OR REPLACE INTO forecast_store VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        key[0],
+                        key[1],
+                        key[2],
+                        entry["fetched_at"],
+                        entry["expires_at"],
+                        1 if entry["pinned"] else 0,
+                        json.dumps(entry["data"], ensure_ascii=False),
+                    )
+                    for key, entry in items
+                ],
+            )
+            conn.commit()
+    except sqlite3.Error as e:
+        print(f"⚠️ 預報寫入磁碟失敗：{e}")
+
+
+def load_forecast_store() -> int:
+    """
+    啟動時由磁碟載入仍可使用的預報到快取（並清除超過最大過期時間的資料）
+
+    Returns:
+        載入的項目數
+    """
+    now = time.time()
+    try:
+        with _store_lock:
+            conn = _get_store()
+            conn.execute(
+                "DELETE FROM forecast_store WHERE expires_at <= ?",
+                (now - FORECAST_MAX_STALENESS.total_seconds(),),
+            )
+            conn.commit()
+            rows = conn.execute(
+                "SELECT provider, location, dataset, fetched_at, expires_at, pinned, payload FROM forecast_store"
+            ).fetchall()
+    except sqlite3.Error as e:
+        print(f"⚠️ 讀取預報儲存失敗：{e}")
+        return 0
+
+    for provider, location, dataset, fetched_at, expires_at, pinned, payload in rows:
+        data = json.loads(payload)
+        if provider.endswith("_hourly"):
+            data = HourlyForecast(*(tuple(values) for values in data))
+        _cache_put(
+            (provider, location, dataset),
+            data,
+            expires_at,
+            pinned=bool(pinned),
+            persist=False,
+            fetched_at=fetched_at,
+        )
+        # 還原全國預報狀態，避免啟動時重複取得仍有效的資料
+        if pinned and provider == "cwa" and dataset in NATIONAL_DATASETS:
+            status = _national_status.setdefault(
+                dataset,
+                {
+                    "refreshed_at": fetched_at,
+                    "expires_at": expires_at,
+                    "counties": 0,
+                    "ms": 0.0,
+                },
+            )
+            status["refreshed_at"] = min(status["refreshed_at"], fetched_at)
+            status["expires_at"] = min(status["expires_at"], expires_at)
+            status["counties"] += 1
+
+    if rows:
+        print(f"✅ 已由磁碟載入 {len(rows)} 筆天氣預報")
+    return len(rows)
+
+
+def _record_county_lookup(county: str, town: str, hit: bool):
+    """記錄縣市層級的快取命中與查詢過的鄉鎮"""
+    with _forecast_cache_lock:
+        stats = _county_stats.setdefault(
+            county, {"hits": 0, "misses": 0, "towns": set()}
+        )
+        stats["hits" if hit else "misses"] += 1
+        stats["towns"].add(town)
+
+
+def _copy_days(
+    data: List[Dict], days: int, fetched_at: float = None, stale: bool = False
+) -> List[Dict]:
+    """
+    複製快取中的每日資料，避免呼叫端修改到快取內容
+
+    每天的資料會加上 stale（是否為過期資料）與 age_seconds（資料年齡）
+    """
+    age_seconds = max(time.time() - fetched_at, 0.0) if fetched_at else 0.0
+    return [dict(day, stale=stale, age_seconds=age_seconds) for day in data[:days]]
+
+
+def _serve_cached(entry: Dict, days: int, refresh_key: tuple, loader) -> List[Dict]:
+    """回傳快取資料，若已過期則排入背景更新"""
+    stale = entry["expires_at"] <= time.time()
+    if stale:
+        _schedule_refresh(refresh_key, loader)
+    return _copy_days(entry["data"], days, entry["fetched_at"], stale)
+
+
+def _schedule_refresh(key: tuple, loader):
+    """排入背景更新（同一鍵同時只排一次）"""
+    with _inflight_lock:
+        if key in _refreshing:
+            return
+        _refreshing.add(key)
+    _refresh_executor.submit(_run_refresh, key, loader)
+
+
+def _run_refresh(key: tuple, loader):
+    """背景執行更新，與前景請求共用 single-flight"""
+    try:
+        with _forecast_cache_lock:
+            _forecast_cache_stats["refreshes"] += 1
+        _single_flight(key, loader)
+    except Exception as e:
+        print(f"⚠️ 背景更新天氣預報失敗：{e}")
+    finally:
+        with _inflight_lock:
+            _refreshing.discard(key)
+
+
+def get_forecast_cache_stats() -> Dict:
+    """
+    取得快取統計
+
+    Returns:
+        命中、未命中、過期、淘汰次數、上游請求與合併次數、
+        過期沿用（stale）與背景更新次數、命中率、每個項目的資料年齡與剩餘有效時間，
+        以及各縣市的命中統計與查詢過的鄉鎮（counties）
+    """
+    now = time.time()
+    with _forecast_cache_lock:
+        stats = dict(_forecast_cache_stats)
+        entries = [
+            {
+                "provider": key[0],
+                "location": key[1],
+                "dataset": key[2],
+                "age_seconds": now - entry["fetched_at"],
+                "expires_in_seconds": entry["expires_at"] - now,
+                "pinned": entry["pinned"],
+                "stale": entry["expires_at"] <= now,
+            }
+            for key, entry in _forecast_cache.items()
+        ]
+        counties = {
+            county: {
+                "hits": county_stats["hits"],
+                "misses": county_stats["misses"],
+                "hit_rate": county_stats["hits"]
+                / max(county_stats["hits"] + county_stats["misses"], 1),
+                "towns": sorted(county_stats["towns"]),
+            }
+            for county, county_stats in _county_stats.items()
+        }
+
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    stats["size"] = len(entries)
+    stats["max_size"] = FORECAST_CACHE_MAX_ENTRIES
+    stats["entries"] = entries
+    stats["counties"] = counties
+    return stats
+
+
+def clear_forecast_cache(include_store: bool = False):
+    """
+    清除快取與統計
+
+    Args:
+        include_store: 是否一併清除磁碟預報儲存
+    """
+    with _forecast_cache_lock:
+        _forecast_cache.clear()
+        _county_stats.clear()
+        for name in _forecast_cache_stats:
+            _forecast_cache_stats[name] = 0
+    if include_store:
+        with _store_lock:
+            _get_store().execute("DELETE FROM forecast_store").connection.commit()
+
+
+# ========== 同時請求合併（single-flight） ==========
+
+# 進行中的請求：快取鍵 -> {"event", "result"}
+_inflight: Dict[tuple, Dict] = {}
+_inflight_lock = threading.Lock()
+
+
+def _single_flight(key: tuple, loader) -> Optional[List[Dict]]:
+    """
+    同一快取鍵同時只發出一個上游請求，其他呼叫等待並共用結果
+
+    Args:
+        key: 快取鍵（與預報快取相同）
+        loader: 實際取得並解析資料的函式，失敗時回傳 None
+
+    Returns:
+        loader 的結果
+    """
+    with _inflight_lock:
+        call = _inflight.get(key)
+        leader = call is None
+        if leader:
+            call = {
+                "event": threading.Event(),
+                "result": None,
+                "started_at": time.monotonic(),
+            }
+            _inflight[key] = call
+
+    if not leader:
+        # 同一資料的請求已超過總時限仍未完成（上游停頓）：不再等待，由呼叫端改用備援，
+        # 避免等待的執行緒佔滿提供者執行緒池；其他快取鍵與快取命中不受影響
+        wait_seconds = call["started_at"] + WEATHER_DEADLINE_SECONDS - time.monotonic()
+        if wait_seconds <= 0 or not call["event"].wait(wait_seconds):
+            _deadline_stats["skipped_busy"] += 1
+            print(f"⚠️ {key[0]} {key[1]} 仍有逾時未完成的請求，暫不等待")
+            return None
+        with _forecast_cache_lock:
+            _forecast_cache_stats["coalesced"] += 1
+        return call["result"]
+
+    try:
+        # 等待鎖期間可能已有其他請求完成並寫入快取
+        with _forecast_cache_lock:
+            entry = _forecast_cache.get(key)
+            fresh = entry is not None and entry["expires_at"] > time.time()
+        if fresh:
+            call["result"] = entry["data"]
+        else:
+            with _forecast_cache_lock:
+                _forecast_cache_stats["fetches"] += 1
+            call["result"] = loader()
+        return call["result"]
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+        call["event"].set()
+
+
+# ========== HTTP 連線池 ==========
+
+# 每個提供者共用一個 Session，保持連線（keep-alive）避免每次重新 TCP/TLS 交握
+HTTP_POOL_SIZE = int(os.environ.get("WEATHER_HTTP_POOL_SIZE", "10"))
+HTTP_RETRIES = int(os.environ.get("WEATHER_HTTP_RETRIES", "2"))
+
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+_http_stats: Dict[str, Dict] = {}
+
+# 各提供者最近成功請求的耗時（毫秒），用於計算對沖延遲
+_latency_samples: Dict[str, deque] = {
+    "cwa": deque(maxlen=200),
+    "owm": deque(maxlen=200),
+}
+
+
+def _build_retry() -> Retry:
+    """
+    建立重試策略：連線失敗與 429/5xx 以指數退避重試
+
+    讀取逾時不重試（已等待完整逾時，重試只會讓使用者等更久）
+    """
+    options = dict(
+        total=HTTP_RETRIES,
+        connect=HTTP_RETRIES,
+        read=0,
+        status=HTTP_RETRIES,
+        backoff_factor=0.5,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET"}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    try:
+        # urllib3 2.x 支援退避時間加入隨機抖動，避免多個程序同時重試
+        return Retry(backoff_jitter=0.3, **options)
+    except TypeError:
+        return Retry(**options)
+
+
+def get_http_session(provider: str) -> requests.Session:
+    """
+    取得提供者（cwa / owm）共用的 HTTP Session
+
+    Args:
+        provider: 提供者名稱
+
+    Returns:
+        設定好連線池與重試策略的 Session
+    """
+    session = _sessions.get(provider)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        if provider not in _sessions:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=4,
+                pool_maxsize=HTTP_POOL_SIZE,
+                max_retries=_build_retry(),
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update(
+                {"Accept-Encoding": "gzip, deflate", "User-Agent": "ootd-weather/1.0"}
+            )
+            _sessions[provider] = session
+            _http_stats[provider] = {"requests": 0, "errors": 0, "total_ms": 0.0}
+        return _sessions[provider]
+
+
+# ========== 斷路器 ==========
+
+# 連續失敗幾次後開啟斷路器、開啟後多久允許試探請求
+BREAKER_FAILURE_THRESHOLD = int(os.environ.get("WEATHER_BREAKER_FAILURES", "3"))
+BREAKER_RESET_SECONDS = float(os.environ.get("WEATHER_BREAKER_RESET_SECONDS", "60"))
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """斷路器開啟中，請求未送出"""
+
+
+class CircuitBreaker:
+    """
+    提供者斷路器
+
+    - closed：正常送出請求，連續失敗達門檻後轉為 open
+    - open：直接拒絕請求（由呼叫端改用備援），冷卻時間後轉為 half_open
+    - half_open：只放行一個試探請求，成功則 closed，失敗則回到 open
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_seconds: float = BREAKER_RESET_SECONDS,
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_in_flight = False
+        self.stats = {"successes": 0, "failures": 0, "rejected": 0, "trials": 0}
+        self.transitions = deque(maxlen=50)
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str, reason: str):
+        self.transitions.append(
+            {"from": self.state, "to": state, "at": time.time(), "reason": reason}
+        )
+        print(f"⚡ 斷路器 {self.name}：{self.state} → {state}（{reason}）")
+        self.state = state
+
+    def allow_request(self) -> bool:
+        """是否允許送出請求（half_open 時只放行一個試探請求）"""
+        with self._lock:
+            if self.state == "open":
+                if time.time() - self.opened_at < self.reset_seconds:
+                    self.stats["rejected"] += 1
+                    return False
+                self._transition("half_open", "冷卻時間已過")
+            if self.state == "half_open":
+                if self.trial_in_flight:
+                    self.stats["rejected"] += 1
+                    return False
+                self.trial_in_flight = True
+                self.stats["trials"] += 1
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.stats["successes"] += 1
+            self.consecutive_failures = 0
+            self.trial_in_flight = False
+            if self.state != "closed":
+                self._transition("closed", "試探請求成功")
+
+    def record_failure(self, reason: str):
+        with self._lock:
+            self.stats["failures"] += 1
+            self.consecutive_failures += 1
+            self.trial_in_flight = False
+            if self.state == "half_open":
+                self.opened_at = time.time()
+                self._transition("open", f"試探請求失敗：{reason}")
+            elif (
+                self.state == "closed"
+                and self.consecutive_failures >= self.failure_threshold
+            ):
+                self.opened_at = time.time()
+                self._transition(
+                    "open", f"連續失敗 {self.consecutive_failures} 次：{reason}"
+                )
+
+    def release_trial(self):
+        """請求未完成即被取消（如非同步查詢競速落敗）：釋放試探名額，不計成功或失敗"""
+        with self._lock:
+            self.trial_in_flight = False
+
+    def snapshot(self) -> Dict:
+        """目前狀態與統計"""
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "open_for_seconds": (
+                    time.time() - self.opened_at if self.state == "open" else 0.0
+                ),
+                **self.stats,
+                "transitions": list(self.transitions),
+            }
+
+
+_breakers = {"cwa": CircuitBreaker("cwa"), "owm": CircuitBreaker("owm")}
+
+
+def get_circuit_breaker_stats() -> Dict[str, Dict]:
+    """取得各提供者斷路器的狀態、統計與最近的狀態轉換"""
+    return {name: breaker.snapshot() for name, breaker in _breakers.items()}
+
+
+def http_get(provider: str, url: str, **kwargs) -> requests.Response:
+    """
+    透過提供者的共用 Session 發出 GET 請求並記錄耗時
+
+    Args:
+        provider: 提供者名稱
+        url: 網址
+        **kwargs: 傳給 Session.get 的參數（params、timeout 等）
+
+    Returns:
+        回應物件（失敗時拋出 requests 例外，斷路器開啟時拋出 CircuitOpenError）
+    """
+    session = get_http_session(provider)
+    breaker = _breakers.get(provider)
+    if breaker and not breaker.allow_request():
+        raise CircuitOpenError(f"{provider} 斷路器開啟中，略過請求")
+
+    start = time.perf_counter()
+    try:
+        response = session.get(url, **kwargs)
+    except requests.exceptions.RequestException as e:
+        _http_stats[provider]["errors"] += 1
+        if breaker:
+            breaker.record_failure(type(e).__name__)
+        raise
+    else:
+        _latency_samples.setdefault(provider, deque(maxlen=200)).append(
+            (time.perf_counter() - start) * 1000
+        )
+        if breaker:
+            if response.status_code == 429 or response.status_code >= 500:
+                breaker.record_failure(f"HTTP {response.status_code}")
+            else:
+                breaker.record_success()
+        return response
+    finally:
+        _http_stats[provider]["requests"] += 1
+        _http_stats[provider]["total_ms"] += (time.perf_counter() - start) * 1000
+
+
+def get_http_pool_stats() -> Dict[str, Dict]:
+    """
+    取得各提供者的連線池統計
+
+    Returns:
+        每個提供者的請求數、錯誤數、平均耗時，以及各主機的
+        建立連線數（connections）、請求數（requests）與連線重用次數（reused）
+    """
+    stats = {}
+    for provider, session in list(_sessions.items()):
+        provider_stats = dict(_http_stats[provider])
+        provider_stats["avg_ms"] = provider_stats["total_ms"] / max(
+            provider_stats["requests"], 1
+        )
+        hosts = {}
+        adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+        for adapter in adapters.values():
+            pools = adapter.poolmanager.pools
+            for pool_key in list(pools.keys()):
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                connections = getattr(pool, "num_connections", 0)
+                requests_made = getattr(pool, "num_requests", 0)
+                hosts[f"{pool.host}:{pool.port}"] = {
+                    "connections": connections,
+                    "requests": requests_made,
+                    "reused": max(requests_made - connections, 0),
+                }
+        provider_stats["hosts"] = hosts
+        stats[provider] = provider_stats
+    return stats
+
+
+def fetch_cwa_dataset(
+    api_id: str, location_name: str = None, timeout: float = 15
+) -> dict:
+    """
+    呼叫中央氣象署資料集 API
+
+    Args:
+        api_id: 資料集代碼
+        location_name: 縣市名稱（省略時回傳全部縣市）
+        timeout: 逾時秒數
+
+    Returns:
+        API 回應 JSON，失敗時拋出例外
+    """
+    response = http_get(
+        "cwa",
+        f"{CWA_DATASTORE_URL}/{api_id}",
+        params=cwa_params(location_name),
+        timeout=timeout,
+    )
+    response.raise_for_status()
+    return check_cwa_response(response.json())
+
+
+# 中央氣象署開放資料 API
+CWA_DATASTORE_URL = f"{CWA_API_BASE}/api/v1/rest/datastore"
+
+
+def cwa_params(location_name: str = None) -> Dict:
+    """CWA 資料集 API 的查詢參數（省略縣市時回傳全部縣市）"""
+    params = {"Authorization": CWA_API_KEY}
+    if location_name:
+        params["locationName"] = location_name
+    return params
+
+
+def check_cwa_response(data: dict) -> dict:
+    """檢查 CWA 回應是否成功，失敗時拋出例外"""
+    if data.get("success") != "true":
+        raise Exception(f"API 回應失敗: {data.get('message', '未知錯誤')}")
+    return data
+
+
+def select_cwa_dataset(days: int) -> str:
+    """根據天數選擇 CWA 資料集"""
+    if days <= 2:
+        # 使用「一般天氣預報-今明 36 小時天氣預報」
+        return "F-C0032-001"
+    # 使用「一般天氣預報-未來一週天氣預報」，提供 7 天預報
+    return "F-D0047-091"
+
+
+def parse_cwa_dataset(data: dict, api_id: str) -> List[Dict]:
+    """依資料集格式解析 CWA 回應（保留完整 7 天，供快取使用）"""
+    if api_id == "F-C0032-001":
+        # 36 小時預報格式
+        return parse_cwa_36h_data(data, 7)
+    # 一週預報格式
+    return parse_cwa_7d_data(data, 7)
+
+
+# ========== 全國預報預先載入 ==========
+
+# 全國預報的資料集（省略 locationName 即一次回傳所有縣市）
+NATIONAL_DATASETS = ("F-C0032-001", "F-D0047-091")
+
+# 全國預報以串流方式逐一解析地點（不先將整份數 MB 的回應載入記憶體）
+CWA_STREAM_PARSE = os.environ.get("WEATHER_STREAM_PARSE", "1") == "1"
+CWA_STREAM_CHUNK_BYTES = 64 * 1024
+
+# 解析器會用到的天氣元素，其餘元素（濕度、風速、舒適度等）在串流解析時直接丟棄
+CWA_PARSED_ELEMENTS = frozenset(
+    {"Wx", "PoP", "MinT", "MaxT", "WeatherDescription", "T", "PoP12h", "PoP6h"}
+)
+
+_LOCATION_ARRAY_RE = re.compile(r'"location"\s*:\s*\[')
+_ARRAY_SEPARATOR_RE = re.compile(r"[\s,]*")
+_json_decoder = json.JSONDecoder()
+
+
+def _slim_location(location: dict) -> dict:
+    """只保留地點名稱與解析會用到的天氣元素"""
+    return {
+        "locationName": location["locationName"],
+        "weatherElement": [
+            element
+            for element in location["weatherElement"]
+            if element["elementName"] in CWA_PARSED_ELEMENTS
+        ],
     }
 
-    return taiwan_cities.get(city_name)
 
+def iter_cwa_location_stream(chunks: Iterable[bytes]) -> Iterator[dict]:
+    """
+    逐段解碼 CWA 回應，依序產出 location 陣列中的每個地點
+
+    只有目前解碼中的一個地點會完整存在記憶體，其餘內容讀過即丟，
+    記憶體用量與地點數無關
+
+    Args:
+        chunks: 回應內容的位元組片段（如 response.iter_content()）
+
+    Returns:
+        地點資料（僅含解析會用到的天氣元素），回應失敗或不完整時拋出例外
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    in_array = False
+
+    for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        if not in_array:
+            match = _LOCATION_ARRAY_RE.search(buffer)
+            if not match:
+                continue
+            in_array = True
+            buffer = buffer[match.end() :]
+
+        pos = 0
+        while True:
+            pos = _ARRAY_SEPARATOR_RE.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == "]":
+                return
+            try:
+                location, pos_end = _json_decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # 地點尚未接收完整，等待下一段
+                break
+            yield _slim_location(location)
+            pos = pos_end
+        buffer = buffer[pos:]
+
+    if in_array:
+        raise ValueError("CWA 回應不完整：地點陣列未結束")
+    # 沒有地點陣列：通常是錯誤回應（內容很小），交由 check_cwa_response 回報訊息
+    check_cwa_response(json.loads(buffer + decoder.decode(b"", final=True)))
+    raise ValueError("CWA 回應中找不到地點資料")
+
+
+def stream_cwa_locations(api_id: str, timeout: float = 30) -> Iterator[dict]:
+    """
+    以串流方式請求全國資料集並逐一產出地點
+
+    Args:
+        api_id: 資料集代碼
+        timeout: 逾時秒數（連線與每次讀取）
+
+    Returns:
+        地點資料，失敗時拋出例外
+    """
+    response = http_get(
+        "cwa",
+        f"{CWA_DATASTORE_URL}/{api_id}",
+        params=cwa_params(),
+        timeout=timeout,
+        stream=True,
+    )
+    with response:
+        response.raise_for_status()
+        yield from iter_cwa_location_stream(
+            response.iter_content(chunk_size=CWA_STREAM_CHUNK_BYTES)
+        )
+
+
+def _national_locations(api_id: str) -> Iterable[dict]:
+    """取得全國資料集的所有地點（依設定串流解析或整份載入）"""
+    if CWA_STREAM_PARSE:
+        return stream_cwa_locations(api_id, timeout=30)
+    return iter_cwa_locations(fetch_cwa_dataset(api_id, timeout=30), api_id)
+
+
+def refresh_national_forecasts(force: bool = False) -> Dict[str, Dict]:
+    """
+    一次請求取得全國所有縣市的預報並寫入快取（由排程器於每次發布後執行）
+
+    快取中的全國資料不會被 LRU 淘汰，之後所有縣市查詢都直接由快取提供，
+    對外請求數固定為每次發布每個資料集一次，與使用者數無關
+
+    Args:
+        force: 即使資料尚未到期也重新取得
+
+    Returns:
+        各資料集的更新狀態
+    """
+    if not CWA_API_KEY:
+        return {}
+
+    for api_id in NATIONAL_DATASETS:
+        status = _national_status.get(api_id)
+        if not force and status and status["expires_at"] > time.time():
+            continue
+
+        start = time.perf_counter()
+        # 先解析完所有地點再寫入快取，避免串流中途失敗時只更新一部分縣市
+        parsed = []
+        try:
+            for location in _national_locations(api_id):
+                if api_id == "F-C0032-001":
+                    weather_list = parse_cwa_36h_location(location)
+                    hourly = parse_cwa_36h_hourly(location)
+                else:
+                    weather_list = parse_cwa_7d_location(location, 7)
+                    hourly = parse_cwa_7d_hourly(location)
+                if weather_list:
+                    parsed.append((location["locationName"], weather_list, hourly))
+        except Exception as e:
+            print(f"❌ 全國預報 {api_id} 取得失敗：{e}")
+            continue
+
+        expires_at = next_cwa_issuance(api_id).timestamp()
+        stored = []
+        for location_name, weather_list, hourly in parsed:
+            key = ("cwa", location_name, api_id)
+            entry = _cache_put(
+                key, weather_list, expires_at, pinned=True, persist=False
+            )
+            stored.append((key, entry))
+            if hourly:
+                hourly_key = _hourly_key(key)
+                entry = _cache_put(
+                    hourly_key, hourly, expires_at, pinned=True, persist=False
+                )
+                stored.append((hourly_key, entry))
+        _store_put_many(stored)
+        counties = len(parsed)
+
+        _national_status[api_id] = {
+            "refreshed_at": time.time(),
+            "expires_at": expires_at,
+            "counties": counties,
+            "ms": (time.perf_counter() - start) * 1000,
+        }
+        print(
+            f"✅ 已更新全國預報 {api_id}：{counties} 個縣市"
+            f"（{_national_status[api_id]['ms']:.0f} ms）"
+        )
+
+    if CWA_TOWNSHIP_ENABLED:
+        refresh_township_forecasts(force)
+
+    return dict(_national_status)
+
+
+def refresh_township_forecasts(force: bool = False) -> int:
+    """
+    預先取得各縣市的鄉鎮預報資料集（3 天與 1 週）並固定於快取
+
+    鄉鎮查詢因此與縣市查詢一樣直接由快取提供，不會在使用者請求時向上游取得；
+    由 refresh_national_forecasts 於每次發布後一併執行
+
+    Args:
+        force: 即使資料尚未到期也重新取得
+
+    Returns:
+        實際重新取得的資料集數
+    """
+    refreshed = 0
+    for county in CWA_TOWNSHIP_DATASETS:
+        for days in (3, 7):
+            api_id = select_township_dataset(county, days)
+            index_key = ("cwa_towns", county, api_id)
+            loader = lambda: _load_cwa_townships(county, api_id, pinned=True)
+            if force:
+                towns = loader()
+            else:
+                index = _cache_peek(index_key)
+                if index and index["expires_at"] > time.time():
+                    continue
+                # 與使用者請求觸發的載入共用 single-flight，同一資料集不會重複請求
+                towns = _single_flight(index_key, loader)
+            if towns is not None:
+                refreshed += 1
+    if refreshed:
+        print(f"✅ 已預先載入 {refreshed} 個鄉鎮預報資料集")
+    return refreshed
+
+
+def get_national_forecast_status() -> Dict[str, Dict]:
+    """取得各資料集最近一次全國更新的狀態"""
+    return dict(_national_status)
+
+
+def get_cwa_weather_forecast(city_name: str, days: int = 7) -> Optional[List[Dict]]:
+    """
+    使用中央氣象署 API 取得天氣預報（台灣專用，最準確）
+
+    Args:
+        city_name: 城市名稱
+        days: 預報天數（1 天或 7 天）
+
+    Returns:
+        天氣資訊列表
+    """
+    if not CWA_API_KEY:
+        print("⚠️ 未設定中央氣象署 API 金鑰，請至 https://opendata.cwa.gov.tw/ 申請")
+        return None
+
+    place = resolve_location(city_name)
+    location_name = place.county if place else city_name
+    if not location_name:
+        print(f"❌ 找不到 {city_name} 的對應縣市")
+        return None
+
+    # 優先使用鄉鎮預報，失敗或查無該鄉鎮時改用縣市預報
+    if place and CWA_TOWNSHIP_ENABLED:
+        township_result = get_cwa_township_forecast(place, days)
+        if township_result:
+            return township_result
+
+    # 根據天數選擇不同的 API
+    api_id = select_cwa_dataset(days)
+
+    # 以解析後的縣市為快取鍵，同縣市各鄉鎮共用一次請求與解析
+    cache_key = ("cwa", location_name, api_id)
+    cached = _cache_get(cache_key)
+    _record_county_lookup(location_name, city_name, cached is not None)
+    if cached:
+        # 全國預報過期時整批重新取得，其餘依縣市更新
+        if cached["pinned"]:
+            return _serve_cached(
+                cached, days, ("cwa", "national", "refresh"), refresh_national_forecasts
+            )
+        return _serve_cached(
+            cached, days, cache_key, lambda: _load_cwa_forecast(location_name, api_id)
+        )
+
+    weather_list = _single_flight(
+        cache_key, lambda: _load_cwa_forecast(location_name, api_id)
+    )
+    if weather_list is None:
+        return None
+    return _copy_days(weather_list, days)
 
-def get_cwa_location_name(city_name: str) -> Optional[str]:
-    """
-    將城市名稱對應到中央氣象署的行政區代碼
-    """
-    # 中央氣象署縣市名稱對照表
-    cwa_location_map = {
-        # 新北市
-        "泰山": "新北市",
-        "板橋": "新北市",
-        "新北": "新北市",
-        "萬華": "臺北市",
-        "樹林": "新北市",
-        "三重": "新北市",
-        "新莊": "新北市",
-        "中和": "新北市",
-        "永和": "新北市",
-        "土城": "新北市",
-        "蘆洲": "新北市",
-        "汐止": "新北市",
-        "淡水": "新北市",
-        "瑞芳": "新北市",
-        "三峽": "新北市",
-        "鶯歌": "新北市",
-        "新店": "新北市",
-        "深坑": "新北市",
-        "石碇": "新北市",
-        "坪林": "新北市",
-        "烏來": "新北市",
-        "五股": "新北市",
-        "八里": "新北市",
-        "林口": "新北市",
-        "三芝": "新北市",
-        "石門": "新北市",
-        "金山": "新北市",
-        "萬里": "新北市",
-        "平溪": "新北市",
-        "雙溪": "新北市",
-        "貢寮": "新北市",
-        # 台北市
-        "台北": "臺北市",
-        "臺北": "臺北市",
-        "士林": "臺北市",
-        "北投": "臺北市",
-        "內湖": "臺北市",
-        "南港": "臺北市",
-        "松山": "臺北市",
-        "信義": "臺北市",
-        "大安": "臺北市",
-        "中山": "臺北市",
-        "中正": "臺北市",
-        "大同": "臺北市",
-        "文山": "臺北市",
-        # 基隆市
-        "基隆": "基隆市",
-        # 桃園市
-        "桃園": "桃園市",
-        "中壢": "桃園市",
-        "平鎮": "桃園市",
-        "八德": "桃園市",
-        "楊梅": "桃園市",
-        "蘆竹": "桃園市",
-        "大溪": "桃園市",
-        "龍潭": "桃園市",
-        "龜山": "桃園市",
-        "大園": "桃園市",
-        "觀音": "桃園市",
-        "新屋": "桃園市",
-        "復興": "桃園市",
-        # 新竹市/縣
-        "新竹": "新竹市",
-        "竹北": "新竹縣",
-        "竹東": "新竹縣",
-        "新埔": "新竹縣",
-        "關西": "新竹縣",
-        "湖口": "新竹縣",
-        "新豐": "新竹縣",
-        "峨眉": "新竹縣",
-        "寶山": "新竹縣",
-        "北埔": "新竹縣",
-        "芎林": "新竹縣",
-        "橫山": "新竹縣",
-        "尖石": "新竹縣",
-        "五峰": "新竹縣",
-        # 苗栗縣
-        "苗栗": "苗栗縣",
-        "頭份": "苗栗縣",
-        "竹南": "苗栗縣",
-        "苑裡": "苗栗縣",
-        "通霄": "苗栗縣",
-        "後龍": "苗栗縣",
-        "卓蘭": "苗栗縣",
-        "大湖": "苗栗縣",
-        "公館": "苗栗縣",
-        "銅鑼": "苗栗縣",
-        "南庄": "苗栗縣",
-        "頭屋": "苗栗縣",
-        "三義": "苗栗縣",
-        "西湖": "苗栗縣",
-        "造橋": "苗栗縣",
-        "三灣": "苗栗縣",
-        "獅潭": "苗栗縣",
-        "泰安": "苗栗縣",
-        # 台中市
-        "台中": "臺中市",
-        "臺中": "臺中市",
-        "豐原": "臺中市",
-        "大里": "臺中市",
-        "太平": "臺中市",
-        "清水": "臺中市",
-        "沙鹿": "臺中市",
-        "大甲": "臺中市",
-        "東勢": "臺中市",
-        "梧棲": "臺中市",
-        "烏日": "臺中市",
-        "神岡": "臺中市",
-        "大肚": "臺中市",
-        "大雅": "臺中市",
-        "后里": "臺中市",
-        "霧峰": "臺中市",
-        "潭子": "臺中市",
-        "龍井": "臺中市",
-        "外埔": "臺中市",
-        "和平": "臺中市",
-        "石岡": "臺中市",
-        "新社": "臺中市",
-        # 彰化縣
-        "彰化": "彰化縣",
-        "員林": "彰化縣",
-        "和美": "彰化縣",
-        "鹿港": "彰化縣",
-        "溪湖": "彰化縣",
-        "二林": "彰化縣",
-        "田中": "彰化縣",
-        "北斗": "彰化縣",
-        # 南投縣
-        "南投": "南投縣",
-        "埔里": "南投縣",
-        "草屯": "南投縣",
-        "竹山": "南投縣",
-        "集集": "南投縣",
-        "名間": "南投縣",
-        "鹿谷": "南投縣",
-        "中寮": "南投縣",
-        "魚池": "南投縣",
-        "國姓": "南投縣",
-        "水里": "南投縣",
-        "仁愛": "南投縣",
-        # 雲林縣
-        "雲林": "雲林縣",
-        "斗六": "雲林縣",
-        "斗南": "雲林縣",
-        "虎尾": "雲林縣",
-        "西螺": "雲林縣",
-        "土庫": "雲林縣",
-        "北港": "雲林縣",
-        "古坑": "雲林縣",
-        # 嘉義市/縣
-        "嘉義": "嘉義市",
-        "太保": "嘉義縣",
-        "朴子": "嘉義縣",
-        "布袋": "嘉義縣",
-        "大林": "嘉義縣",
-        "民雄": "嘉義縣",
-        "溪口": "嘉義縣",
-        "新港": "嘉義縣",
-        "六腳": "嘉義縣",
-        "東石": "嘉義縣",
-        "義竹": "嘉義縣",
-        "鹿草": "嘉義縣",
-        "水上": "嘉義縣",
-        "中埔": "嘉義縣",
-        "竹崎": "嘉義縣",
-        "梅山": "嘉義縣",
-        "番路": "嘉義縣",
-        "大埔": "嘉義縣",
-        "阿里山": "嘉義縣",
-        # 台南市
-        "台南": "臺南市",
-        "臺南": "臺南市",
-        "新營": "臺南市",
-        "永康": "臺南市",
-        "歸仁": "臺南市",
-        "佳里": "臺南市",
-        "麻豆": "臺南市",
-        "新化": "臺南市",
-        "善化": "臺南市",
-        "新市": "臺南市",
-        "安定": "臺南市",
-        "仁德": "臺南市",
-        "關廟": "臺南市",
-        "龍崎": "臺南市",
-        "官田": "臺南市",
-        "六甲": "臺南市",
-        "大內": "臺南市",
-        "柳營": "臺南市",
-        "鹽水": "臺南市",
-        "白河": "臺南市",
-        "東山": "臺南市",
-        "後壁": "臺南市",
-        "下營": "臺南市",
-        "學甲": "臺南市",
-        "西港": "臺南市",
-        "七股": "臺南市",
-        "將軍": "臺南市",
-        "北門": "臺南市",
-        # 高雄市
-        "高雄": "高雄市",
-        "鳳山": "高雄市",
-        "岡山": "高雄市",
-        "旗山": "高雄市",
-        "美濃": "高雄市",
-        "橋頭": "高雄市",
-        "燕巢": "高雄市",
-        "田寮": "高雄市",
-        "阿蓮": "高雄市",
-        "路竹": "高雄市",
-        "湖內": "高雄市",
-        "茄萣": "高雄市",
-        "永安": "高雄市",
-        "彌陀": "高雄市",
-        "梓官": "高雄市",
-        "大社": "高雄市",
-        "大樹": "高雄市",
-        "大寮": "高雄市",
-        "林園": "高雄市",
-        "仁武": "高雄市",
-        "鳥松": "高雄市",
-        "小港": "高雄市",
-        "前鎮": "高雄市",
-        "旗津": "高雄市",
-        "鼓山": "高雄市",
-        "鹽埕": "高雄市",
-        "左營": "高雄市",
-        "楠梓": "高雄市",
-        "三民": "高雄市",
-        "苓雅": "高雄市",
-        "新興": "高雄市",
-        "前金": "高雄市",
-        "內門": "高雄市",
-        "杉林": "高雄市",
-        "甲仙": "高雄市",
-        "六龜": "高雄市",
-        "茂林": "高雄市",
-        "桃源": "高雄市",
-        "那瑪夏": "高雄市",
-        # 屏東縣
-        "屏東": "屏東縣",
-        "潮州": "屏東縣",
-        "東港": "屏東縣",
-        "恆春": "屏東縣",
-        "萬丹": "屏東縣",
-        "長治": "屏東縣",
-        "麟洛": "屏東縣",
-        "九如": "屏東縣",
-        "里港": "屏東縣",
-        "鹽埔": "屏東縣",
-        "高樹": "屏東縣",
-        "萬巒": "屏東縣",
-        "內埔": "屏東縣",
-        "竹田": "屏東縣",
-        "新埤": "屏東縣",
-        "枋寮": "屏東縣",
-        # 宜蘭縣
-        "宜蘭": "宜蘭縣",
-        "羅東": "宜蘭縣",
-        "蘇澳": "宜蘭縣",
-        "頭城": "宜蘭縣",
-        "礁溪": "宜蘭縣",
-        "壯圍": "宜蘭縣",
-        "員山": "宜蘭縣",
-        "冬山": "宜蘭縣",
-        "五結": "宜蘭縣",
-        "三星": "宜蘭縣",
-        "大同": "宜蘭縣",
-        "南澳": "宜蘭縣",
-        # 花蓮縣
-        "花蓮": "花蓮縣",
-        "鳳林": "花蓮縣",
-        "玉里": "花蓮縣",
-        "新城": "花蓮縣",
-        "吉安": "花蓮縣",
-        "壽豐": "花蓮縣",
-        "光復": "花蓮縣",
-        "豐濱": "花蓮縣",
-        "瑞穗": "花蓮縣",
-        "富里": "花蓮縣",
-        "秀林": "花蓮縣",
-        "萬榮": "花蓮縣",
-        "卓溪": "花蓮縣",
-        # 台東縣
-        "台東": "臺東縣",
-        "臺東": "臺東縣",
-        "成功": "臺東縣",
-        "關山": "臺東縣",
-        "卑南": "臺東縣",
-        "鹿野": "臺東縣",
-        "池上": "臺東縣",
-        "東河": "臺東縣",
-        "長濱": "臺東縣",
-        "太麻里": "臺東縣",
-        "大武": "臺東縣",
-        "綠島": "臺東縣",
-        # 澎湖縣
-        "澎湖": "澎湖縣",
-        "馬公": "澎湖縣",
-        "湖西": "澎湖縣",
-        "白沙": "澎湖縣",
-        "西嶼": "澎湖縣",
-        "望安": "澎湖縣",
-        "七美": "澎湖縣",
-        # 金門縣
-        "金門": "金門縣",
-        "金城": "金門縣",
-        "金湖": "金門縣",
-        "金沙": "金門縣",
-        "金寧": "金門縣",
-        "烈嶼": "金門縣",
-        # 連江縣（馬祖）
-        "連江": "連江縣",
-        "南竿": "連江縣",
-        "北竿": "連江縣",
-        "莒光": "連江縣",
-        "東引": "連江縣",
-    }
 
-    return cwa_location_map.get(city_name, city_name)
+def _load_cwa_forecast(location_name: str, api_id: str) -> Optional[List[Dict]]:
+    """向 CWA 取得單一縣市的預報並解析、寫入快取，失敗時回傳 None"""
+    try:
+        data = fetch_cwa_dataset(api_id, location_name)
+        weather_list = parse_cwa_dataset(data, api_id)
+
+        # 快取完整解析結果（每日與逐時），到下一次發布時間失效
+        if weather_list:
+            _cache_forecast(
+                ("cwa", location_name, api_id),
+                weather_list,
+                parse_cwa_dataset_hourly(data, api_id),
+                next_cwa_issuance(api_id).timestamp(),
+            )
 
+        return weather_list
 
-def get_cwa_weather_forecast(city_name: str, days: int = 7) -> Optional[List[Dict]]:
+    except requests.exceptions.RequestException as e:
+        print(f"❌ 中央氣象署 API 請求失敗：{e}")
+        return None
+    except Exception as e:
+        print(f"❌ 處理氣象資料失敗：{e}")
+        return None
+
+
+# ========== 鄉鎮預報 ==========
+
+
+def select_township_dataset(county: str, days: int) -> Optional[str]:
+    """依縣市與天數選擇鄉鎮預報資料集（3 天內用逐 3 小時資料集）"""
+    number = CWA_TOWNSHIP_DATASETS.get(county)
+    if number is None:
+        return None
+    if days > 3:
+        number += 2
+    return f"F-D0047-{number:03d}"
+
+
+def _cache_peek(key: tuple) -> Optional[Dict]:
+    """讀取快取項目（不計入統計、不調整 LRU 順序）"""
+    with _forecast_cache_lock:
+        return _forecast_cache.get(key)
+
+
+def get_cwa_township_forecast(place: gz.Place, days: int = 7) -> Optional[List[Dict]]:
     """
-    使用中央氣象署 API 取得天氣預報（台灣專用，最準確）
+    取得鄉鎮層級的預報
+
+    同縣市所有鄉鎮由一次請求取得並分別快取，
+    之後同縣市其他鄉鎮的查詢都直接由快取提供
 
     Args:
-        city_name: 城市名稱
-        days: 預報天數（1 天或 7 天）
+        place: 地名索引中的地點
+        days: 預報天數
 
     Returns:
-        天氣資訊列表
+        天氣資訊列表，該縣市資料集中沒有此鄉鎮或請求失敗時回傳 None
     """
-    if not CWA_API_KEY:
-        print("⚠️ 未設定中央氣象署 API 金鑰，請至 https://opendata.cwa.gov.tw/ 申請")
+    api_id = select_township_dataset(place.county, days)
+    if not api_id:
         return None
 
-    location_name = get_cwa_location_name(city_name)
-    if not location_name:
-        print(f"❌ 找不到 {city_name} 的對應縣市")
+    town = gz.town_key(place.name)
+    town_key = ("cwa", f"{place.county}{town}", api_id)
+    index_key = ("cwa_towns", place.county, api_id)
+    loader = lambda: _load_cwa_townships(place.county, api_id)
+
+    cached = _cache_get(town_key)
+    _record_county_lookup(place.county, place.name, cached is not None)
+    if cached:
+        return _serve_cached(cached, days, index_key, loader)
+
+    # 已取得的縣市資料集中沒有此鄉鎮（如以縣市名稱查詢），直接改用縣市預報
+    index = _cache_peek(index_key)
+    if index and index["expires_at"] > time.time() and town not in index["data"]:
         return None
 
-    try:
-        # 根據天數選擇不同的 API
-        if days <= 2:
-            # 使用「一般天氣預報-今明 36 小時天氣預報」
-            api_id = "F-C0032-001"
-        else:
-            # 使用「一般天氣預報-未來一週天氣預報」
-            api_id = "F-D0047-091"  # 這個 API 提供 7 天預報
+    towns = _single_flight(index_key, loader)
+    if not towns or town not in towns:
+        return None
+    entry = _cache_peek(town_key)
+    return _copy_days(entry["data"], days, entry["fetched_at"]) if entry else None
 
-        url = f"https://opendata.cwa.gov.tw/api/v1/rest/datastore/{api_id}"
-        params = {
-            "Authorization": CWA_API_KEY,
-            "locationName": location_name,
-        }
 
-        response = requests.get(url, params=params, timeout=15)
-        response.raise_for_status()
-        data = response.json()
+def _store_cwa_townships(
+    county: str, api_id: str, data: dict, pinned: bool = False
+) -> List[str]:
+    """
+    解析縣市鄉鎮預報資料集的每個鄉鎮並寫入快取（同步與非同步版共用）
 
-        if data.get("success") != "true":
-            raise Exception(f"API 回應失敗: {data.get('message', '未知錯誤')}")
+    Args:
+        pinned: 排程預先載入的資料不會被 LRU 淘汰
 
-        # 解析天氣資料
-        weather_list = []
+    Returns:
+        資料集中的鄉鎮名稱列表（去除鄉鎮市區後綴）
+    """
+    expires_at = next_cwa_issuance(api_id).timestamp()
+    stored = []
+    towns = []
+    for location in data["records"]["locations"][0]["location"]:
+        weather_list = parse_cwa_7d_location(location, 7)
+        if not weather_list:
+            continue
+        town = gz.town_key(location["locationName"])
+        key = ("cwa", f"{county}{town}", api_id)
+        entry = _cache_put(key, weather_list, expires_at, pinned=pinned, persist=False)
+        stored.append((key, entry))
+        hourly = parse_cwa_7d_hourly(location)
+        if hourly:
+            hourly_key = _hourly_key(key)
+            entry = _cache_put(
+                hourly_key, hourly, expires_at, pinned=pinned, persist=False
+            )
+            stored.append((hourly_key, entry))
+        towns.append(town)
 
-        if api_id == "F-C0032-001":
-            # 36 小時預報格式
-            weather_list = parse_cwa_36h_data(data, days)
-        else:
-            # 一週預報格式
-            weather_list = parse_cwa_7d_data(data, days)
+    # 鄉鎮清單也寫入快取，查無鄉鎮時不必重新請求
+    index_key = ("cwa_towns", county, api_id)
+    entry = _cache_put(index_key, towns, expires_at, pinned=pinned, persist=False)
+    stored.append((index_key, entry))
+    _store_put_many(stored)
+    return towns
 
-        return weather_list[:days]
+
+def _load_cwa_townships(
+    county: str, api_id: str, pinned: bool = False
+) -> Optional[List[str]]:
+    """
+    取得縣市鄉鎮預報資料集，解析每個鄉鎮並寫入快取
+
+    Returns:
+        資料集中的鄉鎮名稱列表（去除鄉鎮市區後綴），失敗時回傳 None
+    """
+    try:
+        start = time.perf_counter()
+        towns = _store_cwa_townships(county, api_id, fetch_cwa_dataset(api_id), pinned)
+        print(
+            f"✅ 已取得 {county} 鄉鎮預報 {api_id}：{len(towns)} 個鄉鎮"
+            f"（{(time.perf_counter() - start) * 1000:.0f} ms）"
+        )
+        return towns
 
     except requests.exceptions.RequestException as e:
-        print(f"❌ 中央氣象署 API 請求失敗：{e}")
+        print(f"❌ 中央氣象署鄉鎮預報請求失敗：{e}")
         return None
     except Exception as e:
-        print(f"❌ 處理氣象資料失敗：{e}")
+        print(f"❌ 處理鄉鎮預報失敗：{e}")
         return None
 
 
+def iter_cwa_locations(data: dict, api_id: str) -> List[dict]:
+    """取得 CWA 回應中的所有地點資料"""
+    if api_id == "F-C0032-001":
+        return data["records"]["location"]
+    return data["records"]["locations"][0]["location"]
+
+
 def parse_cwa_36h_data(data: dict, days: int) -> List[Dict]:
     """解析中央氣象署 36 小時預報資料"""
-    weather_list = []
-
     try:
         locations = data["records"]["location"]
         if not locations:
             return []
+        return parse_cwa_36h_location(locations[0])
+    except Exception as e:
+        print(f"解析 36 小時資料失敗：{e}")
+        return []
 
-        weather_elements = locations[0]["weatherElement"]
-
-        # 找出各項資料
-        wx_element = next(
-            (e for e in weather_elements if e["elementName"] == "Wx"), None
-        )
-        pop_element = next(
-            (e for e in weather_elements if e["elementName"] == "PoP"), None
-        )
-        min_t_element = next(
-            (e for e in weather_elements if e["elementName"] == "MinT"), None
-        )
-        max_t_element = next(
-            (e for e in weather_elements if e["elementName"] == "MaxT"), None
-        )
-
-        if not all([wx_element, pop_element, min_t_element, max_t_element]):
-            return []
-
-        # 整理每個時段的資料
-        time_periods = len(wx_element["time"])
-        daily_data = {}
-
-        for i in range(time_periods):
-            start_time = wx_element["time"][i]["startTime"]
-            date_str = start_time.split(" ")[0]
 
-            if date_str not in daily_data:
-                daily_data[date_str] = {
-                    "temps_max": [],
-                    "temps_min": [],
-                    "descriptions": [],
-                    "rain_probs": [],
-                }
+def _index_elements(weather_elements: List[dict]) -> Dict[str, list]:
+    """一次走訪 weatherElement，依名稱索引各元素的時間序列"""
+    return {element["elementName"]: element["time"] for element in weather_elements}
 
-            daily_data[date_str]["descriptions"].append(
-                wx_element["time"][i]["parameter"]["parameterName"]
-            )
-            daily_data[date_str]["rain_probs"].append(
-                float(pop_element["time"][i]["parameter"]["parameterName"])
-            )
-            daily_data[date_str]["temps_min"].append(
-                float(min_t_element["time"][i]["parameter"]["parameterName"])
-            )
-            daily_data[date_str]["temps_max"].append(
-                float(max_t_element["time"][i]["parameter"]["parameterName"])
-            )
 
-        # 整理成每日資料
-        for date_str in sorted(daily_data.keys()):
-            day_info = daily_data[date_str]
-            weather_list.append(
-                {
-                    "date": date_str,
-                    "temp_max": max(day_info["temps_max"]),
-                    "temp_min": min(day_info["temps_min"]),
-                    "description": day_info["descriptions"][0],
-                    "rain_probability": max(day_info["rain_probs"]),
-                }
-            )
+def parse_cwa_36h_location(location: dict) -> List[Dict]:
+    """解析 36 小時預報中單一地點的資料"""
+    try:
+        elements = _index_elements(location["weatherElement"])
+        wx = elements.get("Wx")
+        pop = elements.get("PoP")
+        min_t = elements.get("MinT")
+        max_t = elements.get("MaxT")
+        if not (wx and pop and min_t and max_t):
+            return []
 
-        return weather_list
+        # 每日資料：日期 -> [最高溫, 最低溫, 天氣描述, 降雨機率]
+        daily = {}
+        for wx_time, pop_time, min_time, max_time in zip(wx, pop, min_t, max_t):
+            date_str = wx_time["startTime"][:10]
+            temp_max = float(max_time["parameter"]["parameterName"])
+            temp_min = float(min_time["parameter"]["parameterName"])
+            rain = float(pop_time["parameter"]["parameterName"])
+
+            day = daily.get(date_str)
+            if day is None:
+                daily[date_str] = [
+                    temp_max,
+                    temp_min,
+                    wx_time["parameter"]["parameterName"],
+                    rain,
+                ]
+            else:
+                if temp_max > day[0]:
+                    day[0] = temp_max
+                if temp_min < day[1]:
+                    day[1] = temp_min
+                if rain > day[3]:
+                    day[3] = rain
+
+        return [
+            {
+                "date": date_str,
+                "temp_max": day[0],
+                "temp_min": day[1],
+                "description": day[2],
+                "rain_probability": day[3],
+            }
+            for date_str, day in sorted(daily.items())
+        ]
 
     except Exception as e:
         print(f"解析 36 小時資料失敗：{e}")
@@ -877,102 +1446,530 @@ def parse_cwa_36h_data(data: dict, days: int) -> List[Dict]:
 
 def parse_cwa_7d_data(data: dict, days: int) -> List[Dict]:
     """解析中央氣象署一週預報資料"""
-    weather_list = []
-
     try:
         locations = data["records"]["locations"][0]["location"]
         if not locations:
             return []
 
         # 取得第一個符合的地點
-        location_data = locations[0]
-        weather_elements = location_data["weatherElement"]
+        return parse_cwa_7d_location(locations[0], days)
+    except Exception as e:
+        print(f"解析一週資料失敗：{e}")
+        return []
 
-        # 找出各項資料
-        wx_element = next(
-            (e for e in weather_elements if e["elementName"] == "WeatherDescription"),
-            None,
-        )
-        if not wx_element:
-            wx_element = next(
-                (e for e in weather_elements if e["elementName"] == "Wx"), None
-            )
 
-        t_element = next((e for e in weather_elements if e["elementName"] == "T"), None)
-        pop_element = next(
-            (e for e in weather_elements if e["elementName"] == "PoP12h"), None
-        )
+def _cwa_time_date(time_data: dict) -> str:
+    """取得時間區段的日期（區段資料為 startTime，逐時資料為 dataTime）"""
+    return (time_data.get("startTime") or time_data["dataTime"])[:10]
+
+
+def parse_cwa_7d_location(location_data: dict, days: int) -> List[Dict]:
+    """解析一週預報（或鄉鎮預報）中單一地點的資料"""
+    try:
+        elements = _index_elements(location_data["weatherElement"])
+        wx = elements.get("WeatherDescription") or elements.get("Wx")
+        temps = elements.get("T")
+        # 3 天鄉鎮預報為每 6 小時降雨機率
+        pop = elements.get("PoP12h") or elements.get("PoP6h") or ()
 
-        if not wx_element or not t_element:
+        if not wx or not temps:
             print("找不到必要的天氣元素")
             return []
 
-        # 整理資料
-        daily_data = {}
-
-        for time_data in t_element["time"]:
-            date_str = time_data["startTime"].split(" ")[0]
+        # 每日資料：日期 -> [最高溫, 最低溫, 天氣描述, 降雨機率]
+        daily = {}
+        for time_data in temps:
+            date_str = _cwa_time_date(time_data)
             temp = float(time_data["elementValue"][0]["value"])
+            day = daily.get(date_str)
+            if day is None:
+                daily[date_str] = [temp, temp, "", 0]
+            elif temp > day[0]:
+                day[0] = temp
+            elif temp < day[1]:
+                day[1] = temp
+
+        # 天氣描述取當天第一個時段
+        for time_data in wx:
+            day = daily.get(_cwa_time_date(time_data))
+            if day is not None and not day[2]:
+                day[2] = time_data["elementValue"][0]["value"]
+
+        # 降雨機率取當天最大值（空白表示無資料）
+        for time_data in pop:
+            day = daily.get(_cwa_time_date(time_data))
+            if day is not None:
+                value = time_data["elementValue"][0]["value"]
+                if value and value != " ":
+                    value = float(value)
+                    if value > day[3]:
+                        day[3] = value
+
+        return [
+            {
+                "date": date_str,
+                "temp_max": day[0],
+                "temp_min": day[1],
+                "description": day[2] or "多雲",
+                "rain_probability": day[3],
+            }
+            for date_str, day in sorted(daily.items())[:days]
+        ]
 
-            if date_str not in daily_data:
-                daily_data[date_str] = {
-                    "temps": [],
-                    "description": "",
-                    "rain_prob": 0,
-                }
+    except Exception as e:
+        print(f"解析一週資料失敗：{e}")
+        return []
 
-            daily_data[date_str]["temps"].append(temp)
 
-        # 加入天氣描述
-        for time_data in wx_element["time"]:
-            date_str = time_data["startTime"].split(" ")[0]
-            if date_str in daily_data and not daily_data[date_str]["description"]:
-                daily_data[date_str]["description"] = time_data["elementValue"][0][
-                    "value"
-                ]
+# ========== 逐時預報 ==========
+
+
+class HourlyForecast(NamedTuple):
+    """
+    逐時段預報（平行陣列，依時間排序）
+
+    每個時間點的資料適用到下一個時間點為止；36 小時與一週預報為逐 12 小時，
+    3 天鄉鎮預報與 OpenWeatherMap 為逐 3 小時。內容不可變，快取中的同一份資料
+    直接由介面與 Email 共用
+    """
+
+    times: Tuple[float, ...]  # 時段起點（Unix 時間）
+    temps: Tuple[float, ...]  # 溫度（°C）
+    rain_probability: Tuple[float, ...]  # 降雨機率（%）
+    descriptions: Tuple[str, ...]  # 天氣描述
+
+    def _end_time(self) -> float:
+        """最後一個時段的結束時間（沿用前一段的間隔，單點時視為 3 小時）"""
+        step = self.times[-1] - self.times[-2] if len(self.times) > 1 else 3 * 3600
+        return self.times[-1] + step
+
+    def window(self, date_str: str, start_hour: int, end_hour: int) -> "HourlyForecast":
+        """
+        取出某天某時段（台灣時間）涵蓋的資料點
+
+        Args:
+            date_str: 日期（YYYY-MM-DD）
+            start_hour: 開始時刻（含）
+            end_hour: 結束時刻（不含）
+
+        Returns:
+            時段內有效的資料點（含時段開始時仍有效的前一點），沒有資料時各陣列為空
+        """
+        if not self.times:
+            return self
+        day_start = (
+            datetime.fromisoformat(date_str).replace(tzinfo=TAIWAN_TZ).timestamp()
+        )
+        start = day_start + start_hour * 3600
+        end = day_start + end_hour * 3600
+        if start >= self._end_time():
+            return HourlyForecast((), (), (), ())
+        lo = max(bisect.bisect_right(self.times, start) - 1, 0)
+        hi = bisect.bisect_left(self.times, end)
+        return HourlyForecast(*(values[lo:hi] for values in self))
+
+    def summary(self) -> Optional[Dict]:
+        """彙整為與每日資料相同欄位的摘要（描述取第一個時段），沒有資料時回傳 None"""
+        if not self.times:
+            return None
+        return {
+            "temp_max": max(self.temps),
+            "temp_min": min(self.temps),
+            "description": self.descriptions[0],
+            "rain_probability": max(self.rain_probability),
+        }
+
+
+# 穿搭常用的時段（台灣時間）：名稱、開始時刻、結束時刻
+OUTFIT_TIME_WINDOWS = (("早上出門", 7, 9), ("傍晚返家", 17, 19))
+
+
+def _hourly_key(key: tuple) -> tuple:
+    """每日預報快取鍵對應的逐時預報快取鍵（如 ("cwa_hourly", 縣市, 資料集)）"""
+    return (f"{key[0]}_hourly", key[1], key[2])
+
+
+@lru_cache(maxsize=1024)
+def _cwa_timestamp(value: str) -> float:
+    """CWA 時間字串（台灣時間，可能不含時區）轉為 Unix 時間；各地點共用相同時間，結果快取"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=TAIWAN_TZ)
+    return parsed.timestamp()
+
+
+def _cwa_period_start(time_data: dict) -> float:
+    return _cwa_timestamp(time_data.get("startTime") or time_data["dataTime"])
+
+
+def _sample_periods(
+    times: Tuple[float, ...], periods: list, value_of, default
+) -> tuple:
+    """
+    取得每個時間點所在時段的值（時段與時間點皆已排序，一次走訪）
 
-        # 加入降雨機率
-        if pop_element:
-            for time_data in pop_element["time"]:
-                date_str = time_data["startTime"].split(" ")[0]
-                if date_str in daily_data:
-                    value = time_data["elementValue"][0]["value"]
-                    if value and value != " ":
-                        daily_data[date_str]["rain_prob"] = max(
-                            daily_data[date_str]["rain_prob"], float(value)
-                        )
-
-        # 整理成標準格式
-        for date_str in sorted(daily_data.keys())[:days]:
-            day_info = daily_data[date_str]
-            if day_info["temps"]:
-                weather_list.append(
-                    {
-                        "date": date_str,
-                        "temp_max": max(day_info["temps"]),
-                        "temp_min": min(day_info["temps"]),
-                        "description": day_info["description"] or "多雲",
-                        "rain_probability": day_info["rain_prob"],
-                    }
+    如逐 3 小時的溫度時間點對應到逐 6 小時的降雨機率時段
+    """
+    starts = [_cwa_period_start(period) for period in periods]
+    values = []
+    j = 0
+    for t in times:
+        while j + 1 < len(starts) and starts[j + 1] <= t:
+            j += 1
+        if starts and starts[j] <= t:
+            values.append(value_of(periods[j]))
+        else:
+            values.append(default)
+    return tuple(values)
+
+
+def _element_number(time_data: dict) -> float:
+    """elementValue 的數值（空白表示無資料，視為 0）"""
+    value = time_data["elementValue"][0]["value"]
+    return float(value) if value and value != " " else 0.0
+
+
+def parse_cwa_36h_hourly(location: dict) -> Optional[HourlyForecast]:
+    """將 36 小時預報中單一地點轉為逐 12 小時序列（溫度取最高與最低溫的平均）"""
+    try:
+        elements = _index_elements(location["weatherElement"])
+        wx, pop = elements.get("Wx"), elements.get("PoP")
+        min_t, max_t = elements.get("MinT"), elements.get("MaxT")
+        if not (wx and pop and min_t and max_t):
+            return None
+
+        periods = list(zip(wx, pop, min_t, max_t))
+        return HourlyForecast(
+            tuple(_cwa_timestamp(w["startTime"]) for w, _, _, _ in periods),
+            tuple(
+                (
+                    float(low["parameter"]["parameterName"])
+                    + float(high["parameter"]["parameterName"])
                 )
+                / 2
+                for _, _, low, high in periods
+            ),
+            tuple(float(p["parameter"]["parameterName"]) for _, p, _, _ in periods),
+            tuple(w["parameter"]["parameterName"] for w, _, _, _ in periods),
+        )
+    except Exception as e:
+        print(f"解析 36 小時逐時資料失敗：{e}")
+        return None
 
-        return weather_list
 
+def parse_cwa_7d_hourly(location_data: dict) -> Optional[HourlyForecast]:
+    """將一週預報（或鄉鎮預報）中單一地點轉為逐時段序列（以溫度的時間點為準）"""
+    try:
+        elements = _index_elements(location_data["weatherElement"])
+        wx = elements.get("WeatherDescription") or elements.get("Wx")
+        temps = elements.get("T")
+        pop = elements.get("PoP12h") or elements.get("PoP6h") or []
+        if not wx or not temps:
+            return None
+
+        times = tuple(_cwa_period_start(time_data) for time_data in temps)
+        return HourlyForecast(
+            times,
+            tuple(float(time_data["elementValue"][0]["value"]) for time_data in temps),
+            _sample_periods(times, pop, _element_number, 0.0),
+            _sample_periods(
+                times,
+                wx,
+                lambda time_data: time_data["elementValue"][0]["value"],
+                "多雲",
+            ),
+        )
     except Exception as e:
-        print(f"解析一週資料失敗：{e}")
-        import traceback
+        print(f"解析一週逐時資料失敗：{e}")
+        return None
+
+
+def parse_cwa_dataset_hourly(data: dict, api_id: str) -> Optional[HourlyForecast]:
+    """依資料集格式取得 CWA 回應中第一個地點的逐時序列"""
+    locations = iter_cwa_locations(data, api_id)
+    if not locations:
+        return None
+    if api_id == "F-C0032-001":
+        return parse_cwa_36h_hourly(locations[0])
+    return parse_cwa_7d_hourly(locations[0])
+
+
+def parse_openweather_hourly(data: dict) -> Optional[HourlyForecast]:
+    """將 OpenWeatherMap 5 天 / 3 小時預報轉為逐 3 小時序列"""
+    items = data.get("list", [])
+    if not items:
+        return None
+    return HourlyForecast(
+        tuple(float(item["dt"]) for item in items),
+        tuple(item["main"]["temp"] for item in items),
+        tuple(item.get("pop", 0) * 100 for item in items),
+        tuple(item["weather"][0]["description"] for item in items),
+    )
+
+
+def _forecast_cache_keys(city_name: str, days: int) -> List[Tuple[str, tuple]]:
+    """
+    預報可能所在的 [(提供者, 快取鍵)]（依 get_weather_forecast 的提供者順序，不發出請求）
+
+    逐時預報的快取鍵為 _hourly_key(快取鍵)
+    """
+    keys = []
+    exact = gz.lookup(city_name)
+    coords = (
+        exact.coordinates if exact else _geocode_cache.get(gz.normalize_name(city_name))
+    )
+    if CWA_API_KEY:
+        # 與 get_cwa_weather_forecast 相同，未收錄的地名對應到最近的已知地點
+        place = exact or (gz.nearest(*coords) if coords else None)
+        if place:
+            if CWA_TOWNSHIP_ENABLED:
+                api_id = select_township_dataset(place.county, days)
+                if api_id:
+                    town = gz.town_key(place.name)
+                    keys.append(("cwa", ("cwa", f"{place.county}{town}", api_id)))
+            keys.append(("cwa", ("cwa", place.county, select_cwa_dataset(days))))
+    if OPENWEATHER_API_KEY and coords:
+        # 與 get_coordinates 相同，未收錄的地名使用地理編碼的座標
+        keys.append(("owm", owm_cache_key(*coords)))
+    return keys
+
+
+def get_hourly_forecast(city_name: str, days: int = 7) -> Optional[HourlyForecast]:
+    """
+    取得與 get_weather_forecast 同一份資料的逐時段序列
+
+    逐時序列與每日資料一起解析並快取，介面與 Email 讀取的是同一份快取；
+    只讀取快取、不發出請求，呼叫端需先以 get_weather_forecast 取得預報
+
+    Args:
+        city_name: 城市名稱
+        days: 預報天數（決定使用的資料集，3 天內的鄉鎮預報為逐 3 小時）
 
-        traceback.print_exc()
+    Returns:
+        逐時預報，快取中沒有（如使用模擬資料）時回傳 None
+    """
+    days = min(days, 7)
+    max_stale = FORECAST_MAX_STALENESS.total_seconds()
+    for _, key in _forecast_cache_keys(city_name, days):
+        entry = _cache_peek(_hourly_key(key))
+        if entry and time.time() - entry["expires_at"] <= max_stale:
+            return entry["data"]
+    return None
+
+
+def get_time_windows(hourly: Optional[HourlyForecast], date_str: str) -> List[Dict]:
+    """
+    取得某天各穿搭時段（OUTFIT_TIME_WINDOWS）的天氣摘要
+
+    Returns:
+        [{"label", "start_hour", "end_hour", "temp_max", "temp_min",
+          "description", "rain_probability"}]，沒有資料的時段略過
+    """
+    if not hourly:
         return []
+    windows = []
+    for label, start_hour, end_hour in OUTFIT_TIME_WINDOWS:
+        summary = hourly.window(date_str, start_hour, end_hour).summary()
+        if summary:
+            windows.append(
+                dict(summary, label=label, start_hour=start_hour, end_hour=end_hour)
+            )
+    return windows
+
+
+def format_time_window(window: Dict) -> str:
+    """時段天氣的單行文字（介面與 Email 共用）"""
+    return (
+        f"🕖 {window['label']}（{window['start_hour']:02d}–{window['end_hour']:02d} 時）："
+        f"{window['temp_min']:.0f}°C ~ {window['temp_max']:.0f}°C，"
+        f"{window['description']}，降雨 {window['rain_probability']:.0f}%"
+    )
+
+
+# ========== 時限與對沖請求 ==========
+
+# 單次天氣查詢的總時限（秒），超過即改用模擬資料
+WEATHER_DEADLINE_SECONDS = float(os.environ.get("WEATHER_DEADLINE_SECONDS", "8"))
+
+# 對沖模式：CWA 超過近期耗時的百分位數仍未回應時，同時向 OpenWeatherMap 請求
+WEATHER_HEDGE_ENABLED = os.environ.get("WEATHER_HEDGE", "0") == "1"
+WEATHER_HEDGE_PERCENTILE = float(os.environ.get("WEATHER_HEDGE_PERCENTILE", "95"))
+WEATHER_HEDGE_DEFAULT_DELAY = float(os.environ.get("WEATHER_HEDGE_DELAY", "1.0"))
+
+# 主要提供者用去總時限的此比例仍未回應時，即使未開啟對沖也同時查詢備援提供者，
+# 確保 CWA 停頓時 OpenWeatherMap 仍有足夠時間回應
+WEATHER_FALLBACK_AT = float(os.environ.get("WEATHER_FALLBACK_AT", "0.5"))
+
+_provider_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("WEATHER_PROVIDER_WORKERS", "8")),
+    thread_name_prefix="weather-provider",
+)
+_deadline_stats = {
+    "calls": 0,
+    "hedged": 0,
+    "hedge_wins": 0,
+    "early_fallbacks": 0,
+    "deadline_exceeded": 0,
+    "skipped_busy": 0,
+    "cache_served": 0,
+}
+
+PROVIDER_NAMES = {"cwa": "中央氣象署", "owm": "OpenWeatherMap"}
+
+
+def _latency_percentile(provider: str, percentile: float) -> Optional[float]:
+    """提供者近期請求耗時的百分位數（毫秒），樣本不足時回傳 None"""
+    samples = sorted(_latency_samples.get(provider, ()))
+    if len(samples) < 20:
+        return None
+    index = min(int(len(samples) * percentile / 100), len(samples) - 1)
+    return samples[index]
+
+
+def _hedge_delay(provider: str) -> float:
+    """對沖延遲（秒）：主要提供者耗時的百分位數，樣本不足時使用預設值"""
+    latency_ms = _latency_percentile(provider, WEATHER_HEDGE_PERCENTILE)
+    if latency_ms is None:
+        return WEATHER_HEDGE_DEFAULT_DELAY
+    return max(latency_ms / 1000, 0.05)
+
+
+def _fallback_delay(provider: str, budget: float) -> float:
+    """
+    主要提供者未回應時，開始同時查詢備援提供者前的等待秒數
+
+    未開啟對沖時為總時限的 WEATHER_FALLBACK_AT 比例；開啟對沖時取對沖延遲與該值較小者
+    """
+    delay = budget * WEATHER_FALLBACK_AT
+    if WEATHER_HEDGE_ENABLED:
+        delay = min(delay, _hedge_delay(provider))
+    return delay
+
+
+def _race_providers(providers: List[tuple], deadline: float) -> Optional[tuple]:
+    """
+    依序（或對沖）呼叫提供者，在時限內回傳第一個有效結果
+
+    主要提供者超過 _fallback_delay 仍未回應時同時查詢下一個提供者，
+    停頓的主要提供者不會用盡整個時限
 
+    Args:
+        providers: [(提供者代碼, 無參數函式)]，依優先順序排列
+        deadline: time.monotonic() 的截止時間
+
+    Returns:
+        (提供者代碼, 天氣資料)，全部失敗或逾時則回傳 None
+    """
+    queue = list(providers)
+    pending = {}
+    hedged = False
+    primary = providers[0][0]
+    fallback_at = time.monotonic() + _fallback_delay(
+        primary, deadline - time.monotonic()
+    )
+
+    def start_next():
+        name, loader = queue.pop(0)
+        pending[_provider_executor.submit(loader)] = name
+
+    start_next()
+    while pending:
+        now = time.monotonic()
+        remaining = deadline - now
+        if remaining <= 0:
+            _deadline_stats["deadline_exceeded"] += 1
+            print("⏱️ 天氣查詢超過時限，改用備援資料")
+            return None
+
+        wait_seconds = remaining
+        if queue and not hedged:
+            wait_seconds = min(remaining, max(fallback_at - now, 0))
+
+        done, _ = wait(pending, timeout=wait_seconds, return_when=FIRST_COMPLETED)
+        if not done:
+            if queue and not hedged and time.monotonic() >= fallback_at:
+                hedged = True
+                if WEATHER_HEDGE_ENABLED:
+                    _deadline_stats["hedged"] += 1
+                else:
+                    _deadline_stats["early_fallbacks"] += 1
+                print(f"🔀 {PROVIDER_NAMES[primary]} 回應較慢，同時查詢備援提供者")
+                start_next()
+            continue
+
+        for future in done:
+            name = pending.pop(future)
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ {PROVIDER_NAMES[name]} 查詢失敗：{e}")
+                result = None
+            if result:
+                if hedged and name != primary:
+                    _deadline_stats["hedge_wins"] += 1
+                return name, result
+            if name == primary and queue:
+                print(
+                    f"⚠️ {PROVIDER_NAMES[name]} API 失敗，改用 {PROVIDER_NAMES[queue[0][0]]}"
+                )
+
+        if not pending and queue:
+            start_next()
+
+    return None
+
+
+def _cached_provider(city_name: str, days: int) -> Optional[str]:
+    """
+    快取中已有可用預報（含可沿用的過期資料）的最優先提供者
+
+    只檢查各提供者第一個查詢的快取鍵，不發出請求
+    """
+    max_stale = FORECAST_MAX_STALENESS.total_seconds()
+    checked = set()
+    for provider, key in _forecast_cache_keys(city_name, days):
+        if provider in checked:
+            continue
+        checked.add(provider)
+        entry = _cache_peek(key)
+        if entry and time.time() - entry["expires_at"] <= max_stale:
+            return provider
+    return None
+
+
+def get_weather_latency_stats() -> Dict:
+    """
+    取得時限與對沖統計
+
+    Returns:
+        查詢次數、對沖次數、對沖勝出次數、提前降級次數、逾時次數、
+        因同一資料仍有逾時未完成請求而略過的次數、直接由快取提供的次數，
+        以及各提供者的 p50/p95/p99 耗時
+    """
+    stats = dict(_deadline_stats)
+    stats["providers"] = {
+        provider: {
+            "samples": len(_latency_samples.get(provider, ())),
+            "p50_ms": _latency_percentile(provider, 50),
+            "p95_ms": _latency_percentile(provider, 95),
+            "p99_ms": _latency_percentile(provider, 99),
+        }
+        for provider in PROVIDER_NAMES
+    }
+    stats["hedge_delay_seconds"] = _hedge_delay("cwa")
+    return stats
 
-def get_weather_forecast(city_name: str, days: int = 7) -> Optional[List[Dict]]:
+
+def get_weather_forecast(
+    city_name: str, days: int = 7, deadline_seconds: float = None
+) -> Optional[List[Dict]]:
     """
     取得指定城市的天氣預報
 
     Args:
         city_name: 城市名稱
         days: 預報天數（最多 7 天）
+        deadline_seconds: 總時限（秒，預設 WEATHER_DEADLINE_SECONDS）
 
     Returns:
         天氣資訊列表，每個元素包含：
@@ -981,88 +1978,171 @@ def get_weather_forecast(city_name: str, days: int = 7) -> Optional[List[Dict]]:
         - temp_min: 最低溫（°C）
         - description: 天氣描述
         - rain_probability: 降雨機率（%）
+        - stale: 是否為過期資料（已排入背景更新）
+        - age_seconds: 資料年齡（秒）
     """
     # 限制最多 7 天
     if days > 7:
         days = 7
         print(f"⚠️ 天氣預報最多提供 7 天")
 
-    # 優先使用中央氣象署 API（台灣地區最準確）
+    # 優先使用中央氣象署 API（台灣地區最準確），再降級使用 OpenWeatherMap
+    providers = []
     if CWA_API_KEY:
-        cwa_result = get_cwa_weather_forecast(city_name, days)
-        if cwa_result:
-            print(f"✅ 使用中央氣象署資料")
-            return cwa_result
-        else:
-            print("⚠️ 中央氣象署 API 失敗，改用 OpenWeatherMap")
+        providers.append(("cwa", lambda: get_cwa_weather_forecast(city_name, days)))
+    if OPENWEATHER_API_KEY:
+        # 座標在提供者執行緒內取得，未收錄地名的地理編碼也受總時限約束
+        def load_openweather():
+            coords = get_coordinates(city_name)
+            if not coords:
+                return None
+            return get_openweather_forecast(coords[0], coords[1], days)
+
+        providers.append(("owm", load_openweather))
+
+    if providers:
+        _deadline_stats["calls"] += 1
+        # 主要提供者已有快取時直接在呼叫端提供（過期資料於背景更新），
+        # 不經過執行緒池，停頓的上游佔用執行緒時快取命中也不受影響
+        cached = _cached_provider(city_name, days)
+        if cached == providers[0][0]:
+            result = providers[0][1]()
+            if result:
+                _deadline_stats["cache_served"] += 1
+                return result
+        budget = (
+            WEATHER_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+        )
+        winner = _race_providers(providers, time.monotonic() + budget)
+        if winner:
+            if winner[0] == "cwa":
+                print(f"✅ 使用中央氣象署資料")
+            return winner[1]
 
-    # 降級使用 OpenWeatherMap
     if not OPENWEATHER_API_KEY:
         # 如果沒有 API Key，返回模擬資料
         print("⚠️ 無可用 API，使用模擬資料")
         return get_mock_weather(city_name, days)
+    if not gz.lookup(city_name) and not _geocode_cache.get(
+        gz.normalize_name(city_name)
+    ):
+        return None
+    return get_mock_weather(city_name, days)
+
+
+def get_openweather_forecast(
+    lat: float, lon: float, days: int = 7
+) -> Optional[List[Dict]]:
+    """
+    使用 OpenWeatherMap 5 天 / 3 小時預報，彙整為每日資料
+
+    Args:
+        lat: 緯度
+        lon: 經度
+        days: 預報天數
+
+    Returns:
+        天氣資訊列表，失敗時回傳 None
+    """
+    cache_key = owm_cache_key(lat, lon)
+    cached = _cache_get(cache_key)
+    if cached:
+        return _serve_cached(
+            cached, days, cache_key, lambda: _load_openweather_forecast(lat, lon)
+        )
 
-    coords = get_coordinates(city_name)
-    if not coords:
+    weather_list = _single_flight(
+        cache_key, lambda: _load_openweather_forecast(lat, lon)
+    )
+    if weather_list is None:
         return None
+    return _copy_days(weather_list, days)
 
-    lat, lon = coords
 
+def _load_openweather_forecast(lat: float, lon: float) -> Optional[List[Dict]]:
+    """向 OpenWeatherMap 取得預報並彙整為每日資料、寫入快取，失敗時回傳 None"""
     try:
-        # 使用 OpenWeatherMap One Call API 3.0 (免費版)
-        # 註：免費版只提供 8 天預報
-        url = "https://api.openweathermap.org/data/2.5/forecast"
-        params = {
-            "lat": lat,
-            "lon": lon,
-            "appid": OPENWEATHER_API_KEY,
-            "units": "metric",  # 使用攝氏溫度
-            "lang": "zh_tw",
-        }
-
-        response = requests.get(url, params=params, timeout=10)
+        response = http_get(
+            "owm",
+            OPENWEATHER_FORECAST_URL,
+            params=openweather_params(lat, lon),
+            timeout=10,
+        )
         response.raise_for_status()
         data = response.json()
+        weather_list = parse_openweather_data(data)
+
+        if weather_list:
+            _cache_forecast(
+                owm_cache_key(lat, lon),
+                weather_list,
+                parse_openweather_hourly(data),
+                time.time() + OWM_CACHE_TTL.total_seconds(),
+            )
 
-        # 處理每日天氣資料
-        daily_weather = {}
-        for item in data.get("list", []):
-            date_str = datetime.fromtimestamp(item["dt"]).strftime("%Y-%m-%d")
-
-            if date_str not in daily_weather:
-                daily_weather[date_str] = {
-                    "date": date_str,
-                    "temp_max": item["main"]["temp_max"],
-                    "temp_min": item["main"]["temp_min"],
-                    "description": item["weather"][0]["description"],
-                    "rain_probability": item.get("pop", 0) * 100,
-                    "temps": [item["main"]["temp"]],
-                }
-            else:
-                daily_weather[date_str]["temp_max"] = max(
-                    daily_weather[date_str]["temp_max"], item["main"]["temp_max"]
-                )
-                daily_weather[date_str]["temp_min"] = min(
-                    daily_weather[date_str]["temp_min"], item["main"]["temp_min"]
-                )
-                daily_weather[date_str]["temps"].append(item["main"]["temp"])
-                daily_weather[date_str]["rain_probability"] = max(
-                    daily_weather[date_str]["rain_probability"],
-                    item.get("pop", 0) * 100,
-                )
+        return weather_list
+
+    except Exception as e:
+        print(f"取得天氣資料失敗：{e}")
+        return None
 
-        # 轉換為列表並排序
-        weather_list = sorted(daily_weather.values(), key=lambda x: x["date"])
 
-        # 移除 temps 欄位
-        for item in weather_list:
-            item.pop("temps", None)
+# 使用 OpenWeatherMap 5 天 / 3 小時預報 API（免費版）
+OPENWEATHER_FORECAST_URL = f"{OPENWEATHER_API_BASE}/data/2.5/forecast"
 
-        return weather_list[:days]
 
-    except Exception as e:
-        print(f"取得天氣資料失敗：{e}")
-        return get_mock_weather(city_name, days)
+def owm_cache_key(lat: float, lon: float) -> tuple:
+    """OpenWeatherMap 預報的快取鍵"""
+    return ("owm", f"{lat:.4f},{lon:.4f}", "forecast")
+
+
+def openweather_params(lat: float, lon: float) -> Dict:
+    """OpenWeatherMap 預報 API 的查詢參數"""
+    return {
+        "lat": lat,
+        "lon": lon,
+        "appid": OPENWEATHER_API_KEY,
+        "units": "metric",  # 使用攝氏溫度
+        "lang": "zh_tw",
+    }
+
+
+def parse_openweather_data(data: dict) -> List[Dict]:
+    """將 OpenWeatherMap 3 小時預報彙整為每日資料"""
+    daily_weather = {}
+    for item in data.get("list", []):
+        date_str = datetime.fromtimestamp(item["dt"]).strftime("%Y-%m-%d")
+
+        if date_str not in daily_weather:
+            daily_weather[date_str] = {
+                "date": date_str,
+                "temp_max": item["main"]["temp_max"],
+                "temp_min": item["main"]["temp_min"],
+                "description": item["weather"][0]["description"],
+                "rain_probability": item.get("pop", 0) * 100,
+                "temps": [item["main"]["temp"]],
+            }
+        else:
+            daily_weather[date_str]["temp_max"] = max(
+                daily_weather[date_str]["temp_max"], item["main"]["temp_max"]
+            )
+            daily_weather[date_str]["temp_min"] = min(
+                daily_weather[date_str]["temp_min"], item["main"]["temp_min"]
+            )
+            daily_weather[date_str]["temps"].append(item["main"]["temp"])
+            daily_weather[date_str]["rain_probability"] = max(
+                daily_weather[date_str]["rain_probability"],
+                item.get("pop", 0) * 100,
+            )
+
+    # 轉換為列表並排序
+    weather_list = sorted(daily_weather.values(), key=lambda x: x["date"])
+
+    # 移除 temps 欄位
+    for item in weather_list:
+        item.pop("temps", None)
+
+    return weather_list
 
 
 def get_mock_weather(city_name: str, days: int = 7) -> List[Dict]:
@@ -1087,15 +2167,30 @@ def get_mock_weather(city_name: str, days: int = 7) -> List[Dict]:
     return weather_list
 
 
-def format_weather_display(weather_data: List[Dict], city_name: str = "") -> str:
+def format_weather_display(
+    weather_data: List[Dict], city_name: str = "", hourly: HourlyForecast = None
+) -> str:
     """
-    格式化天氣資訊顯示
+    格式化天氣資訊顯示（有逐時預報時另外列出出門與返家時段的天氣）
     """
     if not weather_data:
         return f"{city_name} - 無法取得天氣資訊"
 
     output = f"### 📍 {city_name} 天氣預報\n\n"
 
+    # 資料年齡（過期資料另外標示，背景更新完成後即為最新）
+    age_seconds = weather_data[0].get("age_seconds")
+    if age_seconds is not None:
+        age_text = (
+            f"{age_seconds / 3600:.0f} 小時前"
+            if age_seconds >= 3600
+            else f"{age_seconds / 60:.0f} 分鐘前"
+        )
+        if weather_data[0].get("stale"):
+            output += f"🕒 資料更新於 {age_text}（已過期，正在更新中）\n\n"
+        elif age_seconds >= 60:
+            output += f"🕒 資料更新於 {age_text}\n\n"
+
     for day in weather_data:
         date_obj = datetime.strptime(day["date"], "%Y-%m-%d")
         weekday = ["週一", "週二", "週三", "週四", "週五", "週六", "週日"][
@@ -1109,6 +2204,8 @@ def format_weather_display(weather_data: List[Dict], city_name: str = "") -> str
         output += f"- 🌡️ 溫度：{day['temp_min']:.0f}°C ~ {day['temp_max']:.0f}°C\n"
         output += f"- ☁️ 天氣：{day['description']}\n"
         output += f"- 🌧️ 降雨機率：{day['rain_probability']:.0f}%\n"
+        for window in get_time_windows(hourly, day["date"]):
+            output += f"- {format_time_window(window)}\n"
         output += f"- 👔 穿搭建議：{suggestion}\n\n"
 
     return output
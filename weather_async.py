@@ -0,0 +1,483 @@
+"""
+非同步天氣查詢模組
+提供與 weather.get_weather_forecast 相同解析、快取與降級邏輯的 async 版本，
+供 FastAPI 非同步路由或批次查詢在單一執行緒內同時查詢大量地點
+"""
+
+import asyncio
+import os
+import time
+import weakref
+from collections import deque
+from typing import Dict, List, Optional
+
+import httpx
+
+import weather as wt
+
+# 同時進行的上游請求上限
+ASYNC_CONCURRENCY = int(os.environ.get("WEATHER_ASYNC_CONCURRENCY", "20"))
+
+# 每個事件迴圈共用一個 AsyncClient 與 Semaphore（httpx 用戶端綁定建立時的事件迴圈）
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = (
+    weakref.WeakKeyDictionary()
+)
+_semaphores: (
+    "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]"
+) = weakref.WeakKeyDictionary()
+
+# 進行中的請求：快取鍵 -> Task（同一事件迴圈內合併相同請求）
+_inflight: Dict[tuple, asyncio.Task] = {}
+_inflight_started: Dict[tuple, float] = {}
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """取得目前事件迴圈共用的 AsyncClient（保持連線、gzip、連線數上限）"""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=ASYNC_CONCURRENCY,
+                max_keepalive_connections=wt.HTTP_POOL_SIZE,
+            ),
+            transport=httpx.AsyncHTTPTransport(retries=wt.HTTP_RETRIES),
+            headers={
+                "Accept-Encoding": "gzip, deflate",
+                "User-Agent": "ootd-weather/1.0",
+            },
+        )
+        _clients[loop] = client
+        _semaphores[loop] = asyncio.Semaphore(ASYNC_CONCURRENCY)
+    return client
+
+
+async def aclose_async_client():
+    """關閉目前事件迴圈的 AsyncClient（應用程式關閉時呼叫）"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def http_get_async(
+    provider: str, url: str, params: Dict, timeout: float
+) -> httpx.Response:
+    """
+    非同步 GET 請求，與同步版共用斷路器與耗時統計
+
+    Args:
+        provider: 提供者名稱（cwa / owm）
+        url: 網址
+        params: 查詢參數
+        timeout: 逾時秒數
+
+    Returns:
+        回應物件（斷路器開啟時拋出 wt.CircuitOpenError）
+    """
+    client = get_async_client()
+    breaker = wt._breakers.get(provider)
+    if breaker and not breaker.allow_request():
+        raise wt.CircuitOpenError(f"{provider} 斷路器開啟中，略過請求")
+
+    try:
+        async with _semaphores[asyncio.get_running_loop()]:
+            start = time.perf_counter()
+            response = await client.get(url, params=params, timeout=timeout)
+    except httpx.HTTPError as e:
+        if breaker:
+            breaker.record_failure(type(e).__name__)
+        raise
+    except asyncio.CancelledError:
+        # 被取消的請求若是 half_open 的試探請求，需釋放名額，否則斷路器會一直停在 half_open
+        if breaker:
+            breaker.release_trial()
+        raise
+
+    wt._latency_samples.setdefault(provider, deque(maxlen=200)).append(
+        (time.perf_counter() - start) * 1000
+    )
+    if breaker:
+        if response.status_code == 429 or response.status_code >= 500:
+            breaker.record_failure(f"HTTP {response.status_code}")
+        else:
+            breaker.record_success()
+    return response
+
+
+async def _single_flight_async(key: tuple, loader) -> Optional[List[Dict]]:
+    """同一快取鍵同時只發出一個上游請求，其他協程等待並共用結果"""
+    loop = asyncio.get_running_loop()
+    task = _inflight.get(key)
+    if task is None:
+        with wt._forecast_cache_lock:
+            wt._forecast_cache_stats["fetches"] += 1
+        task = asyncio.ensure_future(loader())
+        _inflight[key] = task
+        _inflight_started[key] = loop.time()
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+    elif loop.time() - _inflight_started[key] > wt.WEATHER_DEADLINE_SECONDS:
+        # 同一資料的請求已超過總時限仍未完成（上游停頓），由呼叫端改用備援
+        wt._deadline_stats["skipped_busy"] += 1
+        print(f"⚠️ {key[0]} {key[1]} 仍有逾時未完成的請求，暫不等待")
+        return None
+    else:
+        with wt._forecast_cache_lock:
+            wt._forecast_cache_stats["coalesced"] += 1
+    # shield：呼叫端逾時取消時，請求仍會完成並寫入快取
+    return await asyncio.shield(task)
+
+
+async def _load_cwa_forecast_async(
+    location_name: str, api_id: str
+) -> Optional[List[Dict]]:
+    """向 CWA 取得單一縣市的預報並解析、寫入快取，失敗時回傳 None"""
+    try:
+        response = await http_get_async(
+            "cwa",
+            f"{wt.CWA_DATASTORE_URL}/{api_id}",
+            wt.cwa_params(location_name),
+            timeout=15,
+        )
+        response.raise_for_status()
+        data = wt.check_cwa_response(response.json())
+        weather_list = wt.parse_cwa_dataset(data, api_id)
+
+        # 快取寫入包含 SQLite 寫入，移到執行緒避免阻塞事件迴圈
+        if weather_list:
+            await asyncio.to_thread(
+                wt._cache_forecast,
+                ("cwa", location_name, api_id),
+                weather_list,
+                wt.parse_cwa_dataset_hourly(data, api_id),
+                wt.next_cwa_issuance(api_id).timestamp(),
+            )
+        return weather_list
+
+    except (httpx.HTTPError, wt.CircuitOpenError) as e:
+        print(f"❌ 中央氣象署 API 請求失敗：{e}")
+        return None
+    except Exception as e:
+        print(f"❌ 處理氣象資料失敗：{e}")
+        return None
+
+
+async def _load_openweather_forecast_async(
+    lat: float, lon: float
+) -> Optional[List[Dict]]:
+    """向 OpenWeatherMap 取得預報並彙整、寫入快取，失敗時回傳 None"""
+    try:
+        response = await http_get_async(
+            "owm",
+            wt.OPENWEATHER_FORECAST_URL,
+            wt.openweather_params(lat, lon),
+            timeout=10,
+        )
+        response.raise_for_status()
+        data = response.json()
+        weather_list = wt.parse_openweather_data(data)
+
+        if weather_list:
+            await asyncio.to_thread(
+                wt._cache_forecast,
+                wt.owm_cache_key(lat, lon),
+                weather_list,
+                wt.parse_openweather_hourly(data),
+                time.time() + wt.OWM_CACHE_TTL.total_seconds(),
+            )
+        return weather_list
+
+    except Exception as e:
+        print(f"取得天氣資料失敗：{e}")
+        return None
+
+
+async def _load_cwa_townships_async(county: str, api_id: str) -> Optional[List[str]]:
+    """向 CWA 取得縣市鄉鎮預報資料集並寫入快取，回傳鄉鎮名稱列表，失敗時回傳 None"""
+    try:
+        start = time.perf_counter()
+        response = await http_get_async(
+            "cwa",
+            f"{wt.CWA_DATASTORE_URL}/{api_id}",
+            wt.cwa_params(),
+            timeout=15,
+        )
+        response.raise_for_status()
+        data = wt.check_cwa_response(response.json())
+        # 解析與快取寫入（含 SQLite 寫入）移到執行緒避免阻塞事件迴圈
+        towns = await asyncio.to_thread(wt._store_cwa_townships, county, api_id, data)
+        print(
+            f"✅ 已取得 {county} 鄉鎮預報 {api_id}：{len(towns)} 個鄉鎮"
+            f"（{(time.perf_counter() - start) * 1000:.0f} ms）"
+        )
+        return towns
+
+    except (httpx.HTTPError, wt.CircuitOpenError) as e:
+        print(f"❌ 中央氣象署鄉鎮預報請求失敗：{e}")
+        return None
+    except Exception as e:
+        print(f"❌ 處理鄉鎮預報失敗：{e}")
+        return None
+
+
+async def get_cwa_township_forecast_async(
+    place: "wt.gz.Place", days: int = 7
+) -> Optional[List[Dict]]:
+    """wt.get_cwa_township_forecast 的非同步版本"""
+    api_id = wt.select_township_dataset(place.county, days)
+    if not api_id:
+        return None
+
+    town = wt.gz.town_key(place.name)
+    town_key = ("cwa", f"{place.county}{town}", api_id)
+    index_key = ("cwa_towns", place.county, api_id)
+
+    cached = wt._cache_get(town_key)
+    wt._record_county_lookup(place.county, place.name, cached is not None)
+    if cached:
+        return wt._serve_cached(
+            cached,
+            days,
+            index_key,
+            lambda: wt._load_cwa_townships(place.county, api_id),
+        )
+
+    # 已取得的縣市資料集中沒有此鄉鎮（如以縣市名稱查詢），直接改用縣市預報
+    index = wt._cache_peek(index_key)
+    if index and index["expires_at"] > time.time() and town not in index["data"]:
+        return None
+
+    towns = await _single_flight_async(
+        index_key, lambda: _load_cwa_townships_async(place.county, api_id)
+    )
+    if not towns or town not in towns:
+        return None
+    entry = wt._cache_peek(town_key)
+    return wt._copy_days(entry["data"], days, entry["fetched_at"]) if entry else None
+
+
+async def get_cwa_weather_forecast_async(
+    city_name: str, days: int = 7
+) -> Optional[List[Dict]]:
+    """get_cwa_weather_forecast 的非同步版本"""
+    if not wt.CWA_API_KEY:
+        return None
+
+    # 未收錄的地名需要地理編碼，移到執行緒避免阻塞事件迴圈
+    place = wt.gz.lookup(city_name) or await asyncio.to_thread(
+        wt.resolve_location, city_name
+    )
+    location_name = place.county if place else city_name
+    if not location_name:
+        print(f"❌ 找不到 {city_name} 的對應縣市")
+        return None
+
+    # 優先使用鄉鎮預報，失敗或查無該鄉鎮時改用縣市預報
+    if place and wt.CWA_TOWNSHIP_ENABLED:
+        township_result = await get_cwa_township_forecast_async(place, days)
+        if township_result:
+            return township_result
+
+    api_id = wt.select_cwa_dataset(days)
+    cache_key = ("cwa", location_name, api_id)
+    cached = wt._cache_get(cache_key)
+    wt._record_county_lookup(location_name, city_name, cached is not None)
+    if cached:
+        # 過期資料的背景更新沿用同步版的執行緒池
+        if cached["pinned"]:
+            return wt._serve_cached(
+                cached,
+                days,
+                ("cwa", "national", "refresh"),
+                wt.refresh_national_forecasts,
+            )
+        return wt._serve_cached(
+            cached,
+            days,
+            cache_key,
+            lambda: wt._load_cwa_forecast(location_name, api_id),
+        )
+
+    weather_list = await _single_flight_async(
+        cache_key, lambda: _load_cwa_forecast_async(location_name, api_id)
+    )
+    if weather_list is None:
+        return None
+    return wt._copy_days(weather_list, days)
+
+
+async def get_openweather_forecast_async(
+    lat: float, lon: float, days: int = 7
+) -> Optional[List[Dict]]:
+    """get_openweather_forecast 的非同步版本"""
+    cache_key = wt.owm_cache_key(lat, lon)
+    cached = wt._cache_get(cache_key)
+    if cached:
+        return wt._serve_cached(
+            cached, days, cache_key, lambda: wt._load_openweather_forecast(lat, lon)
+        )
+
+    weather_list = await _single_flight_async(
+        cache_key, lambda: _load_openweather_forecast_async(lat, lon)
+    )
+    if weather_list is None:
+        return None
+    return wt._copy_days(weather_list, days)
+
+
+async def _race_providers_async(
+    providers: List[tuple], budget: float
+) -> Optional[tuple]:
+    """
+    wt._race_providers 的非同步版本（相同的提前降級與對沖）
+
+    時限到時未完成的工作不取消，完成後仍會寫入快取
+
+    Args:
+        providers: [(提供者代碼, 回傳 coroutine 的無參數函式)]，依優先順序排列
+        budget: 總時限（秒）
+
+    Returns:
+        (提供者代碼, 天氣資料)，全部失敗或逾時則回傳 None
+    """
+    loop = asyncio.get_running_loop()
+    queue = list(providers)
+    pending = {}
+    hedged = False
+    primary = providers[0][0]
+    deadline = loop.time() + budget
+    fallback_at = loop.time() + wt._fallback_delay(primary, budget)
+
+    def start_next():
+        name, loader = queue.pop(0)
+        pending[asyncio.ensure_future(loader())] = name
+
+    start_next()
+    while pending:
+        now = loop.time()
+        remaining = deadline - now
+        if remaining <= 0:
+            wt._deadline_stats["deadline_exceeded"] += 1
+            print("⏱️ 天氣查詢超過時限，改用備援資料")
+            return None
+
+        wait_seconds = remaining
+        if queue and not hedged:
+            wait_seconds = min(remaining, max(fallback_at - now, 0))
+
+        done, _ = await asyncio.wait(
+            set(pending), timeout=wait_seconds, return_when=asyncio.FIRST_COMPLETED
+        )
+        if not done:
+            if queue and not hedged and loop.time() >= fallback_at:
+                hedged = True
+                if wt.WEATHER_HEDGE_ENABLED:
+                    wt._deadline_stats["hedged"] += 1
+                else:
+                    wt._deadline_stats["early_fallbacks"] += 1
+                print(f"🔀 {wt.PROVIDER_NAMES[primary]} 回應較慢，同時查詢備援提供者")
+                start_next()
+            continue
+
+        for task in done:
+            name = pending.pop(task)
+            try:
+                result = task.result()
+            except Exception as e:
+                print(f"❌ {wt.PROVIDER_NAMES[name]} 查詢失敗：{e}")
+                result = None
+            if result:
+                if hedged and name != primary:
+                    wt._deadline_stats["hedge_wins"] += 1
+                return name, result
+            if name == primary and queue:
+                print(
+                    f"⚠️ {wt.PROVIDER_NAMES[name]} API 失敗，"
+                    f"改用 {wt.PROVIDER_NAMES[queue[0][0]]}"
+                )
+
+        if not pending and queue:
+            start_next()
+
+    return None
+
+
+async def get_weather_forecast_async(
+    city_name: str, days: int = 7, deadline_seconds: float = None
+) -> Optional[List[Dict]]:
+    """
+    get_weather_forecast 的非同步版本（相同的快取、降級與總時限）
+
+    Args:
+        city_name: 城市名稱
+        days: 預報天數（最多 7 天）
+        deadline_seconds: 總時限（秒，預設 wt.WEATHER_DEADLINE_SECONDS）
+
+    Returns:
+        天氣資訊列表（格式同 get_weather_forecast）
+    """
+    days = min(days, 7)
+
+    providers = []
+    if wt.CWA_API_KEY:
+        providers.append(
+            ("cwa", lambda: get_cwa_weather_forecast_async(city_name, days))
+        )
+    if wt.OPENWEATHER_API_KEY:
+        # 座標在提供者工作內取得，未收錄地名的地理編碼也受總時限約束
+        async def load_openweather():
+            place = wt.gz.lookup(city_name)
+            coords = (
+                place.coordinates
+                if place
+                else await asyncio.to_thread(wt.geocode_location, city_name)
+            )
+            if not coords:
+                return None
+            return await get_openweather_forecast_async(coords[0], coords[1], days)
+
+        providers.append(("owm", load_openweather))
+
+    if providers:
+        wt._deadline_stats["calls"] += 1
+        # 主要提供者已有快取時直接提供，不進入競速
+        if wt._cached_provider(city_name, days) == providers[0][0]:
+            result = await providers[0][1]()
+            if result:
+                wt._deadline_stats["cache_served"] += 1
+                return result
+        budget = (
+            wt.WEATHER_DEADLINE_SECONDS
+            if deadline_seconds is None
+            else deadline_seconds
+        )
+        winner = await _race_providers_async(providers, budget)
+        if winner:
+            return winner[1]
+
+    if not wt.OPENWEATHER_API_KEY:
+        return wt.get_mock_weather(city_name, days)
+    if not wt.gz.lookup(city_name) and not wt._geocode_cache.get(
+        wt.gz.normalize_name(city_name)
+    ):
+        return None
+    return wt.get_mock_weather(city_name, days)
+
+
+async def get_weather_forecasts_async(
+    city_names: List[str], days: int = 7
+) -> Dict[str, Optional[List[Dict]]]:
+    """
+    同時查詢多個地點的天氣預報
+
+    Args:
+        city_names: 城市名稱列表（重複的名稱只查詢一次）
+        days: 預報天數
+
+    Returns:
+        城市名稱 -> 天氣資訊列表
+    """
+    unique_names = list(dict.fromkeys(city_names))
+    results = await asyncio.gather(
+        *(get_weather_forecast_async(name, days) for name in unique_names)
+    )
+    return dict(zip(unique_names, results))
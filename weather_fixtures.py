@@ -0,0 +1,384 @@
+"""
+天氣 API 測試資料模組
+產生與中央氣象署、OpenWeatherMap 回應結構相同的合成資料（含解析時用不到的元素），
+供效能測試與本機替身伺服器使用
+"""
+
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import gazetteer as gz
+import weather as wt
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "data", "fixtures")
+
+# 錄製的 OpenWeatherMap 預報（替身伺服器對所有座標回傳此檔）
+OPENWEATHER_FIXTURE = "openweather_forecast.json"
+
+WEATHER_DESCRIPTIONS = [
+    "晴時多雲",
+    "多雲",
+    "多雲時陰",
+    "陰短暫雨",
+    "多雲午後短暫雷陣雨",
+    "陰時多雲短暫陣雨",
+]
+
+# 一週預報中解析時用不到、但實際回應會包含的元素（佔回應大部分體積）
+WEEK_EXTRA_ELEMENTS = [
+    ("RH", "相對濕度", "百分比"),
+    ("MinCI", "最小舒適度指數", "NA"),
+    ("WS", "最大風速", "公尺/秒"),
+    ("MaxAT", "最高體感溫度", "攝氏度"),
+    ("MaxCI", "最大舒適度指數", "NA"),
+    ("MinT", "最低溫度", "攝氏度"),
+    ("UVI", "紫外線指數", "紫外線指數"),
+    ("MinAT", "最低體感溫度", "攝氏度"),
+    ("MaxT", "最高溫度", "攝氏度"),
+    ("WD", "風向", "8方位"),
+    ("Td", "平均露點溫度", "攝氏度"),
+    ("Wx", "天氣現象", "NA"),
+]
+
+
+def _periods(start: datetime, count: int, hours: int) -> List[tuple]:
+    """產生 count 個連續時段的 (startTime, endTime) 字串"""
+    fmt = "%Y-%m-%d %H:%M:%S"
+    return [
+        (
+            (start + timedelta(hours=hours * i)).strftime(fmt),
+            (start + timedelta(hours=hours * (i + 1))).strftime(fmt),
+        )
+        for i in range(count)
+    ]
+
+
+def _forecast_start(now: datetime = None) -> datetime:
+    """對齊到最近一次發布的時段起點（06:00 或 18:00）"""
+    now = now or datetime.now()
+    start = now.replace(minute=0, second=0, microsecond=0)
+    return start.replace(hour=6 if 6 <= now.hour < 18 else 18) - (
+        timedelta(days=1) if now.hour < 6 else timedelta()
+    )
+
+
+def _element_value(rng: random.Random, name: str, base: float):
+    """產生單一元素值（elementValue 格式）"""
+    if name in ("WeatherDescription", "Wx"):
+        return [{"value": rng.choice(WEATHER_DESCRIPTIONS), "measure": "NA"}]
+    if name.startswith("PoP"):
+        value = rng.choice([" ", "0", "10", "20", "30", "60", "80"])
+        return [{"value": value, "measure": "百分比"}]
+    if name in ("T", "MinT", "MaxT", "MaxAT", "MinAT", "Td"):
+        return [{"value": str(int(base + rng.uniform(-4, 4))), "measure": "C"}]
+    return [{"value": str(rng.randint(1, 90)), "measure": "NA"}]
+
+
+def _week_location(
+    rng: random.Random, name: str, start: datetime, hourly: bool
+) -> Dict:
+    """產生一週預報（或鄉鎮預報）格式的單一地點"""
+    base = rng.uniform(14, 30)
+    periods = _periods(start, 14, 12)
+    elements = []
+    for element_name in ["PoP12h" if not hourly else "PoP6h", "WeatherDescription"]:
+        hours = 6 if element_name == "PoP6h" else 12
+        elements.append(
+            {
+                "elementName": element_name,
+                "description": element_name,
+                "time": [
+                    {
+                        "startTime": begin,
+                        "endTime": end,
+                        "elementValue": _element_value(rng, element_name, base),
+                    }
+                    for begin, end in _periods(start, 12 if hourly else 14, hours)
+                ],
+            }
+        )
+    if hourly:
+        # 3 天鄉鎮預報的溫度為逐 3 小時（dataTime）
+        elements.append(
+            {
+                "elementName": "T",
+                "description": "溫度",
+                "time": [
+                    {"dataTime": begin, "elementValue": _element_value(rng, "T", base)}
+                    for begin, _ in _periods(start, 24, 3)
+                ],
+            }
+        )
+    else:
+        elements.append(
+            {
+                "elementName": "T",
+                "description": "平均溫度",
+                "time": [
+                    {
+                        "startTime": begin,
+                        "endTime": end,
+                        "elementValue": _element_value(rng, "T", base),
+                    }
+                    for begin, end in periods
+                ],
+            }
+        )
+    for element_name, description, _ in WEEK_EXTRA_ELEMENTS:
+        elements.append(
+            {
+                "elementName": element_name,
+                "description": description,
+                "time": [
+                    {
+                        "startTime": begin,
+                        "endTime": end,
+                        "elementValue": _element_value(rng, element_name, base),
+                    }
+                    for begin, end in periods
+                ],
+            }
+        )
+    rng.shuffle(elements)
+    place = gz.lookup(name)
+    return {
+        "locationName": name,
+        "geocode": "",
+        "lat": str(place.lat) if place else "",
+        "lon": str(place.lon) if place else "",
+        "weatherElement": elements,
+    }
+
+
+def national_36h_payload(
+    seed: int = 42, now: datetime = None, counties: List[str] = None
+) -> Dict:
+    """產生 F-C0032-001（今明 36 小時）全國回應"""
+    rng = random.Random(seed)
+    start = _forecast_start(now)
+    periods = _periods(start, 3, 12)
+    locations = []
+    for county in counties or gz.COUNTIES:
+        base = rng.uniform(14, 30)
+        elements = []
+        for name, unit in (
+            ("Wx", None),
+            ("PoP", "百分比"),
+            ("MinT", "C"),
+            ("CI", None),
+            ("MaxT", "C"),
+        ):
+            time_list = []
+            for begin, end in periods:
+                if name == "Wx":
+                    parameter = {
+                        "parameterName": rng.choice(WEATHER_DESCRIPTIONS),
+                        "parameterValue": "2",
+                    }
+                elif name == "CI":
+                    parameter = {"parameterName": "舒適"}
+                elif name == "PoP":
+                    parameter = {
+                        "parameterName": str(rng.choice([0, 10, 20, 30, 60])),
+                        "parameterUnit": unit,
+                    }
+                else:
+                    offset = -3 if name == "MinT" else 3
+                    parameter = {
+                        "parameterName": str(int(base + offset)),
+                        "parameterUnit": unit,
+                    }
+                time_list.append(
+                    {"startTime": begin, "endTime": end, "parameter": parameter}
+                )
+            elements.append({"elementName": name, "time": time_list})
+        locations.append({"locationName": county, "weatherElement": elements})
+    return {
+        "success": "true",
+        "result": {"resource_id": "F-C0032-001", "fields": []},
+        "records": {"datasetDescription": "三十六小時天氣預報", "location": locations},
+    }
+
+
+def national_week_payload(
+    seed: int = 42, now: datetime = None, counties: List[str] = None
+) -> Dict:
+    """產生 F-D0047-091（未來一週）全國回應"""
+    rng = random.Random(seed)
+    start = _forecast_start(now)
+    locations = [
+        _week_location(rng, county, start, hourly=False)
+        for county in counties or gz.COUNTIES
+    ]
+    return {
+        "success": "true",
+        "result": {"resource_id": "F-D0047-091", "fields": []},
+        "records": {
+            "locations": [
+                {
+                    "datasetDescription": "臺灣各縣市天氣預報資料及國際都市天氣預報",
+                    "locationsName": "台灣",
+                    "dataid": "D0047-091",
+                    "location": locations,
+                }
+            ]
+        },
+    }
+
+
+def township_payload(api_id: str, seed: int = 42, now: datetime = None) -> Dict:
+    """產生 F-D0047-0xx（縣市鄉鎮預報）回應，鄉鎮取自地名索引"""
+    number = int(api_id.rsplit("-", 1)[-1])
+    county = next(
+        (
+            name
+            for name, base in wt.CWA_TOWNSHIP_DATASETS.items()
+            if number in (base, base + 2)
+        ),
+        None,
+    )
+    if county is None:
+        return {"success": "false", "message": f"未知的資料集 {api_id}"}
+
+    rng = random.Random(f"{seed}-{api_id}")
+    start = _forecast_start(now)
+    hourly = number % 4 == 1
+    towns = [place for place in gz.PLACES if place.county == county]
+    locations = [
+        _week_location(
+            rng, place.name + ("區" if county.endswith("市") else "鄉"), start, hourly
+        )
+        for place in towns
+    ]
+    return {
+        "success": "true",
+        "result": {"resource_id": api_id, "fields": []},
+        "records": {
+            "locations": [
+                {
+                    "datasetDescription": f"{county}未來{'3天' if hourly else '1週'}天氣預報",
+                    "locationsName": county,
+                    "dataid": api_id.replace("F-", ""),
+                    "location": locations,
+                }
+            ]
+        },
+    }
+
+
+def openweather_payload(
+    lat: float, lon: float, seed: int = 42, now: datetime = None
+) -> Dict:
+    """產生 OpenWeatherMap 5 天 / 3 小時預報回應"""
+    rng = random.Random(f"{seed}-{lat:.4f}-{lon:.4f}")
+    now = now or datetime.now()
+    start = int(now.replace(minute=0, second=0, microsecond=0).timestamp())
+    base = rng.uniform(14, 30)
+    items = []
+    for i in range(40):
+        temp = base + rng.uniform(-4, 4)
+        items.append(
+            {
+                "dt": start + i * 10800,
+                "main": {
+                    "temp": temp,
+                    "temp_min": temp - 1,
+                    "temp_max": temp + 1,
+                    "humidity": 70,
+                },
+                "weather": [
+                    {
+                        "id": 803,
+                        "main": "Clouds",
+                        "description": rng.choice(WEATHER_DESCRIPTIONS),
+                    }
+                ],
+                "pop": rng.choice([0, 0.1, 0.3, 0.6]),
+            }
+        )
+    return {
+        "cod": "200",
+        "cnt": len(items),
+        "list": items,
+        "city": {"coord": {"lat": lat, "lon": lon}},
+    }
+
+
+def cwa_payload(api_id: str, location_name: str = None, seed: int = 42) -> Dict:
+    """依資料集代碼產生 CWA 回應（有 locationName 時只包含該縣市）"""
+    counties = [location_name] if location_name else None
+    if api_id == "F-C0032-001":
+        return national_36h_payload(seed, counties=counties)
+    if api_id == "F-D0047-091":
+        return national_week_payload(seed, counties=counties)
+    return township_payload(api_id, seed)
+
+
+def write_fixtures(directory: str = FIXTURE_DIR, seed: int = 42) -> List[str]:
+    """將全國回應寫成 JSON 檔（模擬錄製的回應）"""
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for api_id in ("F-C0032-001", "F-D0047-091"):
+        path = os.path.join(directory, f"{api_id}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(cwa_payload(api_id, seed=seed), f, ensure_ascii=False)
+        paths.append(path)
+        print(f"✅ 已寫入 {path}（{os.path.getsize(path) / 1024:.0f} KB）")
+    return paths
+
+
+def record_fixtures(directory: str = FIXTURE_DIR) -> List[str]:
+    """向實際 API 錄製全國回應與一筆 OpenWeatherMap 預報（需設定對應的 API 金鑰）"""
+    os.makedirs(directory, exist_ok=True)
+    targets = []
+    if wt.CWA_API_KEY:
+        targets += [
+            (
+                f"{api_id}.json",
+                "cwa",
+                f"{wt.CWA_DATASTORE_URL}/{api_id}",
+                wt.cwa_params(),
+            )
+            for api_id in wt.NATIONAL_DATASETS
+        ]
+    if wt.OPENWEATHER_API_KEY:
+        lat, lon = gz.lookup("台北").coordinates
+        targets.append(
+            (
+                OPENWEATHER_FIXTURE,
+                "owm",
+                wt.OPENWEATHER_FORECAST_URL,
+                wt.openweather_params(lat, lon),
+            )
+        )
+    if not targets:
+        print("⚠️ 未設定 CWA_API_KEY 或 OPENWEATHER_API_KEY，無法錄製")
+
+    paths = []
+    for filename, provider, url, params in targets:
+        response = wt.http_get(provider, url, params=params, timeout=30)
+        response.raise_for_status()
+        path = os.path.join(directory, filename)
+        with open(path, "wb") as f:
+            f.write(response.content)
+        paths.append(path)
+        print(f"✅ 已錄製 {path}（{len(response.content) / 1024:.0f} KB）")
+    return paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="產生天氣 API 測試資料")
+    parser.add_argument("--output", default=FIXTURE_DIR)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--record", action="store_true", help="改為向實際 API 錄製回應（需 API 金鑰）"
+    )
+    args = parser.parse_args()
+    if args.record:
+        record_fixtures(args.output)
+    else:
+        write_fixtures(args.output, args.seed)
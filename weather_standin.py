@@ -0,0 +1,341 @@
+"""
+天氣 API 本機替身伺服器
+以錄製的回應（data/fixtures/<資料集代碼>.json）或 weather_fixtures 產生的資料
+模擬中央氣象署與 OpenWeatherMap API，可依提供者設定延遲、錯誤率與逾時，
+在沒有網路的環境重現解析、延遲與降級行為
+
+使用方式：
+    python weather_standin.py --port 8765 --cwa-error-rate 0.3 --latency-ms 200
+    CWA_API_BASE=http://127.0.0.1:8765 OPENWEATHER_API_BASE=http://127.0.0.1:8765 \\
+        CWA_API_KEY=standin OPENWEATHER_API_KEY=standin python app.py
+"""
+
+import argparse
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import gazetteer as gz
+import weather_fixtures as fixtures
+
+CWA_PATH_PREFIX = "/api/v1/rest/datastore/"
+OPENWEATHER_FORECAST_PATH = "/data/2.5/forecast"
+OPENWEATHER_GEOCODE_PATH = "/geo/1.0/direct"
+
+# 各提供者的故障設定（可於執行中以 POST /_standin/config 調整）
+DEFAULT_FAULTS = {
+    "latency_ms": 0.0,  # 每個請求的基本延遲
+    "jitter_ms": 0.0,  # 延遲的隨機增量（0 ~ jitter_ms）
+    "error_rate": 0.0,  # 回應 503 的機率
+    "timeout_rate": 0.0,  # 停頓 hang_seconds 秒才回應的機率（模擬逾時）
+    "hang_seconds": 30.0,
+}
+
+_config_lock = threading.Lock()
+_faults: Dict[str, Dict] = {"cwa": dict(DEFAULT_FAULTS), "owm": dict(DEFAULT_FAULTS)}
+_stats: Dict[str, Dict] = {
+    provider: {"requests": 0, "errors": 0, "timeouts": 0} for provider in _faults
+}
+_rng = random.Random(42)
+
+# 完整回應（未依地點篩選）：資料集代碼 -> 解析後的 JSON
+_payloads: Dict[str, Dict] = {}
+_settings = {"fixture_dir": fixtures.FIXTURE_DIR, "seed": 42}
+
+
+def configure(
+    provider: str = None, fixture_dir: str = None, seed: int = None, **faults
+) -> Dict[str, Dict]:
+    """
+    調整替身伺服器設定
+
+    Args:
+        provider: 故障設定套用的提供者（cwa / owm），省略時兩者皆套用
+        fixture_dir: 錄製回應的目錄
+        seed: 合成資料與故障的亂數種子
+        **faults: DEFAULT_FAULTS 中的欄位
+
+    Returns:
+        目前各提供者的故障設定
+    """
+    unknown = set(faults) - set(DEFAULT_FAULTS)
+    if unknown:
+        raise ValueError(f"未知的設定：{', '.join(sorted(unknown))}")
+
+    with _config_lock:
+        if fixture_dir is not None:
+            _settings["fixture_dir"] = fixture_dir
+            _payloads.clear()
+        if seed is not None:
+            _settings["seed"] = seed
+            _rng.seed(seed)
+            _payloads.clear()
+        for name in [provider] if provider else list(_faults):
+            _faults[name].update({key: float(value) for key, value in faults.items()})
+        return {name: dict(values) for name, values in _faults.items()}
+
+
+def get_stats() -> Dict[str, Dict]:
+    """取得各提供者的請求、錯誤與逾時次數"""
+    with _config_lock:
+        return {name: dict(values) for name, values in _stats.items()}
+
+
+def _load_payload(api_id: str) -> Dict:
+    """取得資料集的完整回應（優先使用錄製檔，否則產生合成資料）"""
+    payload = _payloads.get(api_id)
+    if payload is None:
+        path = os.path.join(_settings["fixture_dir"], f"{api_id}.json")
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                payload = json.load(f)
+        else:
+            payload = fixtures.cwa_payload(api_id, seed=_settings["seed"])
+        _payloads[api_id] = payload
+    return payload
+
+
+def _filter_locations(payload: Dict, location_names: str) -> Dict:
+    """依 locationName 參數（逗號分隔）篩選地點，與 CWA API 行為相同"""
+    names = {gz.normalize_name(name) for name in location_names.split(",") if name}
+    records = payload.get("records")
+    if not names or not records:
+        return payload
+
+    def keep(locations):
+        return [
+            location
+            for location in locations
+            if gz.normalize_name(location["locationName"]) in names
+        ]
+
+    if "location" in records:
+        return {
+            **payload,
+            "records": {**records, "location": keep(records["location"])},
+        }
+    groups = [
+        {**group, "location": keep(group["location"])} for group in records["locations"]
+    ]
+    return {**payload, "records": {**records, "locations": groups}}
+
+
+def cwa_response(api_id: str, params: Dict[str, str]) -> Tuple[int, Dict]:
+    """產生 CWA 資料集 API 的回應"""
+    if not params.get("Authorization"):
+        return 401, {"message": "Unauthorized"}
+    payload = _load_payload(api_id)
+    if payload.get("success") != "true":
+        return 200, payload
+    return 200, _filter_locations(payload, params.get("locationName", ""))
+
+
+def openweather_forecast_response(params: Dict[str, str]) -> Tuple[int, Dict]:
+    """產生 OpenWeatherMap 5 天 / 3 小時預報 API 的回應"""
+    if not params.get("appid"):
+        return 401, {"cod": 401, "message": "Invalid API key"}
+    try:
+        lat, lon = float(params["lat"]), float(params["lon"])
+    except (KeyError, ValueError):
+        return 400, {"cod": "400", "message": "wrong latitude or longitude"}
+
+    path = os.path.join(_settings["fixture_dir"], fixtures.OPENWEATHER_FIXTURE)
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as f:
+            return 200, json.load(f)
+    return 200, fixtures.openweather_payload(lat, lon, seed=_settings["seed"])
+
+
+def openweather_geocode_response(params: Dict[str, str]) -> Tuple[int, list]:
+    """產生 OpenWeatherMap 地理編碼 API 的回應（以地名索引查詢）"""
+    if not params.get("appid"):
+        return 401, {"cod": 401, "message": "Invalid API key"}
+    name = params.get("q", "").split(",")[0]
+    place = gz.lookup(name)
+    if place is None:
+        return 200, []
+    return 200, [
+        {"name": place.name, "lat": place.lat, "lon": place.lon, "country": "TW"}
+    ]
+
+
+def _route(path: str) -> Tuple[Optional[str], Optional[str]]:
+    """依路徑判斷 (提供者, 資料集代碼)"""
+    if path.startswith(CWA_PATH_PREFIX):
+        return "cwa", path[len(CWA_PATH_PREFIX) :]
+    if path in (OPENWEATHER_FORECAST_PATH, OPENWEATHER_GEOCODE_PATH):
+        return "owm", None
+    return None, None
+
+
+def _inject_fault(provider: str) -> Optional[str]:
+    """依設定套用延遲，回傳要模擬的故障（error / timeout）"""
+    with _config_lock:
+        faults = dict(_faults[provider])
+        _stats[provider]["requests"] += 1
+        roll = _rng.random()
+        jitter = _rng.random() * faults["jitter_ms"]
+        fault = None
+        if roll < faults["timeout_rate"]:
+            fault = "timeout"
+            _stats[provider]["timeouts"] += 1
+        elif roll < faults["timeout_rate"] + faults["error_rate"]:
+            fault = "error"
+            _stats[provider]["errors"] += 1
+
+    delay = (faults["latency_ms"] + jitter) / 1000
+    if fault == "timeout":
+        delay += faults["hang_seconds"]
+    if delay > 0:
+        time.sleep(delay)
+    return fault
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """替身伺服器的請求處理"""
+
+    protocol_version = "HTTP/1.1"
+    verbose = False
+
+    def _send_json(self, status: int, body):
+        data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        if "gzip" in self.headers.get("Accept-Encoding", "") and len(data) > 1024:
+            data = gzip.compress(data, compresslevel=5)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        try:
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # 模擬逾時時用戶端已放棄連線
+            self.close_connection = True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+
+        if url.path == "/_standin/stats":
+            return self._send_json(200, get_stats())
+
+        provider, api_id = _route(url.path)
+        if provider is None:
+            return self._send_json(404, {"message": "Not Found"})
+
+        fault = _inject_fault(provider)
+        if fault == "error":
+            if provider == "cwa":
+                return self._send_json(
+                    503, {"success": "false", "message": "替身伺服器模擬錯誤"}
+                )
+            return self._send_json(503, {"cod": 503, "message": "standin fault"})
+
+        if provider == "cwa":
+            status, body = cwa_response(api_id, params)
+        elif url.path == OPENWEATHER_FORECAST_PATH:
+            status, body = openweather_forecast_response(params)
+        else:
+            status, body = openweather_geocode_response(params)
+        self._send_json(status, body)
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/_standin/config":
+            return self._send_json(404, {"message": "Not Found"})
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+            self._send_json(200, configure(**body))
+        except (TypeError, ValueError) as e:
+            self._send_json(400, {"message": str(e)})
+
+    def log_message(self, format, *args):
+        if self.verbose:
+            print(f"🛰️ {self.address_string()} {format % args}")
+
+
+def start_standin(
+    host: str = "127.0.0.1", port: int = 0
+) -> Tuple[ThreadingHTTPServer, str]:
+    """
+    於背景執行緒啟動替身伺服器（供效能測試或腳本在同一程序內使用）
+
+    Args:
+        host: 監聽位址
+        port: 連接埠（0 表示自動選擇）
+
+    Returns:
+        (伺服器, 基底網址)，結束時呼叫 server.shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), StandinHandler)
+    server.daemon_threads = True
+    threading.Thread(
+        target=server.serve_forever, name="weather-standin", daemon=True
+    ).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def use_standin(base_url: str):
+    """
+    將 weather 模組的 API 位址改為替身伺服器（同一程序內使用，
+    其他程序請改設定 CWA_API_BASE / OPENWEATHER_API_BASE 環境變數）
+    """
+    import weather as wt
+
+    wt.CWA_DATASTORE_URL = f"{base_url}/api/v1/rest/datastore"
+    wt.OPENWEATHER_FORECAST_URL = f"{base_url}{OPENWEATHER_FORECAST_PATH}"
+    wt.OPENWEATHER_GEOCODE_URL = f"{base_url}{OPENWEATHER_GEOCODE_PATH}"
+    wt.CWA_API_KEY = wt.CWA_API_KEY or "standin"
+    wt.OPENWEATHER_API_KEY = wt.OPENWEATHER_API_KEY or "standin"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="天氣 API 本機替身伺服器")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--fixtures", default=fixtures.FIXTURE_DIR, help="錄製回應的目錄"
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--verbose", action="store_true", help="顯示每個請求")
+    for provider in ("", "cwa-", "owm-"):
+        target = {"": "兩個提供者", "cwa-": "中央氣象署", "owm-": "OpenWeatherMap"}[
+            provider
+        ]
+        for name in DEFAULT_FAULTS:
+            parser.add_argument(
+                f"--{provider}{name.replace('_', '-')}",
+                type=float,
+                help=f"{target}的 {name}",
+            )
+    args = vars(parser.parse_args())
+
+    configure(fixture_dir=args["fixtures"], seed=args["seed"])
+    for provider in ("", "cwa", "owm"):
+        prefix = f"{provider}_" if provider else ""
+        faults = {
+            name: args[prefix + name]
+            for name in DEFAULT_FAULTS
+            if args[prefix + name] is not None
+        }
+        if faults:
+            configure(provider or None, **faults)
+
+    StandinHandler.verbose = args["verbose"]
+    server = ThreadingHTTPServer((args["host"], args["port"]), StandinHandler)
+    server.daemon_threads = True
+    base_url = f"http://{args['host']}:{args['port']}"
+    print(f"🛰️ 天氣 API 替身伺服器：{base_url}")
+    print(f"   CWA_API_BASE={base_url} OPENWEATHER_API_BASE={base_url}")
+    for name, values in configure().items():
+        print(f"   {name}：{values}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 已停止")